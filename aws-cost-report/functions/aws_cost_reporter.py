@@ -3,6 +3,15 @@ import pandas as pd
 import os
 from datetime import datetime, timedelta
 import argparse
+import gc
+import glob
+import importlib
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
 from dateutil.relativedelta import relativedelta
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
@@ -10,13 +19,142 @@ import matplotlib.patheffects as path_effects
 import seaborn as sns
 import numpy as np
 from collections import defaultdict
+from botocore.config import Config
+from botocore.exceptions import ClientError
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+from ce_stub import StubCostExplorerClient
+from cost_archive import ARCHIVE_FORMATS, ReportArchive
+from cost_dashboard import CostDashboardWriter
+from cost_manifest import ReportManifest, find_report_artifacts, summarize_totals
+from cost_schema import compact_cost_frame, export_cost_frame, sum_costs, to_dollars
+from cost_render import DEFAULT_RENDER_PROFILES, parse_render_profiles, save_figure
+from cost_forecast import PREDICTION_INTERVAL_LEVEL, ForecastCache, forecast_monthly_costs, get_forecast_period, get_gap_months, parse_forecast_response
+from cost_store import ACCOUNTS_DATASET, ORGANIZATION_DATASET, CostDataStore, DEFAULT_STORE_ROOT
+from cur_ingest import CurCostFrames
 
-def parse_arguments():
+# AWS-like color scheme shared by the PNG charts and the HTML dashboard
+CHART_COLORS = [
+    '#FF9900',  # AWS Orange
+    '#146EB4',  # AWS Blue
+    '#FF6B6B',  # Red
+    '#4ECDC4',  # Teal
+    '#45B7D1',  # Light Blue
+    '#96CEB4',  # Green
+    '#FECA57',  # Yellow
+    '#FF9FF3',  # Pink
+    '#54A0FF',  # Blue
+    '#C7ECEE'   # Light Gray for Others
+]
+REFUNDS_COLOR = '#00D084'
+
+# Default grouping of every report; --group-by adds tag and cost category groupings
+SERVICE_GROUP_BY = {'Type': 'DIMENSION', 'Key': 'SERVICE'}
+LINKED_ACCOUNT_GROUP_BY = {'Type': 'DIMENSION', 'Key': 'LINKED_ACCOUNT'}
+GROUP_BY_TYPES = {
+    'TAG': 'Tag',
+    'COST_CATEGORY': 'Cost Category'
+}
+
+# Every report file is written below this directory
+REPORTS_ROOT = "aws_cost_reports"
+
+# Multi-payer runs write each payer's usual aws_cost_reports tree below DEFAULT_ORGS_DIR/<payer>/
+DEFAULT_ORGS_DIR = "aws_cost_orgs"
+# Role ARNs of --role-arns; the payer is named after the account ID
+ROLE_ARN_PATTERN = re.compile(r'^arn:aws[a-z-]*:iam::(\d{12}):role/.+$')
+
+# get_cost_forecast errors answered with the local trend forecast instead of failing the run
+FORECAST_FALLBACK_ERRORS = {'ThrottlingException', 'LimitExceededException', 'DataUnavailableException'}
+
+# Long ranges are fetched as concurrent windows of at most this many months (overridden from the CLI)
+FETCH_SETTINGS = {
+    'window_months': 12,
+    'max_workers': 4
+}
+
+# Opt-in compact schema of the account and organization frames (see cost_schema)
+FRAME_SETTINGS = {
+    'compact': False
+}
+
+# Chart files written per chart as (render profile, format) pairs (see cost_render)
+RENDER_SETTINGS = {
+    'profiles': DEFAULT_RENDER_PROFILES
+}
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Generate AWS Cost Reports')
     parser.add_argument('--start-date', required=True, help='Start date in YYYY-MM-DD format')
     parser.add_argument('--end-date', required=True, help='End date in YYYY-MM-DD format')
     parser.add_argument('--account-id', required=False, help='Specific AWS account ID (optional)')
-    return parser.parse_args()
+    parser.add_argument('--output-format', choices=['png', 'dashboard', 'both'], default='png',
+                        help='Chart output: one PNG per account, one HTML dashboard with per-account data shards, or both (default: png)')
+    parser.add_argument('--window-months', type=int, default=12,
+                        help='Split longer date ranges into windows of this many months (default: 12)')
+    parser.add_argument('--max-workers', type=int, default=4,
+                        help='Number of date windows fetched concurrently (default: 4)')
+    parser.add_argument('--requests-per-second', type=float, default=5,
+                        help='Cost Explorer request rate shared by all concurrent fetches (default: 5)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Process one account at a time, releasing frames and figures after each account')
+    parser.add_argument('--memory-budget-mb', type=float, default=None,
+                        help='Abort a --streaming run if resident memory exceeds this many MB after releasing an account')
+    parser.add_argument('--stub-accounts', type=int, default=None,
+                        help='Use the local Cost Explorer stub with this many synthetic accounts instead of AWS (testing)')
+    parser.add_argument('--data-dir', default=DEFAULT_STORE_ROOT,
+                        help=f'Directory where fetched cost data is stored for offline comparisons (default: {DEFAULT_STORE_ROOT})')
+    parser.add_argument('--no-store', action='store_true',
+                        help='Do not store the fetched cost data')
+    parser.add_argument('--source', choices=['ce', 'cur'], default='ce',
+                        help='Read costs from the Cost Explorer API (ce) or from CUR 2.0 Parquet exports (cur) (default: ce)')
+    parser.add_argument('--cur-path', required=False,
+                        help='Local directory/file or s3:// prefix with CUR 2.0 Parquet files (required with --source cur)')
+    parser.add_argument('--group-by', type=parse_group_by, action='append', metavar='TAG:<key>|COST_CATEGORY:<name>',
+                        help='Also report costs by a tag key or cost category (repeatable)')
+    parser.add_argument('--profiles', type=parse_list, default=[],
+                        help='Comma-separated AWS profiles of payer (management) accounts to report on in parallel')
+    parser.add_argument('--role-arns', type=parse_list, default=[],
+                        help='Comma-separated IAM role ARNs in payer accounts to assume and report on in parallel')
+    parser.add_argument('--orgs-dir', default=DEFAULT_ORGS_DIR,
+                        help=f'Output directory of multi-payer runs, one subdirectory per payer (default: {DEFAULT_ORGS_DIR})')
+    parser.add_argument('--forecast', action='store_true',
+                        help='Add next-quarter cost forecasts to the charts (cached per day in --data-dir)')
+    parser.add_argument('--archive', choices=sorted(ARCHIVE_FORMATS),
+                        help='Also pack every report file of the run into one archive, written while the reports are generated')
+    parser.add_argument('--archive-path', required=False,
+                        help='Local path or s3://bucket/key of the archive (default: aws_cost_reports/archives/...)')
+    parser.add_argument('--render-profiles', type=parse_render_profiles, default=DEFAULT_RENDER_PROFILES,
+                        metavar='print,web[:webp],thumb[:webp],vector[:svg|pdf]',
+                        help='Chart files to write from each chart (default: print, the 300 dpi PNG)')
+    parser.add_argument('--compact-frames', action='store_true',
+                        help='Keep cost frames as categoricals, dates and integer cents; dollars are formatted only on export')
+    return parser.parse_args(argv)
+
+def parse_list(value):
+    """Parse a comma-separated argument into a list without blanks"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def parse_group_by(value):
+    """Parse a --group-by value such as TAG:team or COST_CATEGORY:business-unit into a Cost Explorer GroupBy"""
+    group_type, separator, key = value.partition(':')
+    group_type = group_type.strip().upper()
+    if not separator or group_type not in GROUP_BY_TYPES or not key.strip():
+        raise argparse.ArgumentTypeError(f"expected TAG:<key> or COST_CATEGORY:<name>, got '{value}'")
+    return {'Type': group_type, 'Key': key.strip()}
+
+def get_group_by_label(group_by=None):
+    """Readable name of a grouping, e.g. 'Service' or 'Tag: team'"""
+    if group_by is None or group_by['Type'] == 'DIMENSION':
+        return 'Service'
+    return f"{GROUP_BY_TYPES[group_by['Type']]}: {group_by['Key']}"
+
+def get_group_by_slug(group_by):
+    """File name part for a grouping, e.g. 'tag-team'"""
+    key = re.sub(r'[^A-Za-z0-9._-]+', '_', group_by['Key'])
+    return f"{group_by['Type'].lower().replace('_', '-')}-{key}"
 
 def validate_and_format_date(date_str, date_name):
     """Validate and format date string to ensure proper format"""
@@ -36,16 +174,71 @@ def validate_and_format_date(date_str, date_name):
         print(f"Expected format: YYYY-MM-DD (e.g., 2024-11-01)")
         raise ValueError(f"Invalid {date_name} format. Please use YYYY-MM-DD format.")
 
+class RateLimiter:
+    """Thread-safe token bucket shared by every Cost Explorer call in the process"""
+    
+    def __init__(self, requests_per_second, burst=None):
+        self.rate = float(requests_per_second)
+        self.capacity = float(burst if burst is not None else max(1, requests_per_second))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.request_count = 0  # Requests let through, i.e. billed Cost Explorer requests
+    
+    def set_rate(self, requests_per_second):
+        """Change the sustained request rate and burst size"""
+        with self.lock:
+            self.rate = float(requests_per_second)
+            self.capacity = float(max(1, requests_per_second))
+            self.tokens = min(self.tokens, self.capacity)
+    
+    def acquire(self):
+        """Block until a request token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.request_count += 1
+                    return
+                
+                wait_seconds = (1 - self.tokens) / self.rate
+            
+            time.sleep(wait_seconds)
+
+# Cost Explorer allows a handful of requests per second per account; all fetches share this limiter
+CE_RATE_LIMITER = RateLimiter(requests_per_second=5)
+
+def call_cost_explorer(ce_client, operation, **kwargs):
+    """Call a Cost Explorer operation under the shared rate limiter"""
+    CE_RATE_LIMITER.acquire()
+    return getattr(ce_client, operation)(**kwargs)
+
 def get_all_linked_accounts(ce_client, start_date, end_date):
     """Get all linked accounts in the organization with their names"""
     # Validate and format dates
     start_date_formatted = validate_and_format_date(start_date, "start_date")
     end_date_formatted = validate_and_format_date(end_date, "end_date")
     
+    # Long ranges are looked up window by window so accounts closed early in a backfill are kept
+    accounts_by_id = {}
+    for window_start, window_end in split_date_range(start_date_formatted, end_date_formatted, FETCH_SETTINGS['window_months']):
+        for account in get_linked_accounts_for_window(ce_client, window_start, window_end):
+            accounts_by_id[account['id']] = account
+    
+    return list(accounts_by_id.values())
+
+def get_linked_accounts_for_window(ce_client, start_date_formatted, end_date_formatted):
+    """Get the linked accounts with their names for one API-compatible window"""
     accounts = []
     
     # Use get_dimension_values directly
-    response = ce_client.get_dimension_values(
+    response = call_cost_explorer(
+        ce_client,
+        'get_dimension_values',
         TimePeriod={
             'Start': start_date_formatted,
             'End': end_date_formatted
@@ -65,9 +258,11 @@ def get_all_linked_accounts(ce_client, start_date, end_date):
             'name': account_name
         })
     
-    # Check if there's a NextToken for pagination
-    while 'NextToken' in response:
-        response = ce_client.get_dimension_values(
+    # Check if there's a NextPageToken for pagination
+    while 'NextPageToken' in response:
+        response = call_cost_explorer(
+            ce_client,
+            'get_dimension_values',
             TimePeriod={
                 'Start': start_date_formatted,
                 'End': end_date_formatted
@@ -75,7 +270,7 @@ def get_all_linked_accounts(ce_client, start_date, end_date):
             Dimension='LINKED_ACCOUNT',
             Context='COST_AND_USAGE',
             MaxResults=2000,
-            NextToken=response['NextToken']
+            NextPageToken=response['NextPageToken']
         )
         
         for value in response.get('DimensionValues', []):
@@ -89,12 +284,89 @@ def get_all_linked_accounts(ce_client, start_date, end_date):
     
     return accounts
 
-def get_cost_and_usage(ce_client, start_date, end_date, account_id=None):
-    """Get cost and usage data from Cost Explorer with pagination"""
+def split_date_range(start_date, end_date, window_months=12):
+    """Split a date range into consecutive windows of at most window_months months.
+
+    Every window but the last ends on the first day of a month, so no month is split across two
+    windows (and two Cost Explorer result periods) even when the range starts mid-month.
+    """
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    
+    windows = []
+    window_start = start_dt
+    while window_start < end_dt:
+        window_end = min((window_start + relativedelta(months=window_months)).replace(day=1), end_dt)
+        windows.append((window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d')))
+        window_start = window_end
+    
+    return windows
+
+def fetch_cost_and_usage_window(ce_client, start_date, end_date, filters=None, group_by=None):
+    """Get one API-compatible window of monthly cost and usage grouped by service (or group_by), following pagination"""
+    request = {
+        'TimePeriod': {
+            'Start': start_date,
+            'End': end_date
+        },
+        'Granularity': 'MONTHLY',
+        'Metrics': ['AmortizedCost', 'UnblendedCost', 'UsageQuantity'],
+        'GroupBy': group_by or [SERVICE_GROUP_BY]
+    }
+    if filters:
+        request['Filter'] = filters
+    
+    # Initial request
+    response = call_cost_explorer(ce_client, 'get_cost_and_usage', **request)
+    
+    # Store all results
+    all_results = response
+    
+    # Handle pagination if there's a NextPageToken
+    periods = {period['TimePeriod']['Start']: period for period in all_results['ResultsByTime']}
+    while 'NextPageToken' in response:
+        response = call_cost_explorer(ce_client, 'get_cost_and_usage', NextPageToken=response['NextPageToken'], **request)
+        
+        # Append the groups from each paginated response to the same period of the original results
+        for period in response['ResultsByTime']:
+            start = period['TimePeriod']['Start']
+            if start in periods:
+                periods[start]['Groups'].extend(period['Groups'])
+            else:
+                periods[start] = period
+                all_results['ResultsByTime'].append(period)
+    
+    all_results.pop('NextPageToken', None)
+    return all_results
+
+def fetch_cost_and_usage(ce_client, start_date, end_date, filters=None, group_by=None):
+    """Fetch a date range of any length by splitting it into windows fetched concurrently, then stitch them"""
     # Validate and format dates
     start_date_formatted = validate_and_format_date(start_date, "start_date")
     end_date_formatted = validate_and_format_date(end_date, "end_date")
     
+    windows = split_date_range(start_date_formatted, end_date_formatted, FETCH_SETTINGS['window_months'])
+    if len(windows) == 1:
+        return fetch_cost_and_usage_window(ce_client, start_date_formatted, end_date_formatted, filters, group_by)
+    
+    print(f"Splitting {start_date_formatted} to {end_date_formatted} into {len(windows)} windows "
+          f"of up to {FETCH_SETTINGS['window_months']} months")
+    
+    with ThreadPoolExecutor(max_workers=min(FETCH_SETTINGS['max_workers'], len(windows))) as executor:
+        window_results = list(executor.map(
+            lambda window: fetch_cost_and_usage_window(ce_client, window[0], window[1], filters, group_by),
+            windows
+        ))
+    
+    # Stitch the windows back together in date order into one continuous response
+    all_results = window_results[0]
+    for window_result in window_results[1:]:
+        all_results['ResultsByTime'].extend(window_result['ResultsByTime'])
+    
+    return all_results
+
+def get_cost_and_usage(ce_client, start_date, end_date, account_id=None, group_by=None):
+    """Get cost and usage data from Cost Explorer with pagination"""
     filters = {
         'Dimensions': {
             'Key': 'SERVICE',
@@ -107,104 +379,126 @@ def get_cost_and_usage(ce_client, start_date, end_date, account_id=None):
             'Key': 'LINKED_ACCOUNT',
             'Values': [account_id]
         }
-
-    # Initial request
-    response = ce_client.get_cost_and_usage(
-        TimePeriod={
-            'Start': start_date_formatted,
-            'End': end_date_formatted
-        },
-        Granularity='MONTHLY',
-        Metrics=['AmortizedCost', 'UnblendedCost', 'UsageQuantity'],
-        GroupBy=[
-            {
-                'Type': 'DIMENSION',
-                'Key': 'SERVICE'
-            }
-        ],
-        Filter=filters
-    )
     
-    # Store all results
-    all_results = response
-    
-    # Handle pagination if there's a NextToken
-    while 'NextToken' in response:
-        next_token = response['NextToken']
-        
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date_formatted,
-                'End': end_date_formatted
-            },
-            Granularity='MONTHLY',
-            Metrics=['AmortizedCost', 'UnblendedCost', 'UsageQuantity'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ],
-            Filter=filters,
-            NextToken=next_token
-        )
-        
-        # Append the groups from each paginated response to the original results
-        for i, period in enumerate(response['ResultsByTime']):
-            all_results['ResultsByTime'][i]['Groups'].extend(period['Groups'])
-    
-    return all_results
+    return fetch_cost_and_usage(ce_client, start_date, end_date, filters, group_by)
 
 def get_organization_cost_by_service(ce_client, start_date, end_date):
     """Get organization-wide cost aggregated by service with pagination"""
-    # Validate and format dates
-    start_date_formatted = validate_and_format_date(start_date, "start_date")
-    end_date_formatted = validate_and_format_date(end_date, "end_date")
-    
-    # Initial request
-    response = ce_client.get_cost_and_usage(
-        TimePeriod={
-            'Start': start_date_formatted,
-            'End': end_date_formatted
+    return fetch_cost_and_usage(ce_client, start_date, end_date)
+
+def get_cost_forecast(ce_client, start_date, end_date, account_id=None):
+    """Get the monthly amortized cost forecast of the organization or one linked account"""
+    request = {
+        'TimePeriod': {
+            'Start': start_date,
+            'End': end_date
         },
-        Granularity='MONTHLY',
-        Metrics=['AmortizedCost', 'UnblendedCost', 'UsageQuantity'],
-        GroupBy=[
-            {
-                'Type': 'DIMENSION',
-                'Key': 'SERVICE'
+        'Metric': 'AMORTIZED_COST',
+        'Granularity': 'MONTHLY',
+        'PredictionIntervalLevel': PREDICTION_INTERVAL_LEVEL
+    }
+    if account_id:
+        request['Filter'] = {
+            'Dimensions': {
+                'Key': 'LINKED_ACCOUNT',
+                'Values': [account_id]
             }
-        ]
-    )
-    
-    # Store all results
-    all_results = response
+        }
     
-    # Handle pagination if there's a NextToken
-    while 'NextToken' in response:
-        next_token = response['NextToken']
-        
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date_formatted,
-                'End': end_date_formatted
-            },
-            Granularity='MONTHLY',
-            Metrics=['AmortizedCost', 'UnblendedCost', 'UsageQuantity'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ],
-            NextToken=next_token
+    return parse_forecast_response(call_cost_explorer(ce_client, 'get_cost_forecast', **request))
+
+def get_cost_forecasts(ce_client, account_ids, forecast_cache):
+    """Get next-quarter forecasts for many accounts concurrently under the shared rate limiter.
+
+    'organization_summary' stands for the whole organization. Forecasts already in today's cache
+    are not requested again. Accounts whose request was throttled map to None; add_local_forecasts
+    fills them with the local trend forecast.
+    """
+    start_date, end_date, _ = get_forecast_period()
+    pending = [account_id for account_id in account_ids if forecast_cache.get(account_id) is None]
+    
+    def fetch_forecast(account_id):
+        try:
+            return get_cost_forecast(ce_client, start_date, end_date,
+                                     None if account_id == 'organization_summary' else account_id)
+        except ClientError as e:
+            if e.response['Error']['Code'] in FORECAST_FALLBACK_ERRORS:
+                return None
+            raise
+    
+    if ce_client is not None and pending:
+        print(f"Requesting cost forecasts for {len(pending)} of {len(account_ids)} accounts ({start_date} to {end_date})...")
+        with ThreadPoolExecutor(max_workers=min(FETCH_SETTINGS['max_workers'], len(pending))) as executor:
+            for account_id, forecast in zip(pending, executor.map(fetch_forecast, pending)):
+                if forecast is not None:
+                    forecast_cache.put(account_id, forecast)
+        forecast_cache.save()
+    
+    forecasts = {account_id: forecast_cache.get(account_id) for account_id in account_ids}
+    fallback_count = sum(forecast is None for forecast in forecasts.values())
+    if fallback_count:
+        print(f"Using the local trend forecast for {fallback_count} accounts")
+    return forecasts
+
+# Tag keys/values and cost category names/values per client and period, looked up once per process
+GROUP_VALUES_CACHE = {}
+GROUP_VALUES_LOCK = threading.Lock()
+
+def list_group_values(ce_client, group_type, start_date, end_date, key=None):
+    """List tag keys (or one key's values) or cost category names (or one category's values), following pagination"""
+    request = {
+        'TimePeriod': {
+            'Start': start_date,
+            'End': end_date
+        }
+    }
+    if group_type == 'TAG':
+        operation, result_field = 'get_tags', 'Tags'
+        if key:
+            request['TagKey'] = key
+    else:
+        operation = 'get_cost_categories'
+        result_field = 'CostCategoryValues' if key else 'CostCategoryNames'
+        if key:
+            request['CostCategoryName'] = key
+    
+    values = []
+    while True:
+        response = call_cost_explorer(ce_client, operation, **request)
+        values.extend(response.get(result_field, []))
+        if not response.get('NextPageToken'):
+            return values
+        request['NextPageToken'] = response['NextPageToken']
+
+def get_group_values(ce_client, group_type, start_date, end_date, key=None):
+    """Cached list_group_values"""
+    cache_key = (id(ce_client), group_type, key, start_date, end_date)
+    with GROUP_VALUES_LOCK:
+        if cache_key in GROUP_VALUES_CACHE:
+            return GROUP_VALUES_CACHE[cache_key]
+    
+    values = list_group_values(ce_client, group_type, start_date, end_date, key)
+    with GROUP_VALUES_LOCK:
+        GROUP_VALUES_CACHE[cache_key] = values
+    return values
+
+def discover_group_values(ce_client, group_by, start_date, end_date):
+    """Check that a tag key or cost category exists in the period and return its values"""
+    keys = get_group_values(ce_client, group_by['Type'], start_date, end_date)
+    if group_by['Key'] not in keys:
+        raise ValueError(
+            f"{get_group_by_label(group_by)} has no cost data between {start_date} and {end_date}. "
+            f"Available: {', '.join(sorted(keys)) or 'none'}"
         )
-        
-        # Append the groups from each paginated response to the original results
-        for i, period in enumerate(response['ResultsByTime']):
-            all_results['ResultsByTime'][i]['Groups'].extend(period['Groups'])
-    
-    return all_results
+    return get_group_values(ce_client, group_by['Type'], start_date, end_date, group_by['Key'])
+
+def get_cost_by_group_and_account(ce_client, start_date, end_date, group_by):
+    """Get cost per tag or cost category value and linked account.
+
+    Cost Explorer allows two GroupBy keys, so grouping by the value and LINKED_ACCOUNT together
+    serves the organization view and every account view from one fetch per period window.
+    """
+    return fetch_cost_and_usage(ce_client, start_date, end_date, group_by=[group_by, LINKED_ACCOUNT_GROUP_BY])
 
 def process_cost_data(response, account_id, account_name):
     """Process the cost data into a DataFrame"""
@@ -239,7 +533,7 @@ def process_cost_data(response, account_id, account_name):
                 'Refund ($)': refund
             })
     
-    return pd.DataFrame(results)
+    return apply_frame_schema(pd.DataFrame(results))
 
 def process_organization_summary(response):
     """Process the organization summary cost data into a DataFrame"""
@@ -274,7 +568,49 @@ def process_organization_summary(response):
                 'Total Refund ($)': refund
             })
     
-    return pd.DataFrame(results)
+    return apply_frame_schema(pd.DataFrame(results))
+
+def apply_frame_schema(df):
+    """Convert a cost frame to the compact schema when --compact-frames is set"""
+    return compact_cost_frame(df) if FRAME_SETTINGS['compact'] else df
+
+def get_group_value_name(group_key, group_by):
+    """Strip the 'key$' prefix Cost Explorer adds to tag and cost category values"""
+    value = group_key.split('$', 1)[1] if '$' in group_key else group_key
+    if value:
+        return value
+    return '(untagged)' if group_by['Type'] == 'TAG' else '(uncategorized)'
+
+def process_grouped_cost_data(response, group_by, account_names):
+    """Process a value x LINKED_ACCOUNT response into one row per account, period and value"""
+    group_column = get_group_by_label(group_by)
+    results = []
+    
+    for period in response['ResultsByTime']:
+        start_date = period['TimePeriod']['Start']
+        end_date = period['TimePeriod']['End']
+        
+        for group in period['Groups']:
+            group_key, account_id = group['Keys']
+            metrics = group['Metrics']
+            amortized_cost = float(metrics['AmortizedCost']['Amount'])
+            
+            results.append({
+                'Account ID': account_id,
+                'Account Name': account_names.get(account_id, f"Account {account_id}"),
+                'Start Date': start_date,
+                'End Date': end_date,
+                group_column: get_group_value_name(group_key, group_by),
+                'Amortized Cost ($)': amortized_cost,
+                'Unblended Cost ($)': float(metrics['UnblendedCost']['Amount']),
+                'Usage Quantity': float(metrics['UsageQuantity']['Amount']),
+                'Refund ($)': abs(amortized_cost) if amortized_cost < 0 else 0
+            })
+    
+    return pd.DataFrame(results, columns=[
+        'Account ID', 'Account Name', 'Start Date', 'End Date', group_column,
+        'Amortized Cost ($)', 'Unblended Cost ($)', 'Usage Quantity', 'Refund ($)'
+    ])
 
 def get_display_end_date(end_date):
     """Get the appropriate end date for display purposes (charts, titles)"""
@@ -314,48 +650,24 @@ def get_chart_directory(account_id, end_date):
     else:
         return f"aws_cost_reports/{account_id}/{year}/{month}"
 
-def create_cost_visualization(df, title, account_id, start_date, end_date, is_organization=False):
-    """Create AWS Cost Explorer style visualization with refunds and cost amounts on segments"""
-    # Set up the style to look like AWS Cost Explorer
-    plt.style.use('default')
-    sns.set_palette("husl")
-    
-    # Prepare data for visualization
-    if is_organization:
-        cost_column = 'Total Amortized Cost ($)'
-        service_column = 'Service Name'
-        month_column = 'Month'
-    else:
-        cost_column = 'Amortized Cost ($)'
-        service_column = 'Service Name'
-        # Create month column from start date
-        df['Month'] = pd.to_datetime(df['Start Date']).dt.strftime('%Y-%m')
-        month_column = 'Month'
-    
+def build_chart_data(month_service_costs, cost_column, service_column, total_cost, service_count):
+    """Build the monthly top-9 + Others pivot and refunds series from costs indexed by (month, service)"""
     # Separate positive costs and refunds
-    df_positive = df[df[cost_column] >= 0].copy()
-    df_refunds = df[df[cost_column] < 0].copy()
-    
-    # Group positive costs by month and service
-    monthly_costs = df_positive.groupby([month_column, service_column])[cost_column].sum().reset_index()
+    positive_costs = month_service_costs[month_service_costs >= 0]
     
     # Group refunds by month (aggregate all refunds together)
-    monthly_refunds = df_refunds.groupby(month_column)[cost_column].sum().reset_index()
-    monthly_refunds['Service_Category'] = 'Refunds/Credits'
+    monthly_refunds = month_service_costs[month_service_costs < 0].groupby(level=0).sum()
     
     # Get top 9 services overall for positive costs
-    top_services = df_positive.groupby(service_column)[cost_column].sum().nlargest(9).index.tolist()
-    
-    # Create "Others" category for remaining services
-    monthly_costs['Service_Category'] = monthly_costs[service_column].apply(
-        lambda x: x if x in top_services else 'Others'
-    )
+    top_services = positive_costs.groupby(level=1).sum().nlargest(9).index
     
-    # Regroup with the new category
-    monthly_summary = monthly_costs.groupby([month_column, 'Service_Category'])[cost_column].sum().reset_index()
+    # Create "Others" category for remaining services and regroup with the new category
+    services = positive_costs.index.get_level_values(1)
+    service_category = pd.Index(np.where(services.isin(top_services), services, 'Others'), name='Service_Category')
+    monthly_summary = positive_costs.groupby([positive_costs.index.get_level_values(0), service_category]).sum()
     
     # Pivot the data for stacked bar chart
-    pivot_data = monthly_summary.pivot(index=month_column, columns='Service_Category', values=cost_column).fillna(0)
+    pivot_data = monthly_summary.unstack('Service_Category', fill_value=0)
     
     # Sort columns by total cost (descending), but keep 'Others' at the end
     column_totals = pivot_data.sum().sort_values(ascending=False)
@@ -366,15 +678,176 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
     
     pivot_data = pivot_data[column_totals.index]
     
-    # Create refunds pivot data
-    refunds_pivot = monthly_refunds.set_index(month_column)[cost_column] if not monthly_refunds.empty else pd.Series(dtype=float)
-    
     # Ensure all months are represented in refunds data
-    all_months = pivot_data.index
-    refunds_data = pd.Series(index=all_months, dtype=float).fillna(0)
-    for month in refunds_pivot.index:
-        if month in refunds_data.index:
-            refunds_data[month] = refunds_pivot[month]
+    refunds_data = monthly_refunds.reindex(pivot_data.index, fill_value=0).astype(float)
+    
+    return {
+        'cost_column': cost_column,
+        'service_column': service_column,
+        'pivot_data': pivot_data,
+        'refunds_data': refunds_data,
+        'total_cost': total_cost,
+        'service_count': service_count
+    }
+
+def summarize_organization(df):
+    """Aggregate the organization frame once into every view the org workbook and chart need"""
+    value_columns = ['Total Amortized Cost ($)', 'Total Refund ($)', 'Total Unblended Cost ($)']
+    
+    # The only pass over the full frame; every view below is derived from this small aggregate
+    service_month_costs = sum_costs(df, ['Service Name', 'Month'], value_columns)
+    
+    # Total costs by service across all months, highest cost first, with a TOTAL row at the bottom
+    service_totals = service_month_costs.groupby(level='Service Name').sum()
+    service_summary = service_totals.sort_values('Total Amortized Cost ($)', ascending=False).reset_index()
+    service_summary.loc[len(service_summary)] = ['TOTAL'] + service_totals.sum().tolist()
+    
+    # Amortized cost by service and month
+    monthly_breakdown = service_month_costs['Total Amortized Cost ($)'].unstack('Month')
+    monthly_breakdown.columns = [f"{month} (Total Amortized Cost ($))" for month in monthly_breakdown.columns]
+    monthly_breakdown = monthly_breakdown.reset_index()
+    
+    # Chart data reuses the same aggregate, re-indexed as (month, service)
+    amortized_by_month = service_month_costs['Total Amortized Cost ($)'].swaplevel().sort_index()
+    chart_data = build_chart_data(
+        amortized_by_month,
+        'Total Amortized Cost ($)',
+        'Service Name',
+        total_cost=service_totals['Total Amortized Cost ($)'].sum(),
+        service_count=len(service_totals)
+    )
+    
+    return {
+        'service_summary': service_summary,
+        'monthly_breakdown': monthly_breakdown,
+        'chart_data': chart_data
+    }
+
+def prepare_cost_chart_data(df, is_organization=False, summary=None, group_column='Service Name'):
+    """Prepare the monthly top-9 + Others pivot and refunds series shared by the PNG chart and the dashboard"""
+    if is_organization:
+        if summary is None:
+            summary = summarize_organization(df)
+        return summary['chart_data']
+    
+    cost_column = 'Amortized Cost ($)'
+    service_column = group_column
+    # Month from start date, without adding a column to the caller's frame
+    months = pd.to_datetime(df['Start Date']).dt.strftime('%Y-%m').rename('Month')
+    month_service_costs = sum_costs(df, [months, df[service_column]], cost_column)
+    
+    return build_chart_data(
+        month_service_costs,
+        cost_column,
+        service_column,
+        total_cost=to_dollars(df[cost_column].sum()),
+        service_count=df[service_column].nunique()
+    )
+
+def get_monthly_history(df, is_organization=False):
+    """Net amortized cost per full month, the input of the local trend forecast"""
+    cost_column = 'Total Amortized Cost ($)' if is_organization else 'Amortized Cost ($)'
+    period_start = pd.to_datetime(df['Start Date'])
+    period_end = pd.to_datetime(df['End Date'])
+    # A partial first or last month would bend the trend, so only full calendar months are used
+    full_months = (period_start.dt.day == 1) & (period_end == period_start + pd.offsets.MonthBegin(1))
+    months = period_start[full_months].dt.strftime('%Y-%m')
+    return sum_costs(df.loc[full_months], months, cost_column)
+
+def get_accounts_monthly_history(ce_client, account_ids, start_date, end_date, cur_frames=None):
+    """Accounts x full months net amortized cost matrix, from one query grouped by linked account (or the CUR aggregate)"""
+    if cur_frames is not None:
+        aggregated = cur_frames.aggregated[cur_frames.aggregated['account_id'].isin(account_ids)]
+        rows = pd.DataFrame({
+            'account_id': aggregated['account_id'],
+            'start': pd.to_datetime(aggregated['Start Date']),
+            'end': pd.to_datetime(aggregated['End Date']),
+            'cost': aggregated['amortized_cost']
+        })
+    else:
+        response = fetch_cost_and_usage(
+            ce_client, start_date, end_date,
+            {'Dimensions': {'Key': 'LINKED_ACCOUNT', 'Values': list(account_ids)}},
+            [LINKED_ACCOUNT_GROUP_BY]
+        )
+        rows = pd.DataFrame([
+            {
+                'account_id': group['Keys'][0],
+                'start': result['TimePeriod']['Start'],
+                'end': result['TimePeriod']['End'],
+                'cost': float(group['Metrics']['AmortizedCost']['Amount'])
+            }
+            for result in response['ResultsByTime'] for group in result['Groups']
+        ], columns=['account_id', 'start', 'end', 'cost'])
+        rows['start'] = pd.to_datetime(rows['start'])
+        rows['end'] = pd.to_datetime(rows['end'])
+    
+    # Same full calendar months as get_monthly_history
+    full_months = (rows['start'].dt.day == 1) & (rows['end'] == rows['start'] + pd.offsets.MonthBegin(1))
+    rows = rows[full_months]
+    return rows.pivot_table(index=rows['account_id'], columns=rows['start'].dt.strftime('%Y-%m'),
+                            values='cost', aggfunc='sum').sort_index(axis=1)
+
+def add_local_forecasts(forecasts, ce_client, start_date, end_date, cur_frames=None):
+    """Fill the accounts without a Cost Explorer forecast with the local trend forecast.
+
+    The history of all of them is fetched with one query and fitted with one least-squares
+    solve; accounts without any full month of history keep None.
+    """
+    account_ids = [account_id for account_id, forecast in forecasts.items()
+                   if forecast is None and account_id != 'organization_summary']
+    if not account_ids:
+        return forecasts
+    history = get_accounts_monthly_history(ce_client, account_ids, start_date, end_date, cur_frames)
+    if not history.empty:
+        _, _, forecast_months = get_forecast_period()
+        forecasts.update(forecast_monthly_costs(history, forecast_months))
+    return forecasts
+
+def resolve_forecast(forecasts, account_id, df, is_organization=False):
+    """Get a forecast, falling back to the local trend forecast of the frame's own history.
+
+    Accounts are normally filled by add_local_forecasts before the loop, so this fallback
+    only fits the organization or an account without history in that matrix.
+    """
+    if forecasts is None:
+        return None
+    if forecasts.get(account_id) is not None:
+        return forecasts[account_id]
+    
+    history = get_monthly_history(df, is_organization)
+    if history.empty:
+        return None
+    _, _, forecast_months = get_forecast_period()
+    return forecast_monthly_costs(history.to_frame(account_id).T, forecast_months)[account_id]
+
+def calculate_months_in_range(start_date, end_date):
+    """Calculate number of months in the date range (at least 1)"""
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    months_diff = (end_dt.year - start_dt.year) * 12 + (end_dt.month - start_dt.month)
+    if months_diff == 0:
+        months_diff = 1  # At least 1 month
+    return months_diff
+
+def create_cost_visualization(df, title, account_id, start_date, end_date, is_organization=False, chart_data=None, group_by=None, forecast=None, profiles=None, variant=None, directory=None):
+    """Create AWS Cost Explorer style visualization with refunds and cost amounts on segments.
+
+    Bars are split by service, or by tag / cost category value when group_by is given. A forecast
+    adds hatched bars with the prediction interval after the historical months. The figure is
+    built once and saved in every render profile; returns the chart filenames. variant names a
+    derived view of the same costs, such as 'allocated', in the chart file name. directory
+    replaces the account's report folder.
+    """
+    # Set up the style to look like AWS Cost Explorer
+    plt.style.use('default')
+    sns.set_palette("husl")
+    
+    if chart_data is None:
+        group_column = 'Service Name' if group_by is None else get_group_by_label(group_by)
+        chart_data = prepare_cost_chart_data(df, is_organization, group_column=group_column)
+    pivot_data = chart_data['pivot_data']
+    refunds_data = chart_data['refunds_data']
     
     # Create the figure with subplots for title, table, and chart
     fig = plt.figure(figsize=(14, 11))
@@ -395,23 +868,15 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
     ax = plt.subplot2grid((10, 1), (2, 0), rowspan=8)
     
     # Calculate summary statistics for the table
-    total_cost = df[cost_column].sum()
-    
-    # Calculate number of months in the date range
-    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-    months_diff = (end_dt.year - start_dt.year) * 12 + (end_dt.month - start_dt.month)
-    if months_diff == 0:
-        months_diff = 1  # At least 1 month
-    
-    average_monthly_cost = total_cost / months_diff
+    total_cost = chart_data['total_cost']
+    average_monthly_cost = total_cost / calculate_months_in_range(start_date, end_date)
     
     # Count total unique services (regardless of cost)
-    service_count = len(df[service_column].unique())
+    service_count = chart_data['service_count']
     
     # Table data
     table_data = [
-        ['Total Cost', 'Average Monthly Cost', 'Total Services'],
+        ['Total Cost', 'Average Monthly Cost', 'Total Services' if group_by is None else 'Total Values'],
         [f'${total_cost:,.2f}', f'${average_monthly_cost:,.2f}', f'{service_count}']
     ]
     
@@ -441,18 +906,7 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
         table[(1, i)].set_linewidth(1.5)
     
     # Define colors - AWS-like color scheme
-    colors = [
-        '#FF9900',  # AWS Orange
-        '#146EB4',  # AWS Blue
-        '#FF6B6B',  # Red
-        '#4ECDC4',  # Teal
-        '#45B7D1',  # Light Blue
-        '#96CEB4',  # Green
-        '#FECA57',  # Yellow
-        '#FF9FF3',  # Pink
-        '#54A0FF',  # Blue
-        '#C7ECEE'   # Light Gray for Others
-    ]
+    colors = CHART_COLORS
     
     # Create stacked bar chart for positive costs
     bottom = np.zeros(len(pivot_data.index))
@@ -483,7 +937,7 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
     # Add refunds as negative bars (green)
     if not refunds_data.empty and refunds_data.abs().sum() > 0:
         refund_bars = ax.bar(range(len(refunds_data.index)), refunds_data.values, 
-                            label='Refunds/Credits', color='#00D084', alpha=0.8)
+                            label='Refunds/Credits', color=REFUNDS_COLOR, alpha=0.8)
         
         # Add refund amounts on the negative bars
         for j, refund in enumerate(refunds_data.values):
@@ -504,6 +958,30 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
                    ha='center', va='bottom', fontweight='bold', fontsize=10, 
                    bbox=dict(boxstyle="round,pad=0.3", facecolor='lightblue', alpha=0.7))
     
+    month_labels = list(pivot_data.index)
+    if forecast is not None:
+        # The forecast covers the full months after the current one; months in between (such as the
+        # open month after a report of closed months) are left as a shaded gap rather than dropped
+        gap_months = get_gap_months(month_labels[-1], forecast['months'])
+        if gap_months:
+            ax.axvspan(len(month_labels) - 0.5, len(month_labels) + len(gap_months) - 0.5,
+                       color='#E2E8F0', alpha=0.6, label='Not in report')
+            month_labels += gap_months
+        positions = np.arange(len(month_labels), len(month_labels) + len(forecast['months']))
+        mean = np.array(forecast['mean'])
+        lower = np.array(forecast['lower'])
+        upper = np.array(forecast['upper'])
+        source = 'Cost Explorer' if forecast['source'] == 'api' else 'local trend'
+        
+        ax.bar(positions, mean, facecolor='none', edgecolor=CHART_COLORS[1], hatch='//',
+               linewidth=1.5, label=f'Forecast ({source})')
+        ax.errorbar(positions, mean, yerr=[mean - lower, upper - mean], fmt='none',
+                    ecolor='#2D3748', capsize=6, alpha=0.7)
+        for position, value, top in zip(positions, mean, upper):
+            ax.text(position, top * 1.01, f'Forecast:\n${value:,.2f}', ha='center', va='bottom',
+                    fontweight='bold', fontsize=9, color=CHART_COLORS[1])
+        month_labels += forecast['months']
+    
     # Customize the chart (no title since it's in its own subplot)
     ax.set_ylabel('Cost (USD)', fontsize=12, fontweight='bold')
     
@@ -511,8 +989,8 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
     ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.2f}'))
     
     # Set x-axis labels to month names (horizontal)
-    ax.set_xticks(range(len(pivot_data.index)))
-    ax.set_xticklabels(pivot_data.index, rotation=0)
+    ax.set_xticks(range(len(month_labels)))
+    ax.set_xticklabels(month_labels, rotation=0)
     
     # Add horizontal line at y=0 for reference
     ax.axhline(y=0, color='black', linestyle='-', alpha=0.3, linewidth=1)
@@ -527,45 +1005,74 @@ def create_cost_visualization(df, title, account_id, start_date, end_date, is_or
     plt.tight_layout()
     
     # Save the chart
-    chart_directory = get_chart_directory(account_id, end_date)
+    chart_directory = directory or get_chart_directory(account_id, end_date)
     os.makedirs(chart_directory, exist_ok=True)
     
-    chart_filename = f"{chart_directory}/aws-cost-chart-{account_id}-{start_date}_to_{end_date}.png"
-    plt.savefig(chart_filename, dpi=300, bbox_inches='tight', facecolor='white')
-    plt.close()
+    grouping = '' if group_by is None else f"-{get_group_by_slug(group_by)}"
+    if variant:
+        grouping += f"-{variant}"
+    chart_filenames = save_figure(fig, f"{chart_directory}/aws-cost-chart-{account_id}{grouping}",
+                                  f"{start_date}_to_{end_date}", profiles or RENDER_SETTINGS['profiles'])
+    plt.close(fig)
     
-    print(f"Cost visualization saved to {chart_filename}")
-    return chart_filename
+    print(f"Cost visualization saved to {', '.join(chart_filenames)}")
+    return chart_filenames
 
-def save_to_excel(df, account_id, start_date, end_date):
-    """Save DataFrame to Excel file in the specified directory structure"""
-    # Use directory date logic to handle end dates that are 1st of month
+def get_dashboard_directory(start_date, end_date):
+    """Get the directory path for the HTML dashboard and its data shards"""
     directory_date = get_directory_date(end_date)
     year = directory_date.strftime('%Y')
     month = directory_date.strftime('%m')
     
-    # Create directory structure - both individual accounts and organization use YEAR/MONTH format
-    directory = f"aws_cost_reports/{account_id}/{year}/{month}"
+    return f"aws_cost_reports/dashboard/{year}/{month}/{start_date}_to_{end_date}"
+
+def render_cost_report(df, title, account_id, account_name, start_date, end_date, output_format, dashboard, is_organization=False, summary=None, forecasts=None):
+    """Render one report as a PNG chart and/or a dashboard shard from a single chart data preparation"""
+    chart_data = prepare_cost_chart_data(df, is_organization, summary)
+    
+    if output_format in ('png', 'both'):
+        create_cost_visualization(df, title, account_id, start_date, end_date,
+                                  is_organization=is_organization, chart_data=chart_data,
+                                  forecast=resolve_forecast(forecasts, account_id, df, is_organization))
+    
+    if dashboard is not None:
+        dashboard.add_report(chart_data, account_id, account_name, title,
+                             calculate_months_in_range(start_date, end_date))
+
+def save_to_excel(df, account_id, start_date, end_date, directory=None):
+    """Save DataFrame to Excel file in the specified directory structure (or directory)"""
+    if directory is None:
+        # Use directory date logic to handle end dates that are 1st of month
+        directory_date = get_directory_date(end_date)
+        year = directory_date.strftime('%Y')
+        month = directory_date.strftime('%m')
+        
+        # Create directory structure - both individual accounts and organization use YEAR/MONTH format
+        directory = f"aws_cost_reports/{account_id}/{year}/{month}"
     os.makedirs(directory, exist_ok=True)
     
     # Create filename
     filename = f"{directory}/aws-cost-report-{account_id}-{start_date}_to_{end_date}.xlsx"
     
     # Save to Excel
-    df.to_excel(filename, index=False)
+    export_cost_frame(df).to_excel(filename, index=False)
     print(f"Report saved to {filename}")
     
     return filename
 
-def save_organization_summary(df, start_date, end_date):
-    """Save organization summary to Excel file"""
-    # Use directory date logic to handle end dates that are 1st of month
-    directory_date = get_directory_date(end_date)
-    year = directory_date.strftime('%Y')
-    month = directory_date.strftime('%m')
-    
-    # Create directory structure - organization uses YEAR/MONTH format
-    directory = f"aws_cost_reports/organization_summary/{year}/{month}"
+def save_organization_summary(df, start_date, end_date, summary=None, directory=None):
+    """Save organization summary to Excel file (in the organization report folder, or directory)"""
+    if summary is None:
+        summary = summarize_organization(df)
+    
+    if directory is None:
+        # Use directory date logic to handle end dates that are 1st of month
+        directory_date = get_directory_date(end_date)
+        year = directory_date.strftime('%Y')
+        month = directory_date.strftime('%m')
+        
+        # Create directory structure - organization uses YEAR/MONTH format
+        directory = f"aws_cost_reports/organization_summary/{year}/{month}"
     os.makedirs(directory, exist_ok=True)
     
     # Create filename
@@ -574,41 +1081,15 @@ def save_organization_summary(df, start_date, end_date):
     # Save to Excel
     with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
         # Save detailed data to first sheet
-        df.to_excel(writer, sheet_name='Service Details', index=False)
-        
-        # Create a pivot table summarizing total costs by service across all months
-        pivot_df = df.pivot_table(
-            index=['Service Name'],
-            values=['Total Amortized Cost ($)', 'Total Unblended Cost ($)', 'Total Refund ($)'],
-            aggfunc='sum'
-        ).reset_index()
-        
-        # Sort by highest cost
-        pivot_df = pivot_df.sort_values('Total Amortized Cost ($)', ascending=False)
-        
-        # Add total row at the bottom
-        total_row = {
-            'Service Name': 'TOTAL',
-            'Total Amortized Cost ($)': pivot_df['Total Amortized Cost ($)'].sum(),
-            'Total Unblended Cost ($)': pivot_df['Total Unblended Cost ($)'].sum(),
-            'Total Refund ($)': pivot_df['Total Refund ($)'].sum()
-        }
-        pivot_df = pd.concat([pivot_df, pd.DataFrame([total_row])], ignore_index=True)
+        export_cost_frame(df).to_excel(writer, sheet_name='Service Details', index=False)
+        
+        # Service Summary and Monthly Breakdown come from the shared single-pass aggregation
+        pivot_df = summary['service_summary']
         
         # Save to second sheet
         pivot_df.to_excel(writer, sheet_name='Service Summary', index=False)
         
-        # Create pivot table by month and service
-        monthly_pivot = df.pivot_table(
-            index=['Service Name'],
-            columns=['Month'],
-            values=['Total Amortized Cost ($)'],
-            aggfunc='sum'
-        )
-        
-        # Flatten the multi-index
-        monthly_pivot.columns = [f"{col[1]} ({col[0]})" for col in monthly_pivot.columns]
-        monthly_pivot = monthly_pivot.reset_index()
+        monthly_pivot = summary['monthly_breakdown']
         
         # Save to third sheet
         monthly_pivot.to_excel(writer, sheet_name='Monthly Breakdown', index=False)
@@ -638,67 +1119,307 @@ def save_organization_summary(df, start_date, end_date):
     print(f"Organization summary report saved to {filename}")
     return filename
 
+def save_grouped_cost_summary(df, group_by, group_values, start_date, end_date):
+    """Save the organization-wide cost by tag or cost category value to Excel"""
+    group_column = get_group_by_label(group_by)
+    value_columns = ['Amortized Cost ($)', 'Refund ($)', 'Unblended Cost ($)']
+    months = pd.to_datetime(df['Start Date']).dt.strftime('%Y-%m').rename('Month')
+    
+    # Discovered values without cost in the period are listed with zero cost
+    value_totals = df.groupby(group_column)[value_columns].sum()
+    known_values = [value or get_group_value_name('', group_by) for value in group_values]
+    value_totals = value_totals.reindex(value_totals.index.union(pd.Index(known_values)), fill_value=0)
+    value_summary = value_totals.sort_values('Amortized Cost ($)', ascending=False).rename_axis(group_column).reset_index()
+    value_summary.loc[len(value_summary)] = ['TOTAL'] + value_totals.sum().tolist()
+    
+    monthly_breakdown = df.groupby([df[group_column], months])['Amortized Cost ($)'].sum().unstack('Month', fill_value=0)
+    account_breakdown = df.groupby(['Account ID', 'Account Name', group_column])['Amortized Cost ($)'].sum().unstack(
+        group_column, fill_value=0
+    )
+    
+    directory_date = get_directory_date(end_date)
+    directory = f"aws_cost_reports/organization_summary/{directory_date.strftime('%Y')}/{directory_date.strftime('%m')}"
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{directory}/aws-organization-cost-by-{get_group_by_slug(group_by)}-{start_date}_to_{end_date}.xlsx"
+    
+    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+        df.to_excel(writer, sheet_name='Details', index=False)
+        value_summary.to_excel(writer, sheet_name='Value Summary', index=False)
+        monthly_breakdown.reset_index().to_excel(writer, sheet_name='Monthly Breakdown', index=False)
+        account_breakdown.reset_index().to_excel(writer, sheet_name='By Account', index=False)
+        
+        workbook = writer.book
+        currency_format = workbook.add_format({'num_format': '$#,##0.00'})
+        total_format = workbook.add_format({'bold': True, 'num_format': '$#,##0.00', 'bg_color': '#D9D9D9'})
+        worksheet = writer.sheets['Value Summary']
+        worksheet.set_column('A:A', 30)
+        worksheet.set_column('B:D', 18, currency_format)
+        worksheet.set_row(len(value_summary), None, total_format)
+    
+    print(f"Organization cost by {group_column} saved to {filename}")
+    return filename
+
+def generate_grouped_reports(ce_client, group_by, accounts, start_date, end_date, account_id=None, shared=None):
+    """Fetch one grouping once (or take it from a batch's shared results) and build the organization and per-account reports from it"""
+    group_column = get_group_by_label(group_by)
+    print(f"Generating cost reports by {group_column}...")
+    
+    if shared is not None:
+        group_values = shared.group_values(group_by)
+        response = shared.group_response(group_by, start_date, end_date)
+    else:
+        group_values = discover_group_values(ce_client, group_by, start_date, end_date)
+        response = get_cost_by_group_and_account(ce_client, start_date, end_date, group_by)
+    account_names = {account['id']: account['name'] for account in accounts}
+    df = process_grouped_cost_data(response, group_by, account_names)
+    
+    save_grouped_cost_summary(df, group_by, group_values, start_date, end_date)
+    if df.empty:
+        print(f"No cost data by {group_column}")
+        return
+    
+    display_end_date = get_display_end_date(end_date)
+    org_df = df.groupby(['Start Date', 'End Date', group_column], sort=True)[
+        ['Amortized Cost ($)', 'Unblended Cost ($)', 'Usage Quantity', 'Refund ($)']
+    ].sum().reset_index()
+    create_cost_visualization(
+        org_df,
+        f"AWS Organization Cost by {group_column} ({start_date} to {display_end_date})",
+        "organization_summary",
+        start_date,
+        end_date,
+        group_by=group_by
+    )
+    
+    for group_account_id, account_df in df.groupby('Account ID', sort=True):
+        if account_id and group_account_id != account_id:
+            continue
+        account_name = account_names.get(group_account_id, f"Account {group_account_id}")
+        create_cost_visualization(
+            account_df,
+            f"AWS Cost by {group_column} - {account_name} ({start_date} to {display_end_date})",
+            group_account_id,
+            start_date,
+            end_date,
+            group_by=group_by
+        )
+
+def get_current_rss_mb():
+    """Get the current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # No /proc (e.g. macOS): fall back to the peak, which is an upper bound of the current size
+        return get_peak_rss_mb()
+
+def get_peak_rss_mb():
+    """Get the peak resident set size of this process in MB"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def release_memory(memory_budget_mb=None):
+    """Drop matplotlib state and collect garbage, then enforce the memory budget"""
+    plt.close('all')
+    gc.collect()
+    
+    rss_mb = get_current_rss_mb()
+    if memory_budget_mb and rss_mb > memory_budget_mb:
+        raise MemoryError(
+            f"Resident memory {rss_mb:,.0f} MB exceeds the --memory-budget-mb limit of {memory_budget_mb:,.0f} MB"
+        )
+    return rss_mb
+
+def generate_account_report(ce_client, account_id, account_name, start_date, end_date, output_format, dashboard, store=None, df=None, forecasts=None):
+    """Fetch (unless a frame is given), save and render the cost report for one linked account; returns its totals"""
+    if df is None:
+        response = get_cost_and_usage(ce_client, start_date, end_date, account_id)
+        df = process_cost_data(response, account_id, account_name)
+    save_to_excel(df, account_id, start_date, end_date)
+    if store is not None:
+        store.write_frame(ACCOUNTS_DATASET, export_cost_frame(df), account_id)
+    
+    # Create visualization for the account
+    print(f"Creating cost visualization for account {account_id}...")
+    display_end_date = get_display_end_date(end_date)
+    render_cost_report(
+        df,
+        f"AWS Cost by Service - {account_name} ({start_date} to {display_end_date})",
+        account_id,
+        account_name,
+        start_date,
+        end_date,
+        output_format,
+        dashboard,
+        is_organization=False,
+        forecasts=forecasts
+    )
+    return summarize_totals(df)
+
+# Subcommands for offline analysis and the report server; anything else is a regular report run.
+# Their modules are imported on demand so report runs do not need their dependencies.
+SUBCOMMANDS = {
+    'allocate': ('cost_allocation', 'run_allocation'),
+    'batch': ('cost_batch', 'run_batch'),
+    'compare': ('cost_comparison', 'run_comparison_report'),
+    'drilldown': ('cost_drilldown', 'run_drilldown'),
+    'query': ('cost_query', 'run_query'),
+    'serve': ('cost_report_server', 'run_server')
+}
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        module_name, function_name = SUBCOMMANDS[sys.argv[1]]
+        getattr(importlib.import_module(module_name), function_name)(sys.argv[2:])
+        return
+    
     args = parse_arguments()
+    payers = get_payer_organizations(args)
+    if payers:
+        run_multi_payer_reports(args, payers)
+    else:
+        run_report(args)
+
+def run_report(args, session=None, payer_index=0, shared=None):
+    """Run every report of one payer organization and return its monthly service breakdown.
+
+    shared is the BatchResults of a batch run; its pre-fetched data replaces every cost query.
+    """
     start_date = args.start_date
     end_date = args.end_date
     account_id = args.account_id
+    output_format = args.output_format
+    streaming = args.streaming
+    memory_budget_mb = args.memory_budget_mb
+    
+    FETCH_SETTINGS['window_months'] = args.window_months
+    FETCH_SETTINGS['max_workers'] = args.max_workers
+    FRAME_SETTINGS['compact'] = args.compact_frames
+    RENDER_SETTINGS['profiles'] = args.render_profiles
+    CE_RATE_LIMITER.set_rate(args.requests_per_second)
+    
+    store = None if args.no_store else CostDataStore(args.data_dir)
+    group_bys = args.group_by or []
+    if group_bys and args.source == 'cur':
+        raise ValueError("--group-by needs tag and cost category data from Cost Explorer; use --source ce")
+    
+    cur_frames = None
+    if shared is not None:
+        # Frames in the CUR frame shapes, sliced from the batch's shared Cost Explorer results
+        cur_frames = shared.frames(start_date, end_date)
+        ce_client = shared.ce_client
+    elif args.source == 'cur':
+        if not args.cur_path:
+            raise ValueError("--cur-path is required with --source cur")
+        # CUR data replaces every Cost Explorer call of the run
+        print(f"Reading Cost and Usage Report data from {args.cur_path}...")
+        cur_frames = CurCostFrames.from_path(args.cur_path, start_date, end_date)
+        ce_client = None
+    elif args.stub_accounts:
+        # Synthetic, deterministic data for local testing; never calls AWS
+        print(f"Using Cost Explorer stub with {args.stub_accounts} synthetic accounts")
+        ce_client = StubCostExplorerClient(account_count=args.stub_accounts,
+                                           first_account_id=100000000000 + payer_index * 1000000)
+    else:
+        # Initialize Cost Explorer client with enough pooled connections for the concurrent window fetches
+        ce_client = (session or boto3).client('ce', config=Config(
+            max_pool_connections=max(10, args.max_workers),
+            retries={'max_attempts': 10, 'mode': 'adaptive'}
+        ))
+    
+    dashboard = None
+    if output_format in ('dashboard', 'both'):
+        display_end_date = get_display_end_date(end_date)
+        dashboard = CostDashboardWriter(
+            get_dashboard_directory(start_date, end_date),
+            f"AWS Cost Dashboard ({start_date} to {display_end_date})",
+            CHART_COLORS,
+            REFUNDS_COLOR
+        )
     
-    # Initialize Cost Explorer client
-    ce_client = boto3.client('ce')
+    forecast_cache = ForecastCache(os.path.join(args.data_dir, 'forecasts')) if args.forecast else None
+    forecasts = None
+    archive = create_report_archive(args, session) if args.archive else None
     
     # Generate organization summary report regardless of whether a specific account is specified
     print("Generating organization-wide summary report by service...")
-    org_response = get_organization_cost_by_service(ce_client, start_date, end_date)
-    org_df = process_organization_summary(org_response)
-    save_organization_summary(org_df, start_date, end_date)
+    if cur_frames is not None:
+        org_response = None
+        org_df = apply_frame_schema(cur_frames.organization_frame())
+    else:
+        org_response = get_organization_cost_by_service(ce_client, start_date, end_date)
+        org_df = process_organization_summary(org_response)
+    # One aggregation pass feeds both the org workbook and the org chart
+    org_summary = summarize_organization(org_df)
+    monthly_breakdown = org_summary['monthly_breakdown']
+    save_organization_summary(org_df, start_date, end_date, org_summary)
+    if store is not None:
+        store.write_frame(ORGANIZATION_DATASET, export_cost_frame(org_df), 'organization')
+    # Name and totals of every report of the run, for the report manifest
+    report_totals = {'organization_summary': ('AWS Organization', summarize_totals(org_df))}
+    
+    if forecast_cache is not None:
+        forecasts = get_cost_forecasts(ce_client, ['organization_summary'], forecast_cache)
     
     # Create organization-wide visualization
     print("Creating organization cost visualization...")
     display_end_date = get_display_end_date(end_date)
-    create_cost_visualization(
+    render_cost_report(
         org_df, 
         f"AWS Organization Cost by Service ({start_date} to {display_end_date})",
         "organization_summary",
+        "AWS Organization",
         start_date,
         end_date,
-        is_organization=True
+        output_format,
+        dashboard,
+        is_organization=True,
+        summary=org_summary,
+        forecasts=forecasts
     )
+    if archive is not None:
+        archive.add_files(find_report_artifacts(get_chart_directory("organization_summary", end_date), start_date, end_date))
+    
+    if streaming:
+        # The organization frames are not needed for the account reports
+        del org_response, org_df, org_summary
+        release_memory(memory_budget_mb)
     
     if account_id:
         # Generate report for specific account
         print(f"Generating cost report for account {account_id}...")
         
         # Get account name for the specific account ID
-        accounts = get_all_linked_accounts(ce_client, start_date, end_date)
+        accounts = cur_frames.accounts() if cur_frames is not None else get_all_linked_accounts(ce_client, start_date, end_date)
         account_info = next((acc for acc in accounts if acc['id'] == account_id), None)
         
         if account_info:
             account_name = account_info['name']
         else:
             account_name = f"Account {account_id}"
-            
-        response = get_cost_and_usage(ce_client, start_date, end_date, account_id)
-        df = process_cost_data(response, account_id, account_name)
-        save_to_excel(df, account_id, start_date, end_date)
         
-        # Create visualization for specific account
-        print(f"Creating cost visualization for account {account_id}...")
-        display_end_date = get_display_end_date(end_date)
-        create_cost_visualization(
-            df,
-            f"AWS Cost by Service - {account_name} ({start_date} to {display_end_date})",
-            account_id,
-            start_date,
-            end_date,
-            is_organization=False
-        )
+        if forecast_cache is not None:
+            forecasts = get_cost_forecasts(ce_client, [account_id], forecast_cache)
+            add_local_forecasts(forecasts, ce_client, start_date, end_date, cur_frames)
+        df = apply_frame_schema(cur_frames.account_frame(account_id, account_name)) if cur_frames is not None else None
+        report_totals[account_id] = (account_name, generate_account_report(
+            ce_client, account_id, account_name, start_date, end_date, output_format, dashboard, store, df, forecasts
+        ))
     else:
         # Get all linked accounts with their names
         print("Getting all linked accounts...")
-        accounts = get_all_linked_accounts(ce_client, start_date, end_date)
+        accounts = cur_frames.accounts() if cur_frames is not None else get_all_linked_accounts(ce_client, start_date, end_date)
         print(f"Found {len(accounts)} linked accounts")
         
+        if forecast_cache is not None:
+            # All account forecasts are requested together before the per-account loop
+            forecasts = get_cost_forecasts(ce_client, [account['id'] for account in accounts], forecast_cache)
+            add_local_forecasts(forecasts, ce_client, start_date, end_date, cur_frames)
+        
         # Generate reports for all linked accounts
         print("Generating cost reports for all linked accounts...")
         
@@ -707,25 +1428,199 @@ def main():
             account_name = account['name']
             
             print(f"Processing account {account_id} ({account_name})...")
-            response = get_cost_and_usage(ce_client, start_date, end_date, account_id)
-            df = process_cost_data(response, account_id, account_name)
-            save_to_excel(df, account_id, start_date, end_date)
+            df = apply_frame_schema(cur_frames.account_frame(account_id, account_name)) if cur_frames is not None else None
+            report_totals[account_id] = (account_name, generate_account_report(
+                ce_client, account_id, account_name, start_date, end_date, output_format, dashboard, store, df, forecasts
+            ))
+            del df
+            if archive is not None:
+                # Packed in the background while the next account is fetched and rendered
+                archive.add_files(find_report_artifacts(get_chart_directory(account_id, end_date), start_date, end_date))
             
-            # Create visualization for each account
-            print(f"Creating cost visualization for account {account_id}...")
-            display_end_date = get_display_end_date(end_date)
-            create_cost_visualization(
-                df,
-                f"AWS Cost by Service - {account_name} ({start_date} to {display_end_date})",
-                account_id,
-                start_date,
-                end_date,
-                is_organization=False
-            )
+            if streaming:
+                # Release each account's frames and figures before fetching the next one
+                rss_mb = release_memory(memory_budget_mb)
+                print(f"Resident memory after account {account_id}: {rss_mb:,.0f} MB")
         
         print(f"Generated reports for {len(accounts)} linked accounts")
     
+    for group_by in group_bys:
+        generate_grouped_reports(ce_client, group_by, accounts, start_date, end_date, args.account_id, shared)
+        if streaming:
+            release_memory(memory_budget_mb)
+    
+    if dashboard is not None:
+        dashboard.write()
+    
+    write_report_manifest(report_totals, start_date, end_date, dashboard, archive)
+    if archive is not None:
+        archive.close()
+    
+    if store is not None:
+        # Merge this run's per-account files into one file per month
+        store.compact(ACCOUNTS_DATASET, 'Account ID')
+        print(f"Cost data stored in {args.data_dir}")
+    
+    if streaming:
+        print(f"Peak resident memory: {get_peak_rss_mb():,.0f} MB")
+    
     print("All reports and visualizations generated successfully!")
+    return monthly_breakdown
+
+def create_report_archive(args, session=None):
+    """Open the archive of a run at --archive-path, or next to the reports by default"""
+    archive_path = args.archive_path or os.path.join(
+        REPORTS_ROOT, 'archives', f"aws-cost-reports-{args.start_date}_to_{args.end_date}{ARCHIVE_FORMATS[args.archive]}"
+    )
+    s3_client = (session or boto3).client('s3') if archive_path.startswith('s3://') else None
+    print(f"Archiving report files to {archive_path} ({args.archive})")
+    return ReportArchive(archive_path, args.archive, REPORTS_ROOT, s3_client)
+
+def write_report_manifest(report_totals, start_date, end_date, dashboard=None, archive=None):
+    """Record every report file of the run with its size, hash and totals in the period manifest.
+
+    With an archive, the files not queued yet (grouped reports, dashboard) and the manifest itself
+    are added to it as well.
+    """
+    manifest = ReportManifest(REPORTS_ROOT, start_date, end_date)
+    chart_directory_date = get_directory_date(end_date)
+    for report_id, (name, totals) in report_totals.items():
+        # Same layout as get_chart_directory, which also covers the workbooks and grouped charts
+        directory = os.path.join(REPORTS_ROOT, report_id, chart_directory_date.strftime('%Y'), chart_directory_date.strftime('%m'))
+        manifest.add_files(report_id, name, totals, find_report_artifacts(directory, start_date, end_date))
+    if dashboard is not None:
+        dashboard_files = [os.path.join(dashboard.directory, 'index.html')] + sorted(
+            glob.glob(os.path.join(dashboard.directory, 'data', '*.json'))
+        )
+        manifest.add_files('dashboard', 'Cost Dashboard', None, dashboard_files)
+    manifest_files = manifest.write()
+    if archive is not None:
+        archive.add_files([
+            os.path.join(REPORTS_ROOT, artifact['key'])
+            for report in manifest.reports.values() for artifact in report['artifacts']
+        ] + manifest_files)
+    return manifest_files
+
+def get_payer_organizations(args):
+    """List the payer organizations of a multi-payer run from --profiles and --role-arns.
+
+    A role ARN that is not an IAM role ARN gets an 'error' and is skipped by the run instead of
+    stopping every payer.
+    """
+    payers = [{'name': profile, 'profile': profile, 'role_arn': None} for profile in args.profiles]
+    for role_arn in args.role_arns:
+        # arn:aws:iam::123456789012:role/name -> 123456789012
+        match = ROLE_ARN_PATTERN.match(role_arn)
+        if match is None:
+            payers.append({'name': role_arn, 'profile': None, 'role_arn': role_arn,
+                           'error': "not an IAM role ARN like arn:aws:iam::123456789012:role/name"})
+            continue
+        payers.append({'name': match.group(1), 'profile': None, 'role_arn': role_arn})
+    
+    names = [payer['name'] for payer in payers]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Payer organizations must be unique: {', '.join(names)}")
+    if payers and args.source == 'cur':
+        raise ValueError("--profiles/--role-arns read Cost Explorer; run --source cur once per payer instead")
+    return payers
+
+def create_payer_session(payer):
+    """Create a boto3 session for one payer from its profile or by assuming its role"""
+    if payer['role_arn'] is None:
+        return boto3.Session(profile_name=payer['profile'])
+    
+    credentials = boto3.Session().client('sts').assume_role(
+        RoleArn=payer['role_arn'],
+        RoleSessionName='aws-cost-reporter'
+    )['Credentials']
+    return boto3.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken']
+    )
+
+def run_payer_report(args, payer, payer_index, directory):
+    """Run one payer's reports in a worker process, inside that payer's output directory"""
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    # Each payer logs to its own file so parallel runs do not interleave. The original streams
+    # are restored before the log is closed, since the pool may reuse this worker.
+    with open('run.log', 'w') as log, redirect_stdout(log), redirect_stderr(log):
+        session = None if args.stub_accounts else create_payer_session(payer)
+        return run_report(args, session, payer_index)
+
+def save_cross_payer_summary(breakdowns, directory, start_date, end_date):
+    """Save the combined organization totals of every payer to one workbook"""
+    frames = []
+    for payer_name, breakdown in breakdowns.items():
+        long_df = breakdown.melt(id_vars='Service Name', var_name='Month', value_name='Amortized Cost ($)')
+        long_df['Month'] = long_df['Month'].str.slice(0, 7)  # "2025-04 (Total Amortized Cost ($))"
+        frames.append(long_df.assign(Organization=payer_name))
+    details = pd.concat(frames, ignore_index=True).fillna({'Amortized Cost ($)': 0})
+    details = details[['Organization', 'Month', 'Service Name', 'Amortized Cost ($)']]
+    
+    organization_totals = details.pivot_table(index='Organization', columns='Month', values='Amortized Cost ($)',
+                                              aggfunc='sum', fill_value=0)
+    organization_totals['Total'] = organization_totals.sum(axis=1)
+    organization_totals.loc['TOTAL'] = organization_totals.sum()
+    
+    service_totals = details.pivot_table(index='Service Name', columns='Organization', values='Amortized Cost ($)',
+                                         aggfunc='sum', fill_value=0)
+    service_totals['Total'] = service_totals.sum(axis=1)
+    service_totals = service_totals.sort_values('Total', ascending=False)
+    
+    filename = os.path.join(directory, f"aws-cross-org-summary-{start_date}_to_{end_date}.xlsx")
+    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+        organization_totals.reset_index().to_excel(writer, sheet_name='Organization Totals', index=False)
+        service_totals.reset_index().to_excel(writer, sheet_name='Service by Organization', index=False)
+        details.to_excel(writer, sheet_name='Details', index=False)
+        
+        currency_format = writer.book.add_format({'num_format': '$#,##0.00'})
+        for sheet_name in ('Organization Totals', 'Service by Organization'):
+            writer.sheets[sheet_name].set_column('A:A', 30)
+            writer.sheets[sheet_name].set_column(1, 100, 16, currency_format)
+    
+    print(f"Cross-organization summary saved to {filename}")
+    return filename
+
+def run_multi_payer_reports(args, payers):
+    """Run the reports of several payer organizations in parallel and combine their summaries.
+
+    Each payer runs in its own process with its own session, client and rate limiter, so the
+    wall time approaches that of the slowest payer. Processes are used because matplotlib's
+    pyplot state is not thread-safe.
+    """
+    orgs_dir = os.path.abspath(args.orgs_dir)
+    print(f"Running {len(payers)} payer organizations in parallel: {', '.join(payer['name'] for payer in payers)}")
+    
+    breakdowns = {}
+    failures = []
+    for payer in payers:
+        if payer.get('error'):
+            failures.append(payer['name'])
+            print(f"Skipping {payer['name']}: {payer['error']}")
+    runnable = [(index, payer) for index, payer in enumerate(payers) if not payer.get('error')]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(len(runnable), 1)) as executor:
+        futures = {
+            executor.submit(run_payer_report, args, payer, index, os.path.join(orgs_dir, payer['name'])): payer['name']
+            for index, payer in runnable
+        }
+        for future in as_completed(futures):
+            payer_name = futures[future]
+            try:
+                breakdowns[payer_name] = future.result()
+                print(f"Finished {payer_name} after {time.perf_counter() - started:,.1f}s")
+            except Exception as e:
+                failures.append(payer_name)
+                print(f"Reports for {payer_name} failed: {e} (see {os.path.join(orgs_dir, payer_name, 'run.log')})")
+    
+    if breakdowns:
+        # Payer order of the command line, independent of completion order
+        ordered = {payer['name']: breakdowns[payer['name']] for payer in payers if payer['name'] in breakdowns}
+        save_cross_payer_summary(ordered, orgs_dir, args.start_date, args.end_date)
+    if failures:
+        raise RuntimeError(f"Reports failed for {', '.join(failures)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
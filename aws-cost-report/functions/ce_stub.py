@@ -0,0 +1,241 @@
+import zlib
+from botocore.exceptions import ClientError
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+STUB_SERVICES = [
+    'Amazon Elastic Compute Cloud - Compute',
+    'EC2 - Other',
+    'Amazon Simple Storage Service',
+    'Amazon Relational Database Service',
+    'Amazon Virtual Private Cloud',
+    'AWS Lambda',
+    'Amazon CloudWatch',
+    'Amazon DynamoDB',
+    'Amazon Elastic Container Service',
+    'Amazon Elastic Load Balancing',
+    'AWS Key Management Service',
+    'Amazon Route 53',
+    'AWS Support (Business)',
+    'Tax'
+]
+
+# Tag keys and cost categories with their values; each account's service usage carries one value or none
+STUB_TAGS = {
+    'team': ['platform', 'data', 'web', 'ml'],
+    'cost-center': ['cc-100', 'cc-200', 'cc-300']
+}
+STUB_COST_CATEGORIES = {
+    'business-unit': ['Retail', 'Wholesale', 'Shared Services']
+}
+
+# Resource and usage type breakdowns: each account's service cost is spread over its items with
+# Zipf-like shares, so a few items carry most of the cost like real fleets
+BREAKDOWN_DIMENSIONS = {'RESOURCE_ID', 'USAGE_TYPE'}
+RESOURCE_PREFIXES = {
+    'Amazon Elastic Compute Cloud - Compute': 'i-',
+    'EC2 - Other': 'vol-',
+    'Amazon Simple Storage Service': 'bucket-',
+    'Amazon Relational Database Service': 'db-'
+}
+ZIPF_EXPONENT = 1.2
+# get_cost_and_usage and get_cost_and_usage_with_resources page their groups like Cost Explorer does
+COST_PAGE_SIZE = 500
+RESOURCE_PAGE_SIZE = 5000
+
+class StubCostExplorerClient:
+    """In-process stand-in for boto3.client('ce') returning deterministic synthetic data.
+
+    Amounts are derived from a hash of account, service and month so every run (and every
+    process) sees the same numbers. Responses mirror the Cost Explorer response shapes used
+    by the reporter, including NextPageToken pagination of dimension values and groups, and grouping by
+    SERVICE, LINKED_ACCOUNT, tags and cost categories. About forecast_throttle_rate of the
+    get_cost_forecast calls fail with a ThrottlingException so fallbacks can be exercised.
+    """
+
+    def __init__(self, account_count=10, services=None, forecast_throttle_rate=0.2, first_account_id=100000000000):
+        self.account_count = account_count
+        self.forecast_throttle_rate = forecast_throttle_rate
+        self.services = services or STUB_SERVICES
+        self.account_ids = [f"{first_account_id + i}" for i in range(account_count)]
+        self.call_count = 0
+
+    def amount(self, account_id, service, month):
+        """Deterministic amortized cost for one account, service and month"""
+        seed = zlib.crc32(f"{account_id}|{service}|{month}".encode())
+        if service == 'Tax':
+            return -round((seed % 5000) / 100, 4)  # Credits show up as negative amounts
+        scale = 10 ** (seed % 4)
+        return round((seed % 100000) / 100000 * scale, 4)
+
+    def group_value(self, account_id, service, group_type, key):
+        """Deterministic tag or cost category value of one account's service usage ('' when untagged)"""
+        values = (STUB_TAGS if group_type == 'TAG' else STUB_COST_CATEGORIES).get(key, [])
+        index = zlib.crc32(f"{account_id}|{service}|{key}".encode()) % (len(values) + 1)
+        return values[index] if index < len(values) else ''
+
+    def breakdown_items(self, account_id, service, dimension):
+        """Deterministic (item, share) pairs of one account's service cost by resource or usage type"""
+        seed = zlib.crc32(f"{account_id}|{service}|{dimension}".encode())
+        if service == 'Tax':
+            return [('NoResourceId' if dimension == 'RESOURCE_ID' else 'Tax', 1.0)]
+        if dimension == 'USAGE_TYPE':
+            count = 5 + seed % 20
+            names = [f"USE1-{service.split(' ')[-1]}-Usage{i:02d}" for i in range(count)]
+        else:
+            count = 50 + seed % 3000
+            prefix = RESOURCE_PREFIXES.get(service, f"arn:aws:{service.split(' ')[-1].lower()}:us-east-1:{account_id}:")
+            names = [f"{prefix}{zlib.crc32(f'{seed}|{i}'.encode()):08x}{i:05x}" for i in range(count)]
+        weights = [1 / (i + 1) ** ZIPF_EXPONENT for i in range(count)]
+        total = sum(weights)
+        return [(name, weight / total) for name, weight in zip(names, weights)]
+
+    def group_key(self, group, account_id, service, item=None):
+        """Group key in the Cost Explorer format, e.g. 'team$platform' for tags"""
+        if group['Type'] == 'DIMENSION':
+            if group['Key'] in BREAKDOWN_DIMENSIONS:
+                return item
+            return account_id if group['Key'] == 'LINKED_ACCOUNT' else service
+        return f"{group['Key']}${self.group_value(account_id, service, group['Type'], group['Key'])}"
+
+    def iter_months(self, start_date, end_date):
+        """Yield (month start, month end) strings for each monthly period in the range"""
+        period_start = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+        while period_start < end_dt:
+            period_end = min(period_start.replace(day=1) + relativedelta(months=1), end_dt)
+            yield period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')
+            period_start = period_end
+
+    def period_fraction(self, period_start, period_end):
+        """Share of its month covered by a period; partial months only get the cost of their days"""
+        start_dt = datetime.strptime(period_start, '%Y-%m-%d')
+        month_start = start_dt.replace(day=1)
+        month_days = ((month_start + relativedelta(months=1)) - month_start).days
+        return (datetime.strptime(period_end, '%Y-%m-%d') - start_dt).days / month_days
+
+    def get_dimension_values(self, TimePeriod, Dimension, Context=None, MaxResults=2000, NextPageToken=None, **kwargs):
+        self.call_count += 1
+        offset = int(NextPageToken or 0)
+        page = self.account_ids[offset:offset + MaxResults]
+        response = {
+            'DimensionValues': [
+                {'Value': account_id, 'Attributes': {'description': f"stub-account-{account_id[-4:]}"}}
+                for account_id in page
+            ]
+        }
+        if offset + MaxResults < len(self.account_ids):
+            response['NextPageToken'] = str(offset + MaxResults)
+        return response
+
+    def get_tags(self, TimePeriod, TagKey=None, NextPageToken=None, **kwargs):
+        self.call_count += 1
+        tags = STUB_TAGS.get(TagKey, []) if TagKey else list(STUB_TAGS)
+        return {'Tags': tags, 'ReturnSize': len(tags), 'TotalSize': len(tags)}
+
+    def get_cost_categories(self, TimePeriod, CostCategoryName=None, NextPageToken=None, **kwargs):
+        self.call_count += 1
+        if CostCategoryName:
+            values = STUB_COST_CATEGORIES.get(CostCategoryName, [])
+            return {'CostCategoryNames': [CostCategoryName], 'CostCategoryValues': values,
+                    'ReturnSize': len(values), 'TotalSize': len(values)}
+        names = list(STUB_COST_CATEGORIES)
+        return {'CostCategoryNames': names, 'ReturnSize': len(names), 'TotalSize': len(names)}
+
+    def filter_values(self, Filter, key):
+        """Values of a dimension filter, alone or inside an 'And' (None without one)"""
+        for expression in (Filter or {}).get('And', [Filter or {}]):
+            dimensions = expression.get('Dimensions', {})
+            if dimensions.get('Key') == key:
+                return dimensions['Values']
+        return None
+
+    def filter_accounts(self, Filter):
+        """Accounts selected by a LINKED_ACCOUNT dimension filter (all accounts without one)"""
+        values = self.filter_values(Filter, 'LINKED_ACCOUNT')
+        if values is not None:
+            return [account_id for account_id in values if account_id in self.account_ids]
+        return self.account_ids
+
+    def get_cost_forecast(self, TimePeriod, Metric, Granularity, Filter=None, PredictionIntervalLevel=80, **kwargs):
+        self.call_count += 1
+        account_ids = self.filter_accounts(Filter)
+        seed = zlib.crc32(f"forecast|{','.join(account_ids)}".encode())
+        if seed % 100 < self.forecast_throttle_rate * 100:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'GetCostForecast')
+
+        results = []
+        for period_start, period_end in self.iter_months(TimePeriod['Start'], TimePeriod['End']):
+            mean = sum(
+                self.amount(account_id, service, period_start[:7])
+                for account_id in account_ids for service in self.services
+            )
+            results.append({
+                'TimePeriod': {'Start': period_start, 'End': period_end},
+                'MeanValue': f"{mean:.10f}",
+                'PredictionIntervalLowerBound': f"{mean * 0.85:.10f}",
+                'PredictionIntervalUpperBound': f"{mean * 1.15:.10f}"
+            })
+        total = sum(float(result['MeanValue']) for result in results)
+        return {'Total': {'Amount': f"{total:.10f}", 'Unit': 'USD'}, 'ForecastResultsByTime': results}
+
+    def page_cost_results(self, results, GroupBy, NextPageToken, page_size):
+        """One page of the groups of all periods; periods without groups on this page are still listed"""
+        offset = int(NextPageToken or 0)
+        response_results = []
+        position = 0
+        for result in results:
+            page_groups = result['Groups'][max(offset - position, 0):max(offset + page_size - position, 0)]
+            position += len(result['Groups'])
+            response_results.append({**result, 'Groups': page_groups})
+        response = {'GroupDefinitions': GroupBy or [], 'ResultsByTime': response_results}
+        if offset + page_size < position:
+            response['NextPageToken'] = str(offset + page_size)
+        return response
+
+    def get_cost_and_usage(self, TimePeriod, Granularity, Metrics, GroupBy=None, Filter=None, NextPageToken=None, **kwargs):
+        self.call_count += 1
+        return self.page_cost_results(self.cost_results(TimePeriod, GroupBy, Filter), GroupBy, NextPageToken, COST_PAGE_SIZE)
+
+    def get_cost_and_usage_with_resources(self, TimePeriod, Granularity, Filter, Metrics=None, GroupBy=None, NextPageToken=None, **kwargs):
+        self.call_count += 1
+        return self.page_cost_results(self.cost_results(TimePeriod, GroupBy, Filter), GroupBy, NextPageToken, RESOURCE_PAGE_SIZE)
+
+    def cost_results(self, TimePeriod, GroupBy, Filter):
+        """ResultsByTime of a monthly cost query, grouped by any supported keys"""
+        account_ids = self.filter_accounts(Filter)
+        services = self.filter_values(Filter, 'SERVICE') or self.services
+
+        group_by = GroupBy or [{'Type': 'DIMENSION', 'Key': 'SERVICE'}]
+        breakdown = next((group['Key'] for group in group_by if group['Key'] in BREAKDOWN_DIMENSIONS), None)
+        results = []
+        for period_start, period_end in self.iter_months(TimePeriod['Start'], TimePeriod['End']):
+            month = period_start[:7]
+            fraction = self.period_fraction(period_start, period_end)
+            totals = {}
+            for account_id in account_ids:
+                for service in services:
+                    if service not in self.services:
+                        continue
+                    amount = self.amount(account_id, service, month) * fraction
+                    items = self.breakdown_items(account_id, service, breakdown) if breakdown else [(None, 1.0)]
+                    for item, share in items:
+                        keys = tuple(self.group_key(group, account_id, service, item) for group in group_by)
+                        totals[keys] = totals.get(keys, 0) + amount * share
+            groups = []
+            for keys, amortized in totals.items():
+                groups.append({
+                    'Keys': list(keys),
+                    'Metrics': {
+                        'AmortizedCost': {'Amount': f"{amortized:.10f}", 'Unit': 'USD'},
+                        'UnblendedCost': {'Amount': f"{amortized * 1.02:.10f}", 'Unit': 'USD'},
+                        'UsageQuantity': {'Amount': f"{abs(amortized) * 3:.4f}", 'Unit': 'N/A'}
+                    }
+                })
+            results.append({
+                'TimePeriod': {'Start': period_start, 'End': period_end},
+                'Total': {},
+                'Groups': groups,
+                'Estimated': False
+            })
+        return results
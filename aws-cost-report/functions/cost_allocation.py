@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+try:
+    import yaml
+except ImportError:  # Only needed for YAML rule files
+    yaml = None
+import numpy as np
+import pandas as pd
+import aws_cost_reporter as reporter
+from cost_render import DEFAULT_RENDER_PROFILES, parse_render_profiles
+from cost_store import ACCOUNTS_DATASET, CostDataStore, DEFAULT_STORE_ROOT
+
+# usage: by each target account's own cost of the basis services in the same month
+# fixed: by the weights given in the rule, the same every month
+# even:  in equal parts to every target account
+ALLOCATION_METHODS = ['usage', 'fixed', 'even']
+COST_COLUMN = 'Amortized Cost ($)'
+
+RULES_EPILOG = """
+allocation rules (YAML or JSON), applied in order:
+  rules:
+    - name: support
+      services: ["AWS Support (Business)"]
+      method: usage                      # by each account's cost of the basis services
+    - name: network-hub
+      services: ["Amazon Virtual Private Cloud", "EC2 - Other"]
+      source_accounts: ["111111111111"]  # only these accounts' costs are shared (default: all)
+      method: usage
+      basis_services: ["Amazon Elastic Compute Cloud - Compute"]
+      targets: ["222222222222", "333333333333"]   # default: every account
+    - name: security-tooling
+      services: ["Amazon GuardDuty"]
+      method: fixed
+      weights: {"222222222222": 70, "333333333333": 30}
+"""
+
+def parse_allocate_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='aws_cost_reporter.py allocate',
+        description='Redistribute shared service costs across consuming accounts from stored cost data',
+        epilog=RULES_EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('rules', help='YAML or JSON file with the allocation rules')
+    parser.add_argument('--start-date', required=True, help='Start date in YYYY-MM-DD format')
+    parser.add_argument('--end-date', required=True, help='End date in YYYY-MM-DD format')
+    parser.add_argument('--account-id', required=False,
+                        help='Only write the allocated report of this account (allocation still uses every account)')
+    parser.add_argument('--data-dir', default=DEFAULT_STORE_ROOT,
+                        help=f'Stored cost data directory (default: {DEFAULT_STORE_ROOT})')
+    parser.add_argument('--no-charts', action='store_true', help='Write the allocated workbooks without charts')
+    parser.add_argument('--render-profiles', type=parse_render_profiles, default=DEFAULT_RENDER_PROFILES,
+                        metavar='print,web[:webp],thumb[:webp],vector[:svg|pdf]',
+                        help='Chart files to write from each allocated chart (default: print)')
+    return parser.parse_args(argv)
+
+def read_allocation_rules(filename):
+    with open(filename) as f:
+        if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ValueError("YAML allocation rules need the pyyaml package; use a JSON file instead")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    rules = data if isinstance(data, list) else (data or {}).get('rules') or []
+    if not rules:
+        raise ValueError(f"No allocation rules in {filename}")
+    return [validate_rule(rule, index) for index, rule in enumerate(rules, start=1)]
+
+def validate_rule(rule, index):
+    """Check one rule and fill in its defaults; account IDs are compared as strings"""
+    name = str(rule.get('name') or f"rule-{index}")
+    method = rule.get('method', 'usage')
+    if method not in ALLOCATION_METHODS:
+        raise ValueError(f"Allocation rule '{name}': method must be one of {', '.join(ALLOCATION_METHODS)}, got '{method}'")
+    if not rule.get('services'):
+        raise ValueError(f"Allocation rule '{name}' needs the services whose cost is shared")
+
+    weights = None
+    if method == 'fixed':
+        weights = {str(account_id): float(weight) for account_id, weight in (rule.get('weights') or {}).items()}
+        if not weights or min(weights.values()) < 0 or sum(weights.values()) <= 0:
+            raise ValueError(f"Allocation rule '{name}': fixed allocations need non-negative weights per account")
+    elif rule.get('weights'):
+        raise ValueError(f"Allocation rule '{name}': weights are only used with method: fixed")
+
+    def accounts(key):
+        return [str(account_id) for account_id in rule[key]] if rule.get(key) else None
+
+    return {
+        'name': name,
+        'method': method,
+        'services': [str(service) for service in rule['services']],
+        'source_accounts': accounts('source_accounts'),
+        'targets': list(weights) if weights else accounts('targets'),
+        'basis_services': [str(service) for service in rule['basis_services']] if rule.get('basis_services') else None,
+        'weights': weights
+    }
+
+def get_period_months(start_date, end_date):
+    """Months overlapping [start_date, end_date), as stored in the 'month=' partitions"""
+    last_day = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=1)
+    return [str(period) for period in pd.period_range(start_date[:7], last_day.strftime('%Y-%m'), freq='M')]
+
+class CostCube:
+    """Dense account x service x month array of amortized cost built from the stored account frames.
+
+    Accounts named in the rules but without stored costs get zero rows so they can still receive
+    allocations. Rules are applied as array operations on whole slices, never account by account.
+    """
+
+    def __init__(self, accounts_df, extra_accounts=()):
+        account_ids = accounts_df['Account ID'].astype(str)
+        self.accounts = pd.Index(sorted(set(account_ids) | set(extra_accounts)))
+        self.services = pd.Index(sorted(accounts_df['Service Name'].astype(str).unique()))
+        self.months = pd.Index(sorted(accounts_df['Month'].unique()))
+
+        self.values = np.zeros((len(self.accounts), len(self.services), len(self.months)))
+        account_index = self.accounts.get_indexer(account_ids)
+        month_index = self.months.get_indexer(accounts_df['Month'])
+        np.add.at(
+            self.values,
+            (account_index, self.services.get_indexer(accounts_df['Service Name'].astype(str)), month_index),
+            accounts_df[COST_COLUMN].to_numpy(dtype=float)
+        )
+
+        # Most recent name of every account, so a renamed account stays on one row
+        order = np.argsort(month_index, kind='stable')
+        latest_names = pd.Series(accounts_df['Account Name'].to_numpy()[order]).groupby(account_index[order]).last()
+        self.account_names = np.array([f"Account {account_id}" for account_id in self.accounts], dtype=object)
+        self.account_names[latest_names.index.to_numpy()] = latest_names.to_numpy()
+
+    def account_mask(self, account_ids=None):
+        """Boolean mask over the accounts (every account when account_ids is None)"""
+        if account_ids is None:
+            return np.ones(len(self.accounts), dtype=bool)
+        return self.accounts.isin(account_ids)
+
+    def service_index(self, services):
+        """Positions of the stored services among the given names; unknown names are skipped"""
+        indexer = self.services.get_indexer(services)
+        return indexer[indexer >= 0]
+
+def get_allocation_weights(cube, values, rule, basis_index):
+    """Account x month weights of a rule; every month with something to allocate sums to 1.
+
+    Usage weights come from the running values, so costs allocated by earlier rules count towards
+    the basis of later ones. A month without any basis cost is split evenly across the targets.
+    """
+    targets = cube.account_mask(rule['targets'])
+    if not targets.any():
+        raise ValueError(f"Allocation rule '{rule['name']}' has no target accounts in the stored data")
+    even = np.repeat((targets / targets.sum())[:, None], len(cube.months), axis=1)
+
+    if rule['method'] == 'even':
+        return even
+    if rule['method'] == 'fixed':
+        fixed = pd.Series(rule['weights']).reindex(cube.accounts, fill_value=0.0).to_numpy()
+        return np.repeat((fixed / fixed.sum())[:, None], len(cube.months), axis=1)
+
+    if rule['basis_services']:
+        basis_index = cube.service_index(rule['basis_services'])
+    basis = np.clip(values[:, basis_index, :].sum(axis=1), 0, None) * targets[:, None]
+    month_totals = basis.sum(axis=0)
+    weights = np.divide(basis, month_totals, out=np.zeros_like(basis), where=month_totals > 0)
+    return np.where(month_totals > 0, weights, even)
+
+def allocate_costs(cube, rules):
+    """Apply the rules in order and return the direct, removed, allocated and chargeback cubes.
+
+    For each rule the shared services' cost of the source accounts is pooled per service and
+    month (a services x months matrix), removed from the sources and spread with an
+    account x month weight matrix. Every rule keeps the organization total unchanged.
+    """
+    values = cube.values.copy()
+    removed = np.zeros_like(values)
+    allocated = np.zeros_like(values)
+
+    # Unless a rule names its basis services, usage is measured on everything that is not shared
+    shared_services = [service for rule in rules for service in rule['services']]
+    default_basis = np.setdiff1d(np.arange(len(cube.services)), cube.service_index(shared_services))
+
+    rule_rows = []
+    weight_frames = []
+    for rule in rules:
+        shared = cube.service_index(rule['services'])
+        sources = cube.account_mask(rule['source_accounts'])
+        weights = get_allocation_weights(cube, values, rule, default_basis)
+
+        # services x months pool of the shared cost, and its account x services x months split
+        outgoing = values[:, shared, :] * sources[:, None, None]
+        pool = outgoing.sum(axis=0)
+        incoming = weights[:, None, :] * pool[None, :, :]
+
+        values[:, shared, :] += incoming - outgoing
+        removed[:, shared, :] += outgoing
+        allocated[:, shared, :] += incoming
+
+        for month_index, month in enumerate(cube.months):
+            rule_rows.append({
+                'Rule': rule['name'],
+                'Method': rule['method'],
+                'Month': month,
+                'Services': ', '.join(cube.services[shared]),
+                'Shared Cost ($)': pool[:, month_index].sum(),
+                'Source Accounts': int((outgoing[:, :, month_index] != 0).any(axis=1).sum()),
+                'Receiving Accounts': int((weights[:, month_index] > 0).sum())
+            })
+        account_index, month_index = np.nonzero(weights)
+        weight_frames.append(pd.DataFrame({
+            'Rule': rule['name'],
+            'Month': cube.months[month_index],
+            'Account ID': cube.accounts[account_index],
+            'Weight (%)': weights[account_index, month_index] * 100
+        }))
+
+    return {
+        'direct': cube.values,
+        'removed': removed,
+        'allocated': allocated,
+        'chargeback': values,
+        'rules': pd.DataFrame(rule_rows),
+        'weights': pd.concat(weight_frames, ignore_index=True)
+    }
+
+def build_allocated_frame(cube, allocation):
+    """Long frame of every non-zero account, service and month cell of the allocation"""
+    direct, removed, allocated, chargeback = (
+        allocation[key] for key in ('direct', 'removed', 'allocated', 'chargeback')
+    )
+    account_index, service_index, month_index = np.nonzero((direct != 0) | (removed != 0) | (allocated != 0))
+    cells = (account_index, service_index, month_index)
+    months = cube.months[month_index]
+    return pd.DataFrame({
+        'Account ID': cube.accounts[account_index],
+        'Account Name': cube.account_names[account_index],
+        'Month': months,
+        'Start Date': months + '-01',
+        'Service Name': cube.services[service_index],
+        'Direct Cost ($)': direct[cells],
+        'Shared Cost Removed ($)': -removed[cells],
+        'Shared Cost Allocated ($)': allocated[cells],
+        COST_COLUMN: chargeback[cells]
+    })
+
+def summarize_chargeback(cube, allocation):
+    """Per-account totals and the account x month chargeback matrix"""
+    summary = pd.DataFrame({
+        'Account ID': cube.accounts,
+        'Account Name': cube.account_names,
+        'Direct Cost ($)': allocation['direct'].sum(axis=(1, 2)),
+        'Shared Cost Removed ($)': -allocation['removed'].sum(axis=(1, 2)),
+        'Shared Cost Allocated ($)': allocation['allocated'].sum(axis=(1, 2)),
+        'Chargeback Cost ($)': allocation['chargeback'].sum(axis=(1, 2))
+    }).sort_values('Chargeback Cost ($)', ascending=False)
+
+    monthly = pd.DataFrame(allocation['chargeback'].sum(axis=1), columns=[f"{month} ($)" for month in cube.months])
+    monthly.insert(0, 'Account Name', cube.account_names)
+    monthly.insert(0, 'Account ID', cube.accounts)
+    return summary, monthly
+
+def write_sheets(filename, sheets):
+    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+        currency_format = writer.book.add_format({'num_format': '$#,##0.00'})
+        percent_format = writer.book.add_format({'num_format': '0.00"%"'})
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.sheets[sheet_name]
+            for i, column in enumerate(df.columns):
+                if column.endswith('($)'):
+                    worksheet.set_column(i, i, 18, currency_format)
+                elif column.endswith('(%)'):
+                    worksheet.set_column(i, i, 12, percent_format)
+                else:
+                    worksheet.set_column(i, i, 30 if 'Name' in column or column == 'Services' else 14)
+
+def save_allocation_summary(cube, allocation, start_date, end_date):
+    """Organization-wide chargeback workbook next to the organization summary"""
+    summary, monthly = summarize_chargeback(cube, allocation)
+    directory = reporter.get_chart_directory("organization_summary", end_date)
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{directory}/aws-cost-allocation-organization_summary-{start_date}_to_{end_date}.xlsx"
+    write_sheets(filename, [
+        ('Chargeback', summary),
+        ('Monthly Chargeback', monthly),
+        ('Rules', allocation['rules']),
+        ('Weights', allocation['weights'])
+    ])
+    print(f"Allocation summary saved to {filename}")
+    return filename
+
+def save_account_allocation(account_df, account_id, start_date, end_date):
+    """Allocated view of one account next to its regular report"""
+    directory = reporter.get_chart_directory(account_id, end_date)
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{directory}/aws-cost-allocated-{account_id}-{start_date}_to_{end_date}.xlsx"
+    by_service = account_df.groupby('Service Name', sort=False)[
+        ['Direct Cost ($)', 'Shared Cost Removed ($)', 'Shared Cost Allocated ($)', COST_COLUMN]
+    ].sum().sort_values(COST_COLUMN, ascending=False).reset_index()
+    chargeback_column = {COST_COLUMN: 'Chargeback Cost ($)'}
+    write_sheets(filename, [
+        ('Allocated Costs', account_df.drop(columns=['Start Date']).rename(columns=chargeback_column)),
+        ('Service Summary', by_service.rename(columns=chargeback_column))
+    ])
+    return filename
+
+def run_allocation(argv):
+    """Entry point for the allocate subcommand"""
+    args = parse_allocate_arguments(argv)
+    start_date = reporter.validate_and_format_date(args.start_date, 'start date')
+    end_date = reporter.validate_and_format_date(args.end_date, 'end date')
+    rules = read_allocation_rules(args.rules)
+    months = get_period_months(start_date, end_date)
+
+    print(f"Allocating shared costs for {months[0]} to {months[-1]} from stored data in {args.data_dir}...")
+    store = CostDataStore(args.data_dir)
+    accounts_df = store.read(
+        ACCOUNTS_DATASET, months=months, columns=['Account ID', 'Account Name', 'Service Name', COST_COLUMN]
+    )
+    partial_months = store.partial_months(ACCOUNTS_DATASET, months)
+    if partial_months:
+        print(f"Warning: stored cost data for {', '.join(partial_months)} covers only part of the month; "
+              f"usage-based weights and totals for those months are month-to-date")
+    rule_accounts = {account_id for rule in rules for account_id in (rule['targets'] or []) + (rule['source_accounts'] or [])}
+    started = time.perf_counter()
+    cube = CostCube(accounts_df, rule_accounts)
+    allocation = allocate_costs(cube, rules)
+    print(f"Allocated {len(rules)} rules over {len(cube.accounts):,} accounts x {len(cube.services):,} services x "
+          f"{len(cube.months)} months in {time.perf_counter() - started:,.2f}s")
+
+    direct_total = allocation['direct'].sum()
+    chargeback_total = allocation['chargeback'].sum()
+    print(f"Shared cost allocated: ${allocation['allocated'].sum():,.2f} "
+          f"(organization total ${direct_total:,.2f} before, ${chargeback_total:,.2f} after)")
+
+    save_allocation_summary(cube, allocation, start_date, end_date)
+    allocated_df = build_allocated_frame(cube, allocation)
+    if args.account_id:
+        allocated_df = allocated_df[allocated_df['Account ID'] == args.account_id]
+    display_end_date = reporter.get_display_end_date(end_date)
+    for account_id, account_df in allocated_df.groupby('Account ID', sort=True):
+        account_name = account_df['Account Name'].iloc[0]
+        filename = save_account_allocation(account_df, account_id, start_date, end_date)
+        print(f"Allocated report for account {account_id} saved to {filename}")
+        if not args.no_charts:
+            reporter.create_cost_visualization(
+                account_df,
+                f"AWS Cost by Service with Shared Costs Allocated - {account_name} ({start_date} to {display_end_date})",
+                account_id, start_date, end_date, profiles=args.render_profiles, variant='allocated'
+            )
+    return allocation
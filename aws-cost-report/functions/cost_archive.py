@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+try:
+    import zstandard
+except ImportError:  # Only needed for tar.zst archives
+    zstandard = None
+
+ARCHIVE_FORMATS = {
+    'zip': '.zip',
+    'tar.zst': '.tar.zst'
+}
+ARCHIVE_MANIFEST_NAME = "archive-manifest.json"
+# Charts and workbooks are already compressed; deflating them again only costs time
+STORED_EXTENSIONS = {'.png', '.xlsx', '.parquet', '.zip', '.gz'}
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class S3MultipartWriter:
+    """Write-only stream uploaded to S3 in multipart parts; at most one part is held in memory"""
+
+    def __init__(self, s3_client, bucket, key, part_size=MULTIPART_PART_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.position = 0
+        self.upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def upload_part(self, data):
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=part_number, Body=data
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def close(self):
+        """Upload the remaining bytes as the last part and complete the upload"""
+        if self.upload_id is None:
+            return
+        if self.buffer or not self.parts:
+            self.upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': self.parts}
+        )
+        self.upload_id = None
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
+
+class HashingReader:
+    """File reader that hashes and counts everything read through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+class ReportArchive:
+    """Packs report files into one zip or tar.zst archive while the run is still producing them.
+
+    Files queued with add_files are written by a background thread straight into the archive
+    stream, which goes to a local file or to an S3 multipart upload (target 's3://bucket/key').
+    Nothing is staged in temporary files and memory is bounded by one multipart part.
+    """
+
+    def __init__(self, target, archive_format, root, s3_client=None):
+        if archive_format == 'tar.zst' and zstandard is None:
+            raise ValueError("tar.zst archives need the zstandard package (pip install zstandard)")
+        self.target = target
+        self.archive_format = archive_format
+        self.root = root
+        self.entries = []
+        self.added = set()
+        self.error = None
+        self.started = time.perf_counter()
+
+        if target.startswith('s3://'):
+            bucket, _, key = target[len('s3://'):].partition('/')
+            self.sink = S3MultipartWriter(s3_client, bucket, key)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            self.sink = open(target, 'wb')
+
+        if archive_format == 'zip':
+            self.compressor = None
+            self.archive = zipfile.ZipFile(self.sink, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.compressor = zstandard.ZstdCompressor(level=3).stream_writer(self.sink, closefd=False)
+            self.archive = tarfile.open(fileobj=self.compressor, mode='w|')
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write_queued_files, name='report-archive', daemon=True)
+        self.thread.start()
+
+    def add_files(self, filenames):
+        """Queue report files for the archive; files already added are skipped"""
+        for filename in map(os.path.normpath, filenames):
+            if filename not in self.added:
+                self.added.add(filename)
+                self.queue.put(filename)
+
+    def write_queued_files(self):
+        while True:
+            filename = self.queue.get()
+            if filename is None:
+                return
+            if self.error is not None:
+                continue  # Drain the queue after a failure; close() raises it
+            try:
+                self.write_file(filename)
+            except Exception as e:
+                self.error = e
+
+    def write_file(self, filename):
+        name = os.path.relpath(filename, self.root).replace(os.sep, '/')
+        stat = os.stat(filename)
+        with open(filename, 'rb') as f:
+            reader = HashingReader(f)
+            if self.archive_format == 'zip':
+                info = zipfile.ZipInfo(name, date_time=datetime.fromtimestamp(stat.st_mtime).timetuple()[:6])
+                stored = os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS
+                info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                with self.archive.open(info, 'w') as dest:
+                    for chunk in iter(lambda: reader.read(COPY_CHUNK_SIZE), b''):
+                        dest.write(chunk)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = stat.st_size
+                info.mtime = stat.st_mtime
+                self.archive.addfile(info, reader)
+        self.entries.append({'name': name, 'size': reader.size, 'sha256': reader.sha256.hexdigest()})
+
+    def write_bytes(self, name, data):
+        if self.archive_format == 'zip':
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self.archive.addfile(info, HashingReader(_BytesReader(data)))
+
+    def close(self):
+        """Write the remaining files and the archive manifest, then finish the archive and upload"""
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            if self.error is not None:
+                raise self.error
+            manifest = {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'file_count': len(self.entries),
+                'total_size': sum(entry['size'] for entry in self.entries),
+                'files': self.entries
+            }
+            self.write_bytes(ARCHIVE_MANIFEST_NAME, json.dumps(manifest, indent=1).encode('utf-8'))
+            self.archive.close()
+            if self.compressor is not None:
+                self.compressor.close()
+            self.sink.close()
+        except Exception:
+            if isinstance(self.sink, S3MultipartWriter):
+                self.sink.abort()
+            raise
+
+        elapsed = time.perf_counter() - self.started
+        print(f"Archived {len(self.entries)} report files ({manifest['total_size'] / (1024 * 1024):,.1f} MB) "
+              f"to {self.target} in {elapsed:,.1f}s")
+        return self.target
+
+class _BytesReader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size=-1):
+        end = len(self.data) if size is None or size < 0 else self.offset + size
+        chunk = self.data[self.offset:end]
+        self.offset += len(chunk)
+        return chunk
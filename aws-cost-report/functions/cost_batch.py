@@ -0,0 +1,359 @@
+import argparse
+import json
+import os
+from datetime import datetime
+try:
+    import yaml
+except ImportError:  # Only needed for YAML spec files
+    yaml = None
+import boto3
+import pandas as pd
+from botocore.config import Config
+import aws_cost_reporter as reporter
+from ce_stub import StubCostExplorerClient
+from cur_ingest import GROUP_KEYS, CurCostFrames
+
+# Every Cost Explorer API request is billed at $0.01
+CE_REQUEST_COST = 0.01
+# One query grouped by service and account serves the organization and every account report
+SHARED_GROUP_BY = [reporter.SERVICE_GROUP_BY, reporter.LINKED_ACCOUNT_GROUP_BY]
+METRIC_COLUMNS = ['amortized_cost', 'unblended_cost', 'usage_quantity']
+# Options of the whole batch; report specs may set any other report option
+BATCH_OPTIONS = {'stub_accounts', 'window_months', 'max_workers', 'requests_per_second'}
+UNSUPPORTED_SPEC_OPTIONS = {'source', 'cur_path', 'profiles', 'role_arns', 'orgs_dir'}
+
+SPEC_EPILOG = """
+report specs (YAML or JSON), keys are the report options with '_' or '-':
+  defaults:
+    output_format: both
+  reports:
+    - name: org-last-6-months
+      start_date: 2024-11-01
+      end_date: 2025-05-01
+      group_by: [TAG:team]
+    - name: payments-last-year
+      start_date: 2024-05-01
+      end_date: 2025-05-01
+      account_id: "123456789012"
+"""
+
+def parse_batch_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='aws_cost_reporter.py batch',
+        description='Generate many reports from one shared, deduplicated set of Cost Explorer queries',
+        epilog=SPEC_EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('specs', help='YAML or JSON file with a list of report specs')
+    parser.add_argument('--plan', action='store_true',
+                        help='Print the query plan and estimated API cost without calling AWS')
+    parser.add_argument('--account-count', type=int, default=None,
+                        help='Number of linked accounts, for the cost estimate of separate runs')
+    parser.add_argument('--window-months', type=int, default=12,
+                        help='Fetch long ranges in windows of at most this many months (default: 12)')
+    parser.add_argument('--max-workers', type=int, default=4,
+                        help='Number of windows fetched concurrently (default: 4)')
+    parser.add_argument('--requests-per-second', type=float, default=5,
+                        help='Maximum Cost Explorer requests per second (default: 5)')
+    parser.add_argument('--stub-accounts', type=int, default=None,
+                        help='Use a synthetic Cost Explorer stub with this many accounts instead of AWS')
+    return parser.parse_args(argv)
+
+def read_spec_file(filename):
+    with open(filename) as f:
+        if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ValueError("YAML report specs need the pyyaml package; use a JSON file instead")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, list):
+        return {}, data
+    return data.get('defaults') or {}, data.get('reports') or []
+
+def spec_to_argv(spec):
+    """Turn a report spec into report command line arguments"""
+    argv = []
+    for key, value in spec.items():
+        option = f"--{key.replace('_', '-')}"
+        if value is None or value is False:
+            continue
+        if value is True:
+            argv.append(option)
+        elif isinstance(value, list) and key.replace('-', '_') == 'group_by':
+            for item in value:
+                argv += [option, str(item)]
+        elif isinstance(value, list):
+            argv += [option, ','.join(str(item) for item in value)]
+        else:
+            argv += [option, str(value)]  # YAML dates become date objects; str() gives YYYY-MM-DD
+    return argv
+
+def normalize_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Report spec '{name}': invalid date '{value}', expected YYYY-MM-DD") from None
+
+def load_report_specs(filename, options):
+    """Read report specs into (name, report arguments) pairs; identical specs are kept once"""
+    defaults, reports = read_spec_file(filename)
+    batch_argv = ['--window-months', str(options.window_months), '--max-workers', str(options.max_workers),
+                  '--requests-per-second', str(options.requests_per_second)]
+    if options.stub_accounts:
+        batch_argv += ['--stub-accounts', str(options.stub_accounts)]
+
+    specs = []
+    seen = {}
+    for i, report in enumerate(reports):
+        spec = {**defaults, **report}
+        name = str(spec.pop('name', f"report-{i + 1}"))
+        keys = {key.replace('-', '_') for key in spec}
+        if keys & BATCH_OPTIONS:
+            raise ValueError(f"Report spec '{name}': set {', '.join(sorted(keys & BATCH_OPTIONS))} on the batch command line")
+        if keys & UNSUPPORTED_SPEC_OPTIONS:
+            raise ValueError(f"Report spec '{name}': {', '.join(sorted(keys & UNSUPPORTED_SPEC_OPTIONS))} "
+                             f"cannot be used in a batch, which always reads Cost Explorer")
+
+        argv = spec_to_argv(spec)
+        try:
+            args = reporter.parse_arguments(argv + batch_argv)
+        except SystemExit:
+            raise ValueError(f"Report spec '{name}' is invalid (see the error above)") from None
+        args.start_date = normalize_date(args.start_date, name)
+        args.end_date = normalize_date(args.end_date, name)
+        if args.start_date >= args.end_date:
+            raise ValueError(f"Report spec '{name}': start_date must be before end_date")
+
+        key = tuple(sorted(argv))
+        if key in seen:
+            print(f"Report spec '{name}' is the same as '{seen[key]}' and is skipped")
+            continue
+        seen[key] = name
+        specs.append((name, args))
+    if not specs:
+        raise ValueError(f"No report specs in {filename}")
+    return specs
+
+def merge_periods(periods):
+    """Merge overlapping or adjacent [start, end) periods"""
+    merged = []
+    for start, end in sorted(periods):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def split_at_boundaries(intervals, boundaries):
+    """Cut intervals at report boundaries that fall inside a month.
+
+    Monthly results already split at month starts. Cutting at the other boundaries means no
+    result period straddles a report boundary, so every report is an exact slice of the results.
+    """
+    cuts = sorted({boundary for boundary in boundaries if not boundary.endswith('-01')})
+    segments = []
+    for start, end in intervals:
+        points = [start] + [cut for cut in cuts if start < cut < end] + [end]
+        segments.extend(zip(points, points[1:]))
+    return segments
+
+class BatchPlan:
+    """The minimal set of Cost Explorer queries that covers every report spec of a batch"""
+
+    def __init__(self, specs, window_months):
+        self.specs = specs
+        self.window_months = window_months
+        periods = [(args.start_date, args.end_date) for _, args in specs]
+        boundaries = [date for period in periods for date in period]
+        self.account_intervals = merge_periods(periods)
+        self.cost_segments = split_at_boundaries(self.account_intervals, boundaries)
+
+        group_periods = {}
+        for _, args in specs:
+            for group_by in args.group_by or []:
+                key = (group_by['Type'], group_by['Key'])
+                group_periods.setdefault(key, (group_by, []))[1].append((args.start_date, args.end_date))
+        self.groups = {}
+        for key, (group_by, periods) in group_periods.items():
+            intervals = merge_periods(periods)
+            self.groups[key] = {
+                'group_by': group_by,
+                'span': (intervals[0][0], intervals[-1][1]),
+                # Only the specs that use this grouping cut its queries
+                'segments': split_at_boundaries(intervals, [date for period in periods for date in period])
+            }
+
+    def window_count(self, start_date, end_date):
+        return len(reporter.split_date_range(start_date, end_date, self.window_months))
+
+    def queries(self):
+        """(operation, description, start, end, requests) of every planned query"""
+        queries = [
+            ('get_dimension_values', 'LINKED_ACCOUNT names', start, end, self.window_count(start, end))
+            for start, end in self.account_intervals
+        ]
+        queries += [
+            ('get_cost_and_usage', 'SERVICE x LINKED_ACCOUNT', start, end, self.window_count(start, end))
+            for start, end in self.cost_segments
+        ]
+        for group in self.groups.values():
+            label = reporter.get_group_by_label(group['group_by'])
+            operation = 'get_tags' if group['group_by']['Type'] == 'TAG' else 'get_cost_categories'
+            queries.append((operation, f"{label} keys and values", *group['span'], 2))
+            queries += [
+                ('get_cost_and_usage', f"{label} x LINKED_ACCOUNT", start, end, self.window_count(start, end))
+                for start, end in group['segments']
+            ]
+        return queries
+
+    def request_count(self):
+        return sum(query[-1] for query in self.queries())
+
+    def separate_run_requests(self):
+        """Requests of running every spec on its own, as (fixed, per linked account)"""
+        fixed = per_account = 0
+        for _, args in self.specs:
+            windows = self.window_count(args.start_date, args.end_date)
+            fixed += 2 * windows  # Organization query and account names
+            if args.account_id:
+                fixed += windows
+            else:
+                per_account += windows
+            fixed += sum(2 + windows for _ in args.group_by or [])
+        return fixed, per_account
+
+def print_plan(plan, account_count=None):
+    print(f"Batch plan for {len(plan.specs)} report specs:")
+    for name, args in plan.specs:
+        scope = f"account {args.account_id}" if args.account_id else "organization and all accounts"
+        groupings = ''.join(f", {reporter.get_group_by_label(group_by)}" for group_by in args.group_by or [])
+        print(f"  {name:<30} {args.start_date} to {args.end_date}  {scope}{groupings}")
+
+    print("Shared Cost Explorer queries:")
+    for operation, description, start, end, requests in plan.queries():
+        print(f"  {operation:<22} {description:<40} {start} to {end}  {requests:>3} request{'s' if requests != 1 else ''}")
+
+    request_count = plan.request_count()
+    print(f"Planned: {request_count} requests, ${request_count * CE_REQUEST_COST:,.2f} "
+          f"(plus one request per extra result page)")
+    fixed, per_account = plan.separate_run_requests()
+    if account_count is not None:
+        separate = fixed + per_account * account_count
+        print(f"Separate runs: {separate} requests, ${separate * CE_REQUEST_COST:,.2f} for {account_count} linked accounts")
+    else:
+        print(f"Separate runs: {fixed} requests + {per_account} per linked account, "
+              f"${fixed * CE_REQUEST_COST:,.2f} + ${per_account * CE_REQUEST_COST:,.2f} per linked account")
+    print("Forecasts (--forecast) add one request per account and day, shared through the forecast cache")
+
+def get_cost_rows(response):
+    """Flatten a SERVICE x LINKED_ACCOUNT response into one row per period, account and service"""
+    rows = []
+    for period in response['ResultsByTime']:
+        start_date = period['TimePeriod']['Start']
+        end_date = period['TimePeriod']['End']
+        for group in period['Groups']:
+            service_name, account_id = group['Keys']
+            metrics = group['Metrics']
+            rows.append((
+                account_id, f"{start_date[:7]}-01", service_name, start_date, end_date,
+                float(metrics['AmortizedCost']['Amount']),
+                float(metrics['UnblendedCost']['Amount']),
+                float(metrics['UsageQuantity']['Amount'])
+            ))
+    return pd.DataFrame(rows, columns=GROUP_KEYS + ['period_start', 'period_end'] + METRIC_COLUMNS)
+
+def merge_month_periods(periods):
+    """Merge result periods of the same month (split by a cut for another report) into one period"""
+    merged = []
+    for period in periods:
+        if not merged or merged[-1]['TimePeriod']['Start'][:7] != period['TimePeriod']['Start'][:7]:
+            merged.append({'TimePeriod': dict(period['TimePeriod']), 'Groups': {}})
+        month = merged[-1]
+        month['TimePeriod']['End'] = period['TimePeriod']['End']
+        for group in period['Groups']:
+            amounts = month['Groups'].setdefault(tuple(group['Keys']), {})
+            for metric, value in group['Metrics'].items():
+                amounts[metric] = amounts.get(metric, 0.0) + float(value['Amount'])
+    return [
+        {
+            'TimePeriod': month['TimePeriod'],
+            'Groups': [
+                {'Keys': list(keys), 'Metrics': {metric: {'Amount': str(amount)} for metric, amount in amounts.items()}}
+                for keys, amounts in month['Groups'].items()
+            ]
+        }
+        for month in merged
+    ]
+
+class BatchResults:
+    """Results of a batch plan's queries, sliced into the frames and responses of each report"""
+
+    def __init__(self, ce_client, plan):
+        self.ce_client = ce_client
+        self.account_names = {}
+        for start_date, end_date in plan.account_intervals:
+            for account in reporter.get_all_linked_accounts(ce_client, start_date, end_date):
+                self.account_names[account['id']] = account['name']
+
+        self.costs = pd.concat([
+            get_cost_rows(reporter.fetch_cost_and_usage(ce_client, start_date, end_date, group_by=SHARED_GROUP_BY))
+            for start_date, end_date in plan.cost_segments
+        ], ignore_index=True)
+
+        self.groups = {}
+        for key, group in plan.groups.items():
+            group_values = reporter.discover_group_values(ce_client, group['group_by'], *group['span'])
+            results = []
+            for start_date, end_date in group['segments']:
+                results += reporter.get_cost_by_group_and_account(ce_client, start_date, end_date, group['group_by'])['ResultsByTime']
+            self.groups[key] = (group_values, results)
+
+    def frames(self, start_date, end_date):
+        """Organization and account frames of one report period"""
+        in_period = (self.costs['period_start'] >= start_date) & (self.costs['period_end'] <= end_date)
+        aggregated = self.costs[in_period].groupby(GROUP_KEYS, sort=False)[METRIC_COLUMNS].sum().reset_index()
+        return CurCostFrames(aggregated, self.account_names, start_date, end_date)
+
+    def group_values(self, group_by):
+        return self.groups[(group_by['Type'], group_by['Key'])][0]
+
+    def group_response(self, group_by, start_date, end_date):
+        """Tag or cost category results of one report period, in the get_cost_by_group_and_account format"""
+        results = self.groups[(group_by['Type'], group_by['Key'])][1]
+        return {'ResultsByTime': merge_month_periods([
+            period for period in results
+            if period['TimePeriod']['Start'] >= start_date and period['TimePeriod']['End'] <= end_date
+        ])}
+
+def run_batch(argv):
+    options = parse_batch_arguments(argv)
+    specs = load_report_specs(options.specs, options)
+    plan = BatchPlan(specs, options.window_months)
+    print_plan(plan, options.stub_accounts or options.account_count)
+    if options.plan:
+        return
+
+    reporter.FETCH_SETTINGS['window_months'] = options.window_months
+    reporter.FETCH_SETTINGS['max_workers'] = options.max_workers
+    reporter.CE_RATE_LIMITER.set_rate(options.requests_per_second)
+    if options.stub_accounts:
+        print(f"Using Cost Explorer stub with {options.stub_accounts} synthetic accounts")
+        ce_client = StubCostExplorerClient(account_count=options.stub_accounts)
+    else:
+        ce_client = boto3.client('ce', config=Config(
+            max_pool_connections=max(10, options.max_workers),
+            retries={'max_attempts': 10, 'mode': 'adaptive'}
+        ))
+
+    first_request = reporter.CE_RATE_LIMITER.request_count
+    shared = BatchResults(ce_client, plan)
+    print(f"Fetched the shared results with {reporter.CE_RATE_LIMITER.request_count - first_request} requests")
+
+    for name, args in specs:
+        print(f"Generating report spec '{name}'...")
+        reporter.run_report(args, shared=shared)
+
+    request_count = reporter.CE_RATE_LIMITER.request_count - first_request
+    print(f"Batch of {len(specs)} report specs done with {request_count} Cost Explorer requests "
+          f"(${request_count * CE_REQUEST_COST:,.2f})")
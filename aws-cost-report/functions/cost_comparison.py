@@ -0,0 +1,200 @@
+import argparse
+import os
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from cost_store import ACCOUNTS_DATASET, ORGANIZATION_DATASET, CostDataStore, DEFAULT_STORE_ROOT
+
+TOP_MOVERS_COUNT = 25
+
+def parse_compare_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='aws_cost_reporter.py compare',
+        description='Compare two stored months of AWS cost data without calling Cost Explorer'
+    )
+    parser.add_argument('--month', required=True, help='Current month in YYYY-MM format')
+    parser.add_argument('--mode', choices=['mom', 'yoy'], default='mom',
+                        help='Baseline month: previous month (mom) or same month last year (yoy) (default: mom)')
+    parser.add_argument('--baseline-month', required=False,
+                        help='Explicit baseline month in YYYY-MM format (overrides --mode)')
+    parser.add_argument('--account-id', required=False, help='Limit the comparison to one AWS account ID (optional)')
+    parser.add_argument('--data-dir', default=DEFAULT_STORE_ROOT,
+                        help=f'Stored cost data directory (default: {DEFAULT_STORE_ROOT})')
+    parser.add_argument('--allow-partial', action='store_true',
+                        help='Compare even if a stored month covers only part of the month (e.g. the open month)')
+    return parser.parse_args(argv)
+
+def get_baseline_month(month, mode):
+    """Get the baseline month for a month-over-month or year-over-year comparison"""
+    month_dt = datetime.strptime(month, '%Y-%m')
+    offset = relativedelta(months=1) if mode == 'mom' else relativedelta(years=1)
+    return (month_dt - offset).strftime('%Y-%m')
+
+def compute_deltas(df, keys, cost_column, baseline_month, current_month):
+    """Compute baseline, current, delta and percent change per key for two months in one pass"""
+    totals = df.groupby(keys + ['Month'], observed=True)[cost_column].sum().unstack('Month')
+    totals = totals.reindex(columns=[baseline_month, current_month]).fillna(0)
+
+    baseline = totals[baseline_month].to_numpy()
+    current = totals[current_month].to_numpy()
+    delta = current - baseline
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_change = np.where(baseline != 0, delta / np.abs(baseline) * 100, np.nan)
+
+    result = pd.DataFrame({
+        f'{baseline_month} Cost ($)': baseline,
+        f'{current_month} Cost ($)': current,
+        'Change ($)': delta,
+        'Change (%)': percent_change
+    }, index=totals.index).reset_index()
+
+    return result.sort_values('Change ($)', key=np.abs, ascending=False, ignore_index=True)
+
+def get_top_movers(account_service_deltas, count=TOP_MOVERS_COUNT):
+    """Get the largest increases and decreases across all account and service pairs"""
+    increases = account_service_deltas.nlargest(count, 'Change ($)')
+    decreases = account_service_deltas.nsmallest(count, 'Change ($)')
+    increases = increases[increases['Change ($)'] > 0]
+    decreases = decreases[decreases['Change ($)'] < 0]
+    return pd.concat([increases, decreases], ignore_index=True)
+
+def check_partial_months(store, months, account_id=None, allow_partial=False):
+    """Refuse (or with allow_partial, warn about) stored months that cover only part of the month"""
+    account_filters = [('Account ID', '==', account_id)] if account_id else None
+    partial = set(store.partial_months(ACCOUNTS_DATASET, months, account_filters))
+    if not account_id:
+        partial.update(store.partial_months(ORGANIZATION_DATASET, months))
+    if not partial:
+        return
+    message = (f"Stored cost data for {', '.join(sorted(partial))} covers only part of the month, "
+               f"so the comparison would not be like for like")
+    if not allow_partial:
+        raise ValueError(f"{message}. Re-run the reporter for the whole month or pass --allow-partial.")
+    print(f"Warning: {message}")
+
+def build_comparison(store, baseline_month, current_month, account_id=None, allow_partial=False):
+    """Load the two stored months and compute every comparison view"""
+    months = [baseline_month, current_month]
+    check_partial_months(store, months, account_id, allow_partial)
+
+    account_filters = [('Account ID', '==', account_id)] if account_id else None
+    accounts_df = store.read(ACCOUNTS_DATASET, months=months,
+                             columns=['Account ID', 'Account Name', 'Service Name', 'Amortized Cost ($)'],
+                             filters=account_filters)
+
+    # Use the most recent name for each account so a renamed account stays on one row
+    latest_names = accounts_df.sort_values('Month').groupby('Account ID')['Account Name'].last()
+    accounts_df['Account Name'] = accounts_df['Account ID'].map(latest_names)
+
+    cost_column = 'Amortized Cost ($)'
+    account_service_deltas = compute_deltas(
+        accounts_df, ['Account ID', 'Account Name', 'Service Name'], cost_column, baseline_month, current_month
+    )
+
+    if account_id:
+        service_deltas = compute_deltas(accounts_df, ['Service Name'], cost_column, baseline_month, current_month)
+    else:
+        org_df = store.read(ORGANIZATION_DATASET, months=months,
+                            columns=['Service Name', 'Total Amortized Cost ($)'])
+        service_deltas = compute_deltas(org_df, ['Service Name'], 'Total Amortized Cost ($)',
+                                        baseline_month, current_month)
+
+    return {
+        'service_deltas': service_deltas,
+        'account_deltas': compute_deltas(accounts_df, ['Account ID', 'Account Name'], cost_column,
+                                         baseline_month, current_month),
+        'account_service_deltas': account_service_deltas,
+        'top_movers': get_top_movers(account_service_deltas)
+    }
+
+def get_comparison_directory(current_month):
+    """Get the directory path for comparison reports"""
+    year, month = current_month.split('-')
+    return f"aws_cost_reports/comparisons/{year}/{month}"
+
+def save_comparison_workbook(comparison, filename):
+    """Save every comparison view to its own sheet"""
+    sheets = [
+        ('Service Deltas', comparison['service_deltas']),
+        ('Account Deltas', comparison['account_deltas']),
+        ('Account Service Deltas', comparison['account_service_deltas']),
+        ('Top Movers', comparison['top_movers'])
+    ]
+
+    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+        workbook = writer.book
+        currency_format = workbook.add_format({'num_format': '$#,##0.00'})
+        percent_format = workbook.add_format({'num_format': '0.0"%"'})
+
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.sheets[sheet_name]
+            for i, column in enumerate(df.columns):
+                if column.endswith('($)'):
+                    worksheet.set_column(i, i, 18, currency_format)
+                elif column.endswith('(%)'):
+                    worksheet.set_column(i, i, 12, percent_format)
+                else:
+                    worksheet.set_column(i, i, 30)
+
+    print(f"Comparison report saved to {filename}")
+    return filename
+
+def create_top_movers_chart(top_movers, title, filename, count=20):
+    """Create a horizontal bar chart of the largest cost changes"""
+    movers = top_movers.reindex(top_movers['Change ($)'].abs().sort_values(ascending=False).index).head(count)
+    movers = movers.iloc[::-1]  # Largest change at the top
+    labels = (movers['Service Name'] + ' - ' + movers['Account Name']).str.slice(0, 70)
+    colors = np.where(movers['Change ($)'] >= 0, '#FF6B6B', '#00D084')
+
+    fig, ax = plt.subplots(figsize=(14, max(4, 0.45 * len(movers) + 2)))
+    ax.barh(range(len(movers)), movers['Change ($)'], color=colors, alpha=0.8)
+    ax.set_yticks(range(len(movers)))
+    ax.set_yticklabels(labels, fontsize=9)
+    ax.axvline(x=0, color='black', linestyle='-', alpha=0.3, linewidth=1)
+    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
+    ax.set_xlabel('Change (USD)', fontsize=12, fontweight='bold')
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3, axis='x')
+
+    for i, (change, percent) in enumerate(zip(movers['Change ($)'], movers['Change (%)'])):
+        label = f'${change:,.2f}' if np.isnan(percent) else f'${change:,.2f} ({percent:+.1f}%)'
+        ax.text(change, i, f' {label} ', va='center', ha='left' if change >= 0 else 'right', fontsize=8)
+
+    plt.tight_layout()
+    plt.savefig(filename, dpi=150, bbox_inches='tight', facecolor='white')
+    plt.close(fig)
+
+    print(f"Top movers chart saved to {filename}")
+    return filename
+
+def run_comparison_report(argv):
+    """Entry point for the compare subcommand"""
+    args = parse_compare_arguments(argv)
+    current_month = datetime.strptime(args.month, '%Y-%m').strftime('%Y-%m')
+    baseline_month = args.baseline_month or get_baseline_month(current_month, args.mode)
+    label = 'custom' if args.baseline_month else args.mode
+
+    print(f"Comparing {current_month} against {baseline_month} from stored data in {args.data_dir}...")
+    comparison = build_comparison(CostDataStore(args.data_dir), baseline_month, current_month, args.account_id,
+                                  args.allow_partial)
+
+    directory = get_comparison_directory(current_month)
+    os.makedirs(directory, exist_ok=True)
+    scope = args.account_id or 'organization'
+    basename = f"{directory}/aws-cost-comparison-{scope}-{label}-{baseline_month}_vs_{current_month}"
+
+    save_comparison_workbook(comparison, f"{basename}.xlsx")
+    if not comparison['top_movers'].empty:
+        create_top_movers_chart(
+            comparison['top_movers'],
+            f"Top Cost Movers - {scope} ({baseline_month} vs {current_month})",
+            f"{basename}.png"
+        )
+
+    baseline_total = comparison['account_deltas'][f'{baseline_month} Cost ($)'].sum()
+    current_total = comparison['account_deltas'][f'{current_month} Cost ($)'].sum()
+    print(f"Total: ${baseline_total:,.2f} -> ${current_total:,.2f} (change ${current_total - baseline_total:,.2f})")
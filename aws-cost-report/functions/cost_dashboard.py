@@ -0,0 +1,224 @@
+import html
+import json
+import os
+
+# plotly.js is loaded by the browser; nothing plotly-related is needed on the Python side
+PLOTLY_JS_URL = "https://cdn.plot.ly/plotly-2.35.2.min.js"
+
+DASHBOARD_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<script src="__PLOTLY_JS_URL__"></script>
+<style>
+  body { font-family: Arial, Helvetica, sans-serif; margin: 0; background: #F8F9FA; color: #2D3748; }
+  header { background: #232F3E; color: white; padding: 12px 24px; }
+  header h1 { font-size: 20px; margin: 0; }
+  #controls { padding: 12px 24px; display: flex; gap: 12px; align-items: center; }
+  #account-filter { width: 260px; padding: 6px; }
+  #account-select { width: 520px; padding: 6px; }
+  #summary { margin: 0 24px; border-collapse: collapse; width: calc(100% - 48px); }
+  #summary th { background: #E8F4FD; color: #2C5282; border: 1px solid #D1E7F5; padding: 8px; }
+  #summary td { background: white; font-weight: bold; text-align: center; border: 1px solid #E2E8F0; padding: 8px; }
+  #chart-title { text-align: center; margin: 16px 24px 0 24px; font-size: 16px; font-weight: bold; }
+  #chart { height: 640px; margin: 0 24px; }
+  #status { color: #C53030; padding: 0 24px; }
+</style>
+</head>
+<body>
+<header><h1>__TITLE__</h1></header>
+<div id="controls">
+  <input id="account-filter" type="search" placeholder="Filter accounts by name or ID">
+  <select id="account-select"></select>
+  <span id="account-count"></span>
+</div>
+<table id="summary">
+  <tr><th>Total Cost</th><th>Average Monthly Cost</th><th>Total Services</th></tr>
+  <tr><td id="total-cost"></td><td id="average-cost"></td><td id="service-count"></td></tr>
+</table>
+<div id="chart-title"></div>
+<div id="chart"></div>
+<div id="status"></div>
+<script id="account-index" type="application/json">__INDEX__</script>
+<script>
+(function () {
+  var index = JSON.parse(document.getElementById('account-index').textContent);
+  var shardCache = {};
+  var select = document.getElementById('account-select');
+  var filter = document.getElementById('account-filter');
+
+  function money(value) {
+    var sign = value < 0 ? '-' : '';
+    return sign + '$' + Math.abs(value).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+  }
+
+  function renderOptions() {
+    var needle = filter.value.toLowerCase();
+    var selected = select.value;
+    var shown = 0;
+    select.innerHTML = '';
+    index.accounts.forEach(function (account) {
+      var label = account.name + ' (' + account.id + ') - ' + money(account.total_cost);
+      if (needle && label.toLowerCase().indexOf(needle) === -1) { return; }
+      var option = document.createElement('option');
+      option.value = account.id;
+      option.textContent = label;
+      select.appendChild(option);
+      shown += 1;
+    });
+    if (selected) { select.value = selected; }
+    document.getElementById('account-count').textContent = shown + ' of ' + index.accounts.length + ' reports';
+  }
+
+  function loadShard(accountId) {
+    if (shardCache[accountId]) { return Promise.resolve(shardCache[accountId]); }
+    var entry = index.accounts.find(function (account) { return account.id === accountId; });
+    return fetch(entry.shard).then(function (response) {
+      if (!response.ok) { throw new Error('HTTP ' + response.status + ' loading ' + entry.shard); }
+      return response.json();
+    }).then(function (shard) {
+      shardCache[accountId] = shard;
+      return shard;
+    });
+  }
+
+  function render(shard) {
+    document.getElementById('chart-title').textContent = shard.title;
+    document.getElementById('total-cost').textContent = money(shard.total_cost);
+    document.getElementById('average-cost').textContent = money(shard.average_monthly_cost);
+    document.getElementById('service-count').textContent = shard.service_count;
+
+    var traces = shard.series.map(function (series) {
+      return {type: 'bar', name: series.name, x: shard.months, y: series.values,
+              marker: {color: series.color, opacity: 0.8},
+              hovertemplate: '%{x}<br>' + series.name + ': $%{y:,.2f}<extra></extra>'};
+    });
+    if (shard.refunds.some(function (value) { return value < 0; })) {
+      traces.push({type: 'bar', name: 'Refunds/Credits', x: shard.months, y: shard.refunds,
+                   marker: {color: index.refunds_color, opacity: 0.8},
+                   hovertemplate: '%{x}<br>Refunds/Credits: $%{y:,.2f}<extra></extra>'});
+    }
+    var annotations = shard.months.map(function (month, i) {
+      return {x: month, y: shard.positive_totals[i], text: 'Total: ' + money(shard.net_totals[i]),
+              showarrow: false, yanchor: 'bottom', bgcolor: 'lightblue', font: {size: 11}};
+    });
+    Plotly.react('chart', traces, {
+      barmode: 'relative',
+      yaxis: {title: 'Cost (USD)', tickprefix: '$', tickformat: ',.2f', gridcolor: '#E2E8F0'},
+      xaxis: {type: 'category'},
+      legend: {orientation: 'h', y: -0.12},
+      annotations: annotations,
+      margin: {t: 24}
+    }, {responsive: true});
+  }
+
+  function show(accountId) {
+    document.getElementById('status').textContent = '';
+    loadShard(accountId).then(render).catch(function (error) {
+      document.getElementById('status').textContent = error.message +
+        ' (shards are fetched over HTTP; serve this directory or open it from S3)';
+    });
+  }
+
+  filter.addEventListener('input', renderOptions);
+  select.addEventListener('change', function () { show(select.value); });
+  renderOptions();
+  if (index.accounts.length) {
+    select.value = index.accounts[0].id;
+    show(index.accounts[0].id);
+  }
+})();
+</script>
+</body>
+</html>
+"""
+
+def round_money_values(values):
+    """Round a sequence of dollar amounts to cents to keep shards compact"""
+    return [round(float(value), 2) for value in values]
+
+def build_dashboard_shard(chart_data, account_id, account_name, title, months_in_range, colors):
+    """Build the JSON shard for one report from the frames prepared by prepare_cost_chart_data"""
+    pivot_data = chart_data['pivot_data']
+    refunds_data = chart_data['refunds_data']
+
+    series = []
+    for i, service in enumerate(pivot_data.columns):
+        series.append({
+            'name': service,
+            'color': colors[i % len(colors)],  # Same color assignment as the PNG chart
+            'values': round_money_values(pivot_data[service].values)
+        })
+
+    positive_totals = pivot_data.sum(axis=1)
+    net_totals = positive_totals + refunds_data
+
+    return {
+        'id': account_id,
+        'name': account_name,
+        'title': title,
+        'months': [str(month) for month in pivot_data.index],
+        'series': series,
+        'refunds': round_money_values(refunds_data.values),
+        'positive_totals': round_money_values(positive_totals.values),
+        'net_totals': round_money_values(net_totals.values),
+        'total_cost': round(float(chart_data['total_cost']), 2),
+        'average_monthly_cost': round(float(chart_data['total_cost']) / months_in_range, 2),
+        'service_count': int(chart_data['service_count'])
+    }
+
+class CostDashboardWriter:
+    """Write a static single-page dashboard plus one JSON data shard per report.
+
+    Shards are written as soon as each report is added so nothing is held in memory
+    besides the small account index that is embedded in index.html.
+    """
+
+    def __init__(self, directory, title, colors, refunds_color):
+        self.directory = directory
+        self.title = title
+        self.colors = colors
+        self.refunds_color = refunds_color
+        self.accounts = []
+        os.makedirs(os.path.join(self.directory, 'data'), exist_ok=True)
+
+    def add_report(self, chart_data, account_id, account_name, title, months_in_range):
+        """Write the shard for one report and register it in the index"""
+        shard = build_dashboard_shard(
+            chart_data, account_id, account_name, title, months_in_range, self.colors
+        )
+        shard_path = f"data/{account_id}.json"
+        with open(os.path.join(self.directory, shard_path), 'w') as f:
+            json.dump(shard, f, separators=(',', ':'))
+
+        self.accounts.append({
+            'id': account_id,
+            'name': account_name,
+            'total_cost': shard['total_cost'],
+            'shard': shard_path
+        })
+        return shard_path
+
+    def write(self):
+        """Write index.html with the embedded account index"""
+        # Organization summary first, then accounts by descending cost
+        accounts = sorted(
+            self.accounts,
+            key=lambda account: (account['id'] != 'organization_summary', -account['total_cost'])
+        )
+        index = {'refunds_color': self.refunds_color, 'accounts': accounts}
+        # Escape "</" so account names can never close the embedding script tag
+        index_json = json.dumps(index, separators=(',', ':')).replace('</', '<\\/')
+
+        page = (DASHBOARD_TEMPLATE
+                .replace('__PLOTLY_JS_URL__', PLOTLY_JS_URL)
+                .replace('__TITLE__', html.escape(self.title))
+                .replace('__INDEX__', index_json))
+
+        filename = os.path.join(self.directory, 'index.html')
+        with open(filename, 'w') as f:
+            f.write(page)
+
+        print(f"Cost dashboard saved to {filename} ({len(self.accounts)} data shards)")
+        return filename
@@ -0,0 +1,285 @@
+import argparse
+import heapq
+import os
+import time
+from datetime import date, datetime, timedelta
+import boto3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from botocore.config import Config
+import aws_cost_reporter as reporter
+from ce_stub import StubCostExplorerClient
+from cur_ingest import DEFAULT_BATCH_SIZE, calculate_amortized_cost, get_service_names, scan_cur_batches
+
+# Drill-down dimensions with their Cost Explorer GroupBy key and CUR column
+DRILLDOWN_DIMENSIONS = {
+    'resource': {'key': 'RESOURCE_ID', 'cur_column': 'line_item_resource_id', 'label': 'Resource ID'},
+    'usage-type': {'key': 'USAGE_TYPE', 'cur_column': 'line_item_usage_type', 'label': 'Usage Type'}
+}
+# get_cost_and_usage_with_resources only has data for the last 14 days
+RESOURCE_LOOKBACK_DAYS = 14
+DEFAULT_SERVICES = ['Amazon Elastic Compute Cloud - Compute']
+DEFAULT_CAPACITY = 1000
+DEFAULT_TOP = 10
+NO_KEY_LABEL = '(none)'
+
+class SpaceSaving:
+    """Weighted Space-Saving summary of the heaviest keys of a stream (Metwally et al.).
+
+    At most capacity counters are kept. A key that is not counted takes over the smallest counter,
+    whose weight it inherits as its error. Every estimate is at most error above the true weight,
+    errors never exceed total / capacity, and every key heavier than total / capacity is counted.
+    Weights must be positive.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}  # key -> [estimated weight, error]
+        self.heap = []  # One (weight, key) entry per counter; weights may be stale (too low)
+        self.total = 0.0
+        self.updates = 0
+
+    def add(self, key, weight):
+        self.total += weight
+        self.updates += 1
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0.0]
+            heapq.heappush(self.heap, (weight, key))
+        else:
+            min_weight, min_key = self.pop_min()
+            del self.counters[min_key]
+            self.counters[key] = [min_weight + weight, min_weight]
+            heapq.heappush(self.heap, (min_weight + weight, key))
+
+    def pop_min(self):
+        """Remove the heap entry of the smallest counter, refreshing stale entries on the way"""
+        while True:
+            weight, key = heapq.heappop(self.heap)
+            current = self.counters[key][0]
+            if current == weight:
+                return weight, key
+            heapq.heappush(self.heap, (current, key))
+
+    def error_bound(self):
+        """Largest possible overestimate of any key"""
+        if len(self.counters) < self.capacity:
+            return 0.0  # Nothing was ever evicted, every count is exact
+        return min(weight for weight, _ in self.counters.values())
+
+    def top(self, n):
+        """The n heaviest keys with estimate, error and whether their place in the top n is certain.
+
+        A key is certainly in the top n when its lower bound (estimate - error) is at least the
+        estimate of the first key outside the top n.
+        """
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        threshold = ranked[n][1][0] if len(ranked) > n else self.error_bound()
+        return [
+            {'key': key, 'estimate': weight, 'error': error, 'lower_bound': weight - error,
+             'guaranteed': weight - error >= threshold}
+            for key, (weight, error) in ranked[:n]
+        ]
+
+class DrilldownSummary:
+    """One Space-Saving summary per service, plus the credits that cannot be streamed into it"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.summaries = {}
+        self.credits = {}
+
+    def add(self, service, key, amount):
+        if amount > 0:
+            summary = self.summaries.get(service)
+            if summary is None:
+                summary = self.summaries[service] = SpaceSaving(self.capacity)
+            summary.add(key or NO_KEY_LABEL, amount)
+        elif amount < 0:
+            self.credits[service] = self.credits.get(service, 0.0) + amount
+
+    def services(self):
+        """Services by streamed cost, highest first"""
+        services = set(self.summaries) | set(self.credits)
+        return sorted(services, key=lambda service: -self.summaries[service].total if service in self.summaries else 0)
+
+    def service_rows(self):
+        rows = []
+        for service in self.services():
+            summary = self.summaries.get(service, SpaceSaving(self.capacity))
+            rows.append({
+                'Service Name': service,
+                'Cost ($)': summary.total,
+                'Credits ($)': self.credits.get(service, 0.0),
+                'Net Cost ($)': summary.total + self.credits.get(service, 0.0),
+                'Items Streamed': summary.updates,
+                'Counters Kept': len(summary.counters),
+                'Max Overestimate ($)': summary.error_bound()
+            })
+        return pd.DataFrame(rows)
+
+    def top_rows(self, n, label):
+        rows = []
+        for service in self.services():
+            summary = self.summaries.get(service)
+            if summary is None:
+                continue
+            for rank, entry in enumerate(summary.top(n), start=1):
+                rows.append({
+                    'Service Name': service,
+                    'Rank': rank,
+                    label: entry['key'],
+                    'Estimated Cost ($)': entry['estimate'],
+                    'Max Overestimate ($)': entry['error'],
+                    'Guaranteed Cost ($)': entry['lower_bound'],
+                    'Share of Service (%)': entry['estimate'] / summary.total * 100 if summary.total else 0.0,
+                    'Certain Top Rank': entry['guaranteed']
+                })
+        return pd.DataFrame(rows)
+
+def get_drilldown_filter(account_id, services):
+    expressions = [{'Dimensions': {'Key': 'SERVICE', 'Values': services}}]
+    if account_id:
+        expressions.insert(0, {'Dimensions': {'Key': 'LINKED_ACCOUNT', 'Values': [account_id]}})
+    return {'And': expressions} if len(expressions) > 1 else expressions[0]
+
+def iter_cost_explorer_items(ce_client, dimension, start_date, end_date, account_id, services):
+    """Yield (service, key, amortized cost) page by page; no page is kept after it is streamed"""
+    request = {
+        'TimePeriod': {'Start': start_date, 'End': end_date},
+        'Granularity': 'MONTHLY',
+        'Metrics': ['AmortizedCost'],
+        'Filter': get_drilldown_filter(account_id, services),
+        'GroupBy': [reporter.SERVICE_GROUP_BY, {'Type': 'DIMENSION', 'Key': DRILLDOWN_DIMENSIONS[dimension]['key']}]
+    }
+    operation = 'get_cost_and_usage_with_resources' if dimension == 'resource' else 'get_cost_and_usage'
+    page_token = None
+    while True:
+        response = reporter.call_cost_explorer(ce_client, operation, **request, **({'NextPageToken': page_token} if page_token else {}))
+        for period in response['ResultsByTime']:
+            for group in period['Groups']:
+                service, key = group['Keys']
+                yield service, key, float(group['Metrics']['AmortizedCost']['Amount'])
+        page_token = response.get('NextPageToken')
+        if not page_token:
+            return
+
+def iter_cur_items(cur_path, dimension, start_date, end_date, account_id, services, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (service, key, amortized cost) per CUR batch, aggregated within the batch only"""
+    column = DRILLDOWN_DIMENSIONS[dimension]['cur_column']
+    row_filter = ds.field('line_item_usage_account_id') == account_id if account_id else None
+    for batch in scan_cur_batches(cur_path, start_date, end_date, batch_size, extra_columns=[column], row_filter=row_filter):
+        if batch.num_rows == 0:
+            continue
+        table = pa.Table.from_batches([batch])
+        batch_df = table.drop_columns(
+            [name for name in ('product', 'product_product_name', 'line_item_usage_start_date') if name in table.column_names]
+        ).to_pandas()
+        items = pd.DataFrame({
+            'service': get_service_names(table).to_numpy(),
+            'key': batch_df[column].fillna('').to_numpy(),
+            'amortized_cost': calculate_amortized_cost(batch_df)
+        })
+        if services:
+            items = items[items['service'].isin(services)]
+        for (service_name, key), amount in items.groupby(['service', 'key'], sort=False)['amortized_cost'].sum().items():
+            yield service_name, key, amount
+
+def get_drilldown_directory(account_id, end_date):
+    return reporter.get_chart_directory(account_id or 'organization_summary', end_date)
+
+def save_drilldown_report(summary, dimension, account_id, start_date, end_date, top):
+    label = DRILLDOWN_DIMENSIONS[dimension]['label']
+    directory = get_drilldown_directory(account_id, end_date)
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{directory}/aws-cost-drilldown-{dimension}-{account_id or 'organization_summary'}-{start_date}_to_{end_date}.xlsx"
+
+    top_rows = summary.top_rows(top, label)
+    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+        top_rows.to_excel(writer, sheet_name='Top Contributors', index=False)
+        summary.service_rows().to_excel(writer, sheet_name='Services', index=False)
+        currency_format = writer.book.add_format({'num_format': '$#,##0.00'})
+        writer.sheets['Top Contributors'].set_column('A:A', 40)
+        writer.sheets['Top Contributors'].set_column('C:C', 45)
+        writer.sheets['Top Contributors'].set_column('D:F', 18, currency_format)
+        writer.sheets['Services'].set_column('A:A', 40)
+        writer.sheets['Services'].set_column('B:D', 16, currency_format)
+        writer.sheets['Services'].set_column('G:G', 18, currency_format)
+    print(f"Drill-down report saved to {filename}")
+    return filename
+
+def print_drilldown(summary, dimension, top):
+    label = DRILLDOWN_DIMENSIONS[dimension]['label']
+    for service in summary.services():
+        service_summary = summary.summaries.get(service)
+        if service_summary is None:
+            continue
+        print(f"\n{service}: ${service_summary.total:,.2f} over {service_summary.updates:,} items, "
+              f"credits ${summary.credits.get(service, 0.0):,.2f}, estimates at most "
+              f"${service_summary.error_bound():,.2f} high")
+        print(f"  {'#':>3}  {label:<45} {'Estimate':>14} {'Max error':>12}")
+        for rank, entry in enumerate(service_summary.top(top), start=1):
+            marker = '' if entry['guaranteed'] else '  (rank not certain)'
+            print(f"  {rank:>3}  {str(entry['key'])[:45]:<45} ${entry['estimate']:>13,.2f} ${entry['error']:>11,.2f}{marker}")
+
+def parse_drilldown_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='aws_cost_reporter.py drilldown',
+        description='Find the resources or usage types behind a service cost with a bounded-memory top-K summary'
+    )
+    parser.add_argument('--account-id', required=False, help='Linked account to drill into (default: the whole organization)')
+    parser.add_argument('--service', action='append', dest='services', metavar='SERVICE',
+                        help=f"Service to drill into, repeatable; applies to both sources (default: {DEFAULT_SERVICES[0]})")
+    parser.add_argument('--by', choices=sorted(DRILLDOWN_DIMENSIONS), default='resource',
+                        help='Break costs down by resource ID or usage type (default: resource)')
+    parser.add_argument('--start-date', required=False,
+                        help=f'Start date in YYYY-MM-DD format (default: {RESOURCE_LOOKBACK_DAYS} days ago)')
+    parser.add_argument('--end-date', required=False, help='End date in YYYY-MM-DD format (default: today)')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help=f'Contributors listed per service (default: {DEFAULT_TOP})')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                        help=f'Counters kept per service; estimates are off by at most cost / capacity (default: {DEFAULT_CAPACITY})')
+    parser.add_argument('--source', choices=['ce', 'cur'], default='ce', help='Read Cost Explorer or CUR line items (default: ce)')
+    parser.add_argument('--cur-path', required=False, help='Local directory or s3:// prefix of CUR 2.0 Parquet files (with --source cur)')
+    parser.add_argument('--stub-accounts', type=int, default=None,
+                        help='Use a synthetic Cost Explorer stub with this many accounts instead of AWS')
+    args = parser.parse_args(argv)
+
+    if args.capacity <= args.top:
+        parser.error('--capacity must be larger than --top')
+    if args.source == 'cur' and not args.cur_path:
+        parser.error('--cur-path is required with --source cur')
+    return args
+
+def run_drilldown(argv):
+    args = parse_drilldown_arguments(argv)
+    end_date = args.end_date or date.today().strftime('%Y-%m-%d')
+    start_date = args.start_date or (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=RESOURCE_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+    services = args.services or DEFAULT_SERVICES
+
+    if args.source == 'cur':
+        items = iter_cur_items(args.cur_path, args.by, start_date, end_date, args.account_id, services)
+    else:
+        if args.stub_accounts:
+            print(f"Using Cost Explorer stub with {args.stub_accounts} synthetic accounts")
+            ce_client = StubCostExplorerClient(account_count=args.stub_accounts)
+        else:
+            if args.by == 'resource' and start_date < (date.today() - timedelta(days=RESOURCE_LOOKBACK_DAYS)).isoformat():
+                raise ValueError(f"Cost Explorer only has resource-level data for the last {RESOURCE_LOOKBACK_DAYS} days; "
+                                 f"use a later --start-date or --source cur")
+            ce_client = boto3.client('ce', config=Config(retries={'max_attempts': 10, 'mode': 'adaptive'}))
+        items = iter_cost_explorer_items(ce_client, args.by, start_date, end_date, args.account_id, services)
+
+    scope = f"account {args.account_id}" if args.account_id else "the organization"
+    print(f"Streaming costs by {DRILLDOWN_DIMENSIONS[args.by]['label'].lower()} for {scope} ({start_date} to {end_date})...")
+    started = time.perf_counter()
+    summary = DrilldownSummary(args.capacity)
+    for service, key, amount in items:
+        summary.add(service, key, amount)
+    print(f"Streamed {sum(s.updates for s in summary.summaries.values()):,} items in {time.perf_counter() - started:,.1f}s "
+          f"with at most {args.capacity:,} counters per service")
+
+    print_drilldown(summary, args.by, args.top)
+    return save_drilldown_report(summary, args.by, args.account_id, start_date, end_date, args.top)
@@ -0,0 +1,105 @@
+import json
+import os
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+import numpy as np
+
+FORECAST_MONTHS = 3
+# Same prediction interval as the Cost Explorer forecasts requested by the reporter
+PREDICTION_INTERVAL_LEVEL = 80
+PREDICTION_INTERVAL_Z = 1.2816  # Two-sided 80% interval of a normal distribution
+
+def get_forecast_period(today=None, months=FORECAST_MONTHS):
+    """Get the start, end and months of the next quarter (the full months after the current one)"""
+    today = today or date.today()
+    start = today.replace(day=1) + relativedelta(months=1)
+    end = start + relativedelta(months=months)
+    forecast_months = [(start + relativedelta(months=i)).strftime('%Y-%m') for i in range(months)]
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), forecast_months
+
+def get_gap_months(last_month, forecast_months):
+    """Months (YYYY-MM) between the last reported month and the first forecast month, e.g. the open month"""
+    gap = int(month_numbers(forecast_months[:1])[0] - month_numbers([last_month])[0]) - 1
+    first = datetime.strptime(last_month, '%Y-%m') + relativedelta(months=1)
+    return [(first + relativedelta(months=i)).strftime('%Y-%m') for i in range(max(gap, 0))]
+
+def parse_forecast_response(response):
+    """Convert a get_cost_forecast response into month, mean and interval lists"""
+    results = response['ForecastResultsByTime']
+    mean = [float(result['MeanValue']) for result in results]
+    return {
+        'months': [result['TimePeriod']['Start'][:7] for result in results],
+        'mean': mean,
+        'lower': [float(result.get('PredictionIntervalLowerBound', value)) for result, value in zip(results, mean)],
+        'upper': [float(result.get('PredictionIntervalUpperBound', value)) for result, value in zip(results, mean)],
+        'source': 'api'
+    }
+
+def month_numbers(months):
+    """Convert YYYY-MM strings to consecutive month numbers"""
+    return np.array([int(month[:4]) * 12 + int(month[5:7]) for month in months], dtype=float)
+
+def forecast_monthly_costs(history, forecast_months):
+    """Forecast every row of a series x month cost matrix with one least-squares linear trend fit.
+
+    history is a DataFrame with one row per series (organization or account) and one column per
+    full month (YYYY-MM, ascending). All rows are fitted together; missing months count as zero.
+    Returns one forecast per row in the parse_forecast_response format.
+    """
+    costs = history.fillna(0).to_numpy(dtype=float)
+    history_months = month_numbers(history.columns)
+    target_months = month_numbers(forecast_months)
+
+    # Month offsets relative to the last full month keep gaps between history and forecast exact
+    offsets = history_months - history_months[-1]
+    if len(offsets) > 1:
+        design = np.column_stack([np.ones(len(offsets)), offsets])
+    else:
+        design = np.ones((1, 1))  # One month of history: flat forecast
+    coefficients = np.linalg.lstsq(design, costs.T, rcond=None)[0]
+
+    residuals = costs.T - design @ coefficients
+    degrees_of_freedom = max(len(offsets) - design.shape[1], 1)
+    residual_std = np.sqrt((residuals ** 2).sum(axis=0) / degrees_of_freedom)
+
+    target_offsets = target_months - history_months[-1]
+    target_design = np.column_stack([np.ones(len(target_offsets)), target_offsets])[:, :design.shape[1]]
+    mean = np.clip((target_design @ coefficients).T, 0, None)
+    spread = PREDICTION_INTERVAL_Z * residual_std[:, np.newaxis]
+    lower = np.clip(mean - spread, 0, None)
+    upper = mean + spread
+
+    return {
+        key: {
+            'months': list(forecast_months),
+            'mean': mean[i].tolist(),
+            'lower': lower[i].tolist(),
+            'upper': upper[i].tolist(),
+            'source': 'local'
+        }
+        for i, key in enumerate(history.index)
+    }
+
+class ForecastCache:
+    """Cost Explorer forecasts of one day, kept in a JSON file so reruns on the same day reuse them"""
+
+    def __init__(self, directory, today=None):
+        self.filename = os.path.join(directory, f"{(today or date.today()).isoformat()}.json")
+        self.forecasts = {}
+        if os.path.exists(self.filename):
+            with open(self.filename) as f:
+                self.forecasts = json.load(f)
+
+    def get(self, key):
+        return self.forecasts.get(key)
+
+    def put(self, key, forecast):
+        self.forecasts[key] = forecast
+
+    def save(self):
+        """Write the cache via a temporary file and rename so a reader never sees a partial file"""
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temp_filename = f"{self.filename}.tmp"
+        with open(temp_filename, 'w') as f:
+            json.dump(self.forecasts, f)
+        os.replace(temp_filename, self.filename)
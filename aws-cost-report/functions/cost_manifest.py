@@ -0,0 +1,121 @@
+import glob
+import hashlib
+import json
+import mimetypes
+import os
+from datetime import datetime, timezone
+from cost_schema import to_dollars
+
+# Report manifests live next to the reports they describe, so syncing the report tree to S3
+# (aws-cost-reports/ prefix) publishes them too:
+#   aws_cost_reports/manifest/index.json                      every period with its manifest key
+#   aws_cost_reports/manifest/2024-11-01_to_2025-05-01.json   every report of one period
+# Artifact keys are relative to the report root, i.e. the S3 key below the report prefix.
+MANIFEST_DIRECTORY = "manifest"
+INDEX_FILENAME = "index.json"
+TOTAL_COLUMNS = {
+    'amortized_cost': 'Amortized Cost ($)',
+    'unblended_cost': 'Unblended Cost ($)',
+    'refunds': 'Refund ($)'
+}
+
+def summarize_totals(df):
+    """Total amortized cost, unblended cost and refunds of an account or organization frame"""
+    totals = {}
+    for name, suffix in TOTAL_COLUMNS.items():
+        # Organization frames prefix the columns with 'Total '
+        columns = [column for column in df.columns if column.endswith(suffix)]
+        totals[name] = round(float(to_dollars(df[columns[0]].sum())), 2) if columns else 0.0
+    return totals
+
+def file_sha256(filename, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def describe_artifact(filename, root):
+    """Manifest entry of one report file"""
+    return {
+        'key': os.path.relpath(filename, root).replace(os.sep, '/'),
+        'size': os.path.getsize(filename),
+        'sha256': file_sha256(filename),
+        'content_type': mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    }
+
+def find_report_artifacts(directory, start_date, end_date):
+    """Report files of one period in an account or organization directory"""
+    return sorted(glob.glob(os.path.join(directory, f"*-{start_date}_to_{end_date}.*")))
+
+def write_json_atomically(data, filename):
+    """Write JSON via a temporary file and rename so readers never see a partial manifest"""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(temp_filename, filename)
+
+def read_json(filename, default):
+    if not os.path.exists(filename):
+        return default
+    with open(filename) as f:
+        return json.load(f)
+
+class ReportManifest:
+    """Manifest of one reporting period, merged into the existing manifest and index on write"""
+
+    def __init__(self, root, start_date, end_date):
+        self.root = root
+        self.start_date = start_date
+        self.end_date = end_date
+        self.period = f"{start_date}_to_{end_date}"
+        self.reports = {}
+
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_DIRECTORY, f"{self.period}.json")
+
+    def index_path(self):
+        return os.path.join(self.root, MANIFEST_DIRECTORY, INDEX_FILENAME)
+
+    def add_report(self, report_id, name, totals, artifacts):
+        """Add one account, organization or dashboard entry; artifacts are describe_artifact entries"""
+        self.reports[report_id] = {
+            'name': name,
+            'totals': totals,
+            'artifacts': artifacts
+        }
+
+    def add_files(self, report_id, name, totals, filenames):
+        self.add_report(report_id, name, totals, [describe_artifact(filename, self.root) for filename in filenames])
+
+    def write(self):
+        """Merge this run into the period manifest, then point the index at it.
+
+        The period manifest is replaced before the index, so the index never refers to a
+        manifest that does not exist yet. Returns the paths of both files.
+        """
+        generated_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        manifest = read_json(self.manifest_path(), {'reports': {}})
+        manifest['reports'].update(self.reports)
+        manifest.update({
+            'period': {'start_date': self.start_date, 'end_date': self.end_date},
+            'generated_at': generated_at
+        })
+        write_json_atomically(manifest, self.manifest_path())
+
+        organization = manifest['reports'].get('organization_summary', {})
+        index = read_json(self.index_path(), {'periods': {}})
+        index['periods'][self.period] = {
+            'manifest': os.path.relpath(self.manifest_path(), self.root).replace(os.sep, '/'),
+            'sha256': file_sha256(self.manifest_path()),
+            'generated_at': generated_at,
+            'report_count': len(manifest['reports']),
+            'organization_totals': organization.get('totals')
+        }
+        index['generated_at'] = generated_at
+        write_json_atomically(index, self.index_path())
+
+        print(f"Report manifest for {self.period} updated ({len(self.reports)} reports in this run)")
+        return [self.manifest_path(), self.index_path()]
@@ -0,0 +1,130 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import duckdb
+from cost_store import ACCOUNTS_DATASET, ORGANIZATION_DATASET, DEFAULT_STORE_ROOT
+
+# SQL-friendly views over the stored Parquet data. The month partition column comes from the
+# directory names, so filters on month only open the matching partitions. partial_month marks
+# rows fetched by a run that covered only part of their month (e.g. the open month).
+VIEW_DEFINITIONS = {
+    'account_costs': (ACCOUNTS_DATASET, """
+        SELECT
+            month,
+            "Account ID" AS account_id,
+            "Account Name" AS account_name,
+            CAST("Start Date" AS DATE) AS start_date,
+            CAST("End Date" AS DATE) AS end_date,
+            "Service Name" AS service,
+            "Amortized Cost ($)" AS amortized_cost,
+            "Unblended Cost ($)" AS unblended_cost,
+            "Usage Quantity" AS usage_quantity,
+            "Refund ($)" AS refund,
+            {partial_month} AS partial_month
+        FROM read_parquet('{files}', hive_partitioning = true, hive_types = {{'month': VARCHAR}})
+    """),
+    'organization_costs': (ORGANIZATION_DATASET, """
+        SELECT
+            month,
+            CAST("Start Date" AS DATE) AS start_date,
+            CAST("End Date" AS DATE) AS end_date,
+            "Service Name" AS service,
+            "Total Amortized Cost ($)" AS amortized_cost,
+            "Total Unblended Cost ($)" AS unblended_cost,
+            "Total Usage Quantity" AS usage_quantity,
+            "Total Refund ($)" AS refund,
+            {partial_month} AS partial_month
+        FROM read_parquet('{files}', hive_partitioning = true, hive_types = {{'month': VARCHAR}})
+    """)
+}
+
+PARTIAL_MONTH_EXPRESSION = """(
+                CAST("Start Date" AS DATE) <> CAST(month || '-01' AS DATE)
+                OR CAST("End Date" AS DATE) <> CAST(month || '-01' AS DATE) + INTERVAL 1 MONTH
+            )"""
+
+QUERY_EPILOG = """
+tables:
+  account_costs       month, account_id, account_name, start_date, end_date, service,
+                      amortized_cost, unblended_cost, usage_quantity, refund, partial_month
+  organization_costs  month, start_date, end_date, service,
+                      amortized_cost, unblended_cost, usage_quantity, refund, partial_month
+
+  partial_month is true for rows that cover only part of their month; add
+  "AND NOT partial_month" to compare whole months only.
+
+example:
+  aws_cost_reporter.py query "SELECT month, sum(amortized_cost) AS ec2 FROM account_costs
+      WHERE account_id = '123456789012' AND month BETWEEN '2025-04' AND '2025-06'
+      AND service LIKE 'Amazon Elastic Compute Cloud%' AND amortized_cost > 0
+      GROUP BY month ORDER BY month"
+"""
+
+def parse_query_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='aws_cost_reporter.py query',
+        description='Run SQL over the stored cost data without calling Cost Explorer',
+        epilog=QUERY_EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('sql', nargs='?', help='SQL query (or use --file)')
+    parser.add_argument('--file', required=False, help='Read the SQL query from a file')
+    parser.add_argument('--format', choices=['table', 'csv', 'parquet'], default='table',
+                        help='Result format (default: table)')
+    parser.add_argument('--output', required=False,
+                        help='Write the result to this file (required for parquet; csv defaults to stdout)')
+    parser.add_argument('--data-dir', default=DEFAULT_STORE_ROOT,
+                        help=f'Stored cost data directory (default: {DEFAULT_STORE_ROOT})')
+    args = parser.parse_args(argv)
+
+    if bool(args.sql) == bool(args.file):
+        parser.error('provide exactly one of a SQL argument or --file')
+    if args.format == 'parquet' and not args.output:
+        parser.error('--output is required with --format parquet')
+    return args
+
+def connect_cost_data(data_dir):
+    """Open an in-memory DuckDB connection with a view per stored dataset"""
+    connection = duckdb.connect(database=':memory:')
+    for view_name, (dataset, definition) in VIEW_DEFINITIONS.items():
+        files = os.path.join(data_dir, dataset, 'month=*', '*.parquet')
+        if not glob.glob(files):
+            continue
+        view_sql = definition.format(files=files, partial_month=PARTIAL_MONTH_EXPRESSION)
+        connection.execute(f"CREATE VIEW {view_name} AS {view_sql}")
+    return connection
+
+def run_query(argv):
+    """Entry point for the query subcommand"""
+    args = parse_query_arguments(argv)
+    sql = args.sql
+    if args.file:
+        with open(args.file) as f:
+            sql = f.read()
+    sql = sql.strip().rstrip(';')
+
+    started = time.perf_counter()
+    connection = connect_cost_data(args.data_dir)
+
+    if args.output and args.format in ('csv', 'parquet'):
+        # DuckDB writes the file directly without materializing the result in Python
+        options = "FORMAT parquet" if args.format == 'parquet' else "FORMAT csv, HEADER true"
+        output = args.output.replace("'", "''")
+        row_count = connection.execute(f"COPY ({sql}) TO '{output}' ({options})").fetchone()[0]
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        result = connection.execute(sql).df()
+        row_count = len(result)
+        if args.format == 'csv':
+            result.to_csv(sys.stdout, index=False)
+        else:
+            print(result.to_string(index=False) if row_count else '(no rows)')
+            if args.output:
+                with open(args.output, 'w') as f:
+                    f.write(result.to_string(index=False))
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"{row_count:,} rows in {elapsed_ms:,.0f} ms", file=sys.stderr)
+    connection.close()
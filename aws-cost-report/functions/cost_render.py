@@ -0,0 +1,69 @@
+import argparse
+import io
+import matplotlib.pyplot as plt
+from PIL import Image
+
+# Chart render profiles; one figure is saved once per selected profile.
+#   print   300 dpi PNG, the original chart file
+#   web     100 dpi palette PNG (or WebP) for browsers and downloads
+#   thumb   small palette PNG (or WebP) preview
+#   vector  SVG (or PDF) with text kept as text
+# The first format of each profile is its default; 'web:webp' or 'vector:pdf' pick another.
+RENDER_PROFILES = {
+    'print': {'formats': ['png'], 'dpi': 300, 'suffix': ''},
+    'web': {'formats': ['png', 'webp'], 'dpi': 100, 'suffix': '-web'},
+    'thumb': {'formats': ['png', 'webp'], 'dpi': 24, 'suffix': '-thumb'},
+    'vector': {'formats': ['svg', 'pdf'], 'dpi': 72, 'suffix': ''}
+}
+DEFAULT_RENDER_PROFILES = [('print', 'png')]
+PALETTE_COLORS = 256
+VECTOR_RC_PARAMS = {
+    'svg.fonttype': 'none',  # Text as <text> instead of glyph paths
+    'pdf.fonttype': 42
+}
+
+def parse_render_profiles(value):
+    """Parse a --render-profiles value such as 'print,web:webp,thumb' into (profile, format) pairs"""
+    profiles = []
+    for item in value.split(','):
+        name, _, image_format = item.strip().partition(':')
+        profile = RENDER_PROFILES.get(name)
+        if profile is None or (image_format and image_format not in profile['formats']):
+            choices = ', '.join(f"{key}[:{'|'.join(p['formats'])}]" for key, p in RENDER_PROFILES.items())
+            raise argparse.ArgumentTypeError(f"expected render profiles from {choices}, got '{item.strip()}'")
+        profiles.append((name, image_format or profile['formats'][0]))
+    if not profiles:
+        raise argparse.ArgumentTypeError("expected at least one render profile")
+    return list(dict.fromkeys(profiles))
+
+def save_quantized(fig, filename, dpi, image_format):
+    """Rasterize the figure once and store it as a 256-color palette PNG or a lossless WebP"""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight', facecolor='white')
+    buffer.seek(0)
+    with Image.open(buffer) as image:
+        image = image.convert('RGB')
+        if image_format == 'webp':
+            image.save(filename, format='WEBP', lossless=True, method=4)
+        else:
+            image.quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE).save(filename, format='PNG', optimize=True)
+
+def save_figure(fig, stem, period, profiles=None):
+    """Save one figure in every render profile and return the filenames, first profile first.
+
+    Filenames are '{stem}{profile suffix}-{period}.{format}', so every profile of a report still
+    matches the '*-{start}_to_{end}.*' report file pattern.
+    """
+    filenames = []
+    for name, image_format in profiles or DEFAULT_RENDER_PROFILES:
+        profile = RENDER_PROFILES[name]
+        filename = f"{stem}{profile['suffix']}-{period}.{image_format}"
+        if name == 'vector':
+            with plt.rc_context(VECTOR_RC_PARAMS):
+                fig.savefig(filename, format=image_format, bbox_inches='tight', facecolor='white')
+        elif name == 'print':
+            fig.savefig(filename, dpi=profile['dpi'], bbox_inches='tight', facecolor='white')
+        else:
+            save_quantized(fig, filename, profile['dpi'], image_format)
+        filenames.append(filename)
+    return filenames
@@ -0,0 +1,392 @@
+import glob
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+# Lambda only allows writes below /tmp; matplotlib needs a writable config directory before import
+os.environ.setdefault('MPLCONFIGDIR', '/tmp/matplotlib')
+import boto3
+import matplotlib
+import pandas as pd
+matplotlib.use('Agg')
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from dateutil.relativedelta import relativedelta
+import aws_cost_reporter as reporter
+from ce_stub import StubCostExplorerClient
+from cost_manifest import ReportManifest, describe_artifact, read_json, summarize_totals, write_json_atomically
+from cost_render import parse_render_profiles
+from cost_report_server import ORGANIZATION_ID, CostDataService, ResponseCache, get_open_month, month_range
+from cost_store import ACCOUNTS_DATASET, ORGANIZATION_DATASET, CostDataStore, get_partial_months
+
+# Configuration from the function's environment:
+#   COST_REPORT_BUCKET        bucket for reports and synced state (unset: local only, nothing uploaded)
+#   COST_REPORT_PREFIX        key prefix of reports and state (default: aws-cost-reports/)
+#   COST_REPORT_STATE_DIR     local working directory (default: /tmp/aws-cost-report)
+#   COST_REPORT_STUB_ACCOUNTS use the Cost Explorer stub with this many accounts (local testing)
+#   COST_REPORT_RENDER_PROFILES chart render profiles, e.g. 'web,thumb' (default: print)
+REPORT_BUCKET = os.environ.get('COST_REPORT_BUCKET')
+REPORT_PREFIX = os.environ.get('COST_REPORT_PREFIX', 'aws-cost-reports/')
+STATE_DIR = os.environ.get('COST_REPORT_STATE_DIR', '/tmp/aws-cost-report')
+STUB_ACCOUNTS = int(os.environ.get('COST_REPORT_STUB_ACCOUNTS', '0'))
+RENDER_PROFILES = parse_render_profiles(os.environ.get('COST_REPORT_RENDER_PROFILES', 'print'))
+ACCOUNT_DIRECTORY_MAX_AGE_SECONDS = 24 * 3600
+
+STATE_DATA_DIR = os.path.join(STATE_DIR, 'data')
+ACCOUNT_DIRECTORY_FILE = os.path.join(STATE_DIR, 'accounts.json')
+MANIFEST_PARTS_DIR = os.path.join(STATE_DIR, 'manifest-parts')
+WORK_DIR = os.path.join(STATE_DIR, 'work')
+
+# Created once per container and reused by every warm invocation
+if STUB_ACCOUNTS:
+    CE_CLIENT = StubCostExplorerClient(account_count=STUB_ACCOUNTS)
+else:
+    CE_CLIENT = boto3.client('ce', config=Config(
+        max_pool_connections=10,
+        retries={'max_attempts': 10, 'mode': 'adaptive'}
+    ))
+S3_CLIENT = boto3.client('s3') if REPORT_BUCKET else None
+STORE = CostDataStore(STATE_DATA_DIR)
+SERVICE = CostDataService(CE_CLIENT, STORE, ResponseCache(0))
+# Reports are written below the working directory with the reporter's usual relative paths
+os.makedirs(WORK_DIR, exist_ok=True)
+os.chdir(WORK_DIR)
+
+WARM_STATE = {
+    'account_directory_loaded': 0.0,
+    # (dataset, key, month) whose state file was looked up in S3, or is known to hold the whole month
+    'synced_months': set(),
+    'complete_months': set(),
+    'invocations': 0
+}
+
+def state_key(path):
+    """S3 key of a local state file"""
+    return f"{REPORT_PREFIX}state/{os.path.relpath(path, STATE_DIR)}"
+
+def upload_file(filename, key):
+    if S3_CLIENT is not None:
+        S3_CLIENT.upload_file(filename, REPORT_BUCKET, key)
+
+def download_state(prefix):
+    """Download the state files under a local path prefix that are not in /tmp yet"""
+    if S3_CLIENT is None:
+        return 0
+    downloaded = 0
+    paginator = S3_CLIENT.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=REPORT_BUCKET, Prefix=state_key(prefix)):
+        for item in page.get('Contents', []):
+            filename = os.path.join(STATE_DIR, item['Key'][len(f"{REPORT_PREFIX}state/"):])
+            if not os.path.exists(filename):
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                S3_CLIENT.download_file(REPORT_BUCKET, item['Key'], filename)
+                downloaded += 1
+    return downloaded
+
+def download_state_file(filename):
+    """Download one state file from S3 into /tmp; returns False if it is not in S3"""
+    if S3_CLIENT is None:
+        return False
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        S3_CLIENT.download_file(REPORT_BUCKET, state_key(filename), filename)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        return False
+    return True
+
+def load_account_directory():
+    """Load the account directory from memory, /tmp, S3 or Cost Explorer, in that order"""
+    if time.time() - WARM_STATE['account_directory_loaded'] < ACCOUNT_DIRECTORY_MAX_AGE_SECONDS:
+        return
+    if not os.path.exists(ACCOUNT_DIRECTORY_FILE):
+        download_state_file(ACCOUNT_DIRECTORY_FILE)
+
+    saved = {'loaded_at': 0.0}
+    if os.path.exists(ACCOUNT_DIRECTORY_FILE):
+        with open(ACCOUNT_DIRECTORY_FILE) as f:
+            saved = json.load(f)
+
+    if time.time() - saved['loaded_at'] < ACCOUNT_DIRECTORY_MAX_AGE_SECONDS:
+        SERVICE.account_directory = saved['accounts']
+    else:
+        SERVICE.load_accounts()
+        saved = {'loaded_at': time.time(), 'accounts': SERVICE.account_directory}
+        with open(ACCOUNT_DIRECTORY_FILE, 'w') as f:
+            json.dump(saved, f)
+        upload_file(ACCOUNT_DIRECTORY_FILE, state_key(ACCOUNT_DIRECTORY_FILE))
+    WARM_STATE['account_directory_loaded'] = saved['loaded_at']
+
+def get_state_filename(dataset, key, month):
+    return os.path.join(STORE.partition_path(dataset, month), f"{key}.parquet")
+
+def sync_closed_months(months, account_id=None):
+    """Bring the stored closed months of the organization or one account from S3 into /tmp.
+
+    Only the state files of the requested months are fetched by key, each at most once per
+    container, so the cost does not grow with the number of accounts or stored months.
+    """
+    dataset = ACCOUNTS_DATASET if account_id else ORGANIZATION_DATASET
+    key = account_id or 'organization'
+    open_month = get_open_month()
+    for month in months:
+        if month >= open_month or (dataset, key, month) in WARM_STATE['synced_months']:
+            continue
+        filename = get_state_filename(dataset, key, month)
+        if not os.path.exists(filename):
+            download_state_file(filename)
+        WARM_STATE['synced_months'].add((dataset, key, month))
+
+def is_stored_complete(dataset, key, month):
+    """Whether the month's state file exists and covers the whole month"""
+    if (dataset, key, month) in WARM_STATE['complete_months']:
+        return True
+    filename = get_state_filename(dataset, key, month)
+    if not os.path.exists(filename):
+        return False
+    stored = pd.read_parquet(filename, columns=['Start Date', 'End Date']).assign(Month=month)
+    if get_partial_months(stored):
+        return False
+    WARM_STATE['complete_months'].add((dataset, key, month))
+    return True
+
+def store_closed_months(df, account_id=None):
+    """Keep newly fetched closed months in /tmp and S3 so no container fetches them again.
+
+    A month is only persisted once its frame covers the whole month, i.e. it was fetched with an
+    end date past the month's last day; a stored copy missing days is replaced.
+    """
+    if df.empty:
+        return
+    dataset = ACCOUNTS_DATASET if account_id else ORGANIZATION_DATASET
+    key = account_id or 'organization'
+    months = df['Start Date'].str.slice(0, 7)
+    partial_months = set(get_partial_months(df.assign(Month=months)))
+    # Every account has its own file per month partition, so concurrent shards never write the same key
+    new_months = [
+        month for month in months.unique()
+        if month < get_open_month() and month not in partial_months and not is_stored_complete(dataset, key, month)
+    ]
+    for filename in STORE.write_frame(dataset, df[months.isin(new_months)], key):
+        upload_file(filename, state_key(filename))
+    WARM_STATE['complete_months'].update((dataset, key, month) for month in new_months)
+
+def get_report_months(event):
+    """Months of the event's date range; defaults to the last six closed months"""
+    today = date.today()
+    start_date = event.get('start_date') or (today.replace(day=1) - relativedelta(months=6)).isoformat()
+    end_date = event.get('end_date') or today.replace(day=1).isoformat()
+    start_date = reporter.validate_and_format_date(start_date, 'start_date')
+    end_date = reporter.validate_and_format_date(end_date, 'end_date')
+    last_day = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=1)
+    months = [month for month in month_range(start_date[:7], last_day.strftime('%Y-%m')) if month <= get_open_month()]
+    if not months:
+        raise ValueError("start_date must be before end_date and not in the future")
+    return start_date, end_date, months
+
+def publish_reports(filenames):
+    """Upload report files below the report prefix and remove them from /tmp; returns their locations"""
+    if S3_CLIENT is None:
+        return [os.path.abspath(filename) for filename in filenames]
+    keys = []
+    for filename in filenames:
+        key = REPORT_PREFIX + os.path.relpath(filename, 'aws_cost_reports')
+        upload_file(filename, key)
+        os.remove(filename)
+        keys.append(f"s3://{REPORT_BUCKET}/{key}")
+    return keys
+
+def describe_report(filenames, name, df):
+    """Manifest entry of one report, described before the files are uploaded and removed"""
+    return {
+        'name': name,
+        'totals': summarize_totals(df),
+        'artifacts': [describe_artifact(filename, reporter.REPORTS_ROOT) for filename in filenames]
+    }
+
+def generate_organization_report(start_date, end_date, months, entries):
+    sync_closed_months(months)
+    df = SERVICE.frame(months)
+    store_closed_months(df)
+    if df.empty:
+        return []
+
+    display_end_date = reporter.get_display_end_date(end_date)
+    summary = reporter.summarize_organization(df)
+    filenames = [
+        reporter.save_organization_summary(df, start_date, end_date, summary),
+        *reporter.create_cost_visualization(
+            df,
+            f"AWS Organization Cost by Service ({start_date} to {display_end_date})",
+            ORGANIZATION_ID,
+            start_date,
+            end_date,
+            is_organization=True,
+            chart_data=summary['chart_data'],
+            profiles=RENDER_PROFILES
+        )
+    ]
+    entries[ORGANIZATION_ID] = describe_report(filenames, 'AWS Organization', df)
+    return filenames
+
+def generate_account_report(account_id, start_date, end_date, months, entries):
+    sync_closed_months(months, account_id)
+    df = SERVICE.frame(months, account_id)
+    store_closed_months(df, account_id)
+    if df.empty:
+        return []
+
+    account_name = SERVICE.account_name(account_id)
+    display_end_date = reporter.get_display_end_date(end_date)
+    filenames = [
+        reporter.save_to_excel(df, account_id, start_date, end_date),
+        *reporter.create_cost_visualization(
+            df,
+            f"AWS Cost by Service - {account_name} ({start_date} to {display_end_date})",
+            account_id,
+            start_date,
+            end_date,
+            profiles=RENDER_PROFILES
+        )
+    ]
+    entries[account_id] = describe_report(filenames, account_name, df)
+    return filenames
+
+def save_manifest_part(part_name, start_date, end_date, entries):
+    """Keep one invocation's manifest entries as a state file; Map outputs are too small to carry them"""
+    filename = os.path.join(MANIFEST_PARTS_DIR, f"{start_date}_to_{end_date}", f"{part_name}.json")
+    write_json_atomically(entries, filename)
+    upload_file(filename, state_key(filename))
+    return state_key(filename)
+
+def download_report_file(filename):
+    """Replace a local report file with the published copy, if there is one"""
+    if S3_CLIENT is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        S3_CLIENT.download_file(REPORT_BUCKET, REPORT_PREFIX + os.path.relpath(filename, reporter.REPORTS_ROOT), filename)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+
+def publish_manifest(start_date, end_date):
+    """Merge every manifest part of the period into the published period manifest, then update the index"""
+    parts_dir = os.path.join(MANIFEST_PARTS_DIR, f"{start_date}_to_{end_date}")
+    download_state(parts_dir)
+
+    manifest = ReportManifest(reporter.REPORTS_ROOT, start_date, end_date)
+    for filename in sorted(glob.glob(os.path.join(parts_dir, '*.json'))):
+        for report_id, entry in read_json(filename, {}).items():
+            manifest.add_report(report_id, entry['name'], entry['totals'], entry['artifacts'])
+
+    download_report_file(manifest.manifest_path())
+    download_report_file(manifest.index_path())
+    # write() returns the period manifest before the index, and they are published in that order
+    return publish_reports(manifest.write())
+
+def get_shard_accounts(shard_index, shard_count):
+    """Accounts of one shard; accounts are dealt round-robin in ID order"""
+    account_ids = sorted(account['id'] for account in SERVICE.accounts())
+    return account_ids[shard_index::shard_count]
+
+def plan_shards(event, start_date, end_date):
+    """Events for a Step Functions Map state: the organization report plus one event per shard"""
+    shard_count = int(event.get('shard_count', 10))
+    base = {'start_date': start_date, 'end_date': end_date}
+    return [dict(base, scope='organization')] + [
+        dict(base, scope='shard', shard_index=index, shard_count=shard_count) for index in range(shard_count)
+    ]
+
+def lambda_handler(event, context):
+    """
+    Lambda function that generates AWS cost reports for one scope per invocation.
+
+    Clients, the account directory and the closed-month cost data stay warm across invocations of
+    the same container (in memory and in /tmp) and are synced to S3 so new containers start warm.
+
+    Args:
+        event (dict): Lambda event data:
+            - scope: 'organization', 'account', 'shard', 'plan' or 'manifest' (default: 'account'
+              when account_id is given, otherwise 'organization'). 'manifest' runs after all
+              other scopes of a period and publishes the report manifest and index.
+            - start_date / end_date: YYYY-MM-DD range (default: the last six closed months)
+            - account_id: account of the 'account' scope
+            - shard_index / shard_count: shard of the 'shard' scope
+            - shard_count: number of shard events returned by the 'plan' scope (default: 10)
+        context (object): Lambda context object
+
+    Returns:
+        dict: statusCode and a body with the uploaded reports, or the planned events for 'plan'.
+        The body is a dict rather than a JSON string so state machines can use it directly.
+    """
+    started = time.perf_counter()
+    WARM_STATE['invocations'] += 1
+    scope = event.get('scope') or ('account' if event.get('account_id') else 'organization')
+    try:
+        start_date, end_date, months = get_report_months(event)
+        if scope == 'account' and not event.get('account_id'):
+            raise ValueError("account_id is required for the account scope")
+        if scope == 'shard' and ('shard_index' not in event or 'shard_count' not in event):
+            raise ValueError("shard_index and shard_count are required for the shard scope")
+        if scope not in ('organization', 'account', 'shard', 'plan', 'manifest'):
+            raise ValueError(f"Unknown scope '{scope}'")
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': {'message': str(e)}
+        }
+
+    # Frames of a month that has ended since they were fetched miss its last days, so they are
+    # dropped (and fetched again for the whole month) before anything is persisted
+    SERVICE.roll_open_month()
+    # The open month changes during the day; closed months stay warm
+    open_month = get_open_month()
+    with SERVICE.lock:
+        SERVICE.organization_months.pop(open_month, None)
+        for account_months in SERVICE.account_months.values():
+            account_months.pop(open_month, None)
+
+    load_account_directory()
+    body = {'scope': scope, 'start_date': start_date, 'end_date': end_date}
+    if scope == 'plan':
+        body['events'] = plan_shards(event, start_date, end_date)
+        body['manifest_event'] = {'start_date': start_date, 'end_date': end_date, 'scope': 'manifest'}
+    elif scope == 'manifest':
+        body['reports'] = publish_manifest(start_date, end_date)
+    else:
+        entries = {}
+        if scope == 'organization':
+            filenames = generate_organization_report(start_date, end_date, months, entries)
+            account_ids = []
+            part_name = 'organization'
+        else:
+            if scope == 'account':
+                account_ids = [event['account_id']]
+                part_name = f"account-{event['account_id']}"
+            else:
+                account_ids = get_shard_accounts(int(event['shard_index']), int(event['shard_count']))
+                part_name = f"shard-{event['shard_index']}-of-{event['shard_count']}"
+            filenames = []
+            for account_id in account_ids:
+                filenames.extend(generate_account_report(account_id, start_date, end_date, months, entries))
+                reporter.release_memory()
+        body['accounts'] = len(account_ids)
+        body['manifest_part'] = save_manifest_part(part_name, start_date, end_date, entries)
+        body['reports'] = publish_reports(filenames)
+
+    body['warm_invocation'] = WARM_STATE['invocations'] > 1
+    body['duration_ms'] = round((time.perf_counter() - started) * 1000)
+    return {
+        'statusCode': 200,
+        'body': body
+    }
+
+if __name__ == "__main__":
+    # Local test: python cost_report_lambda.py '{"scope": "shard", "shard_index": 0, "shard_count": 4}'
+    # (set COST_REPORT_STUB_ACCOUNTS and COST_REPORT_STATE_DIR to run without AWS)
+    test_event = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+    for _ in range(2):  # Second call shows the warm path
+        print(json.dumps(lambda_handler(test_event, None), indent=2))
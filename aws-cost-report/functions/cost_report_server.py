@@ -0,0 +1,432 @@
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import boto3
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+from botocore.config import Config
+from dateutil.relativedelta import relativedelta
+import aws_cost_reporter as reporter
+from ce_stub import StubCostExplorerClient
+from cost_dashboard import build_dashboard_shard
+from cost_store import ACCOUNTS_DATASET, ORGANIZATION_DATASET, CostDataStore, DEFAULT_STORE_ROOT, get_partial_months
+
+ORGANIZATION_ID = 'organization_summary'
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'png': 'image/png'
+}
+# format=png always returns the full-resolution chart, whatever profiles report runs use
+PNG_RENDER_PROFILES = [('print', 'png')]
+
+def parse_server_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='aws_cost_reporter.py serve',
+        description='Serve AWS cost reports over HTTP from warm in-memory data'
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--refresh-minutes', type=float, default=60,
+                        help='How often the open month is re-fetched in the background (default: 60)')
+    parser.add_argument('--cache-entries', type=int, default=512,
+                        help='Number of rendered responses kept in memory (default: 512)')
+    parser.add_argument('--data-dir', default=DEFAULT_STORE_ROOT,
+                        help=f'Stored cost data used for closed months (default: {DEFAULT_STORE_ROOT})')
+    parser.add_argument('--stub-accounts', type=int, default=None,
+                        help='Use the local Cost Explorer stub with this many synthetic accounts instead of AWS (testing)')
+    return parser.parse_args(argv)
+
+def month_range(start_month, end_month):
+    """List the YYYY-MM months from start_month to end_month inclusive"""
+    month_dt = datetime.strptime(start_month, '%Y-%m')
+    end_dt = datetime.strptime(end_month, '%Y-%m')
+    months = []
+    while month_dt <= end_dt:
+        months.append(month_dt.strftime('%Y-%m'))
+        month_dt += relativedelta(months=1)
+    return months
+
+def group_contiguous_months(months):
+    """Split sorted YYYY-MM months into runs of consecutive months"""
+    runs = []
+    for month in months:
+        if runs and (datetime.strptime(runs[-1][-1], '%Y-%m') + relativedelta(months=1)).strftime('%Y-%m') == month:
+            runs[-1].append(month)
+        else:
+            runs.append([month])
+    return runs
+
+def get_open_month():
+    return date.today().strftime('%Y-%m')
+
+def get_fetch_range(months):
+    """Cost Explorer start and (exclusive) end dates covering the months, through today for the open month"""
+    start_date = f"{months[0]}-01"
+    end_dt = datetime.strptime(months[-1], '%Y-%m').date() + relativedelta(months=1)
+    # The end date is exclusive, so tomorrow includes today's costs so far
+    end_dt = min(end_dt, date.today() + timedelta(days=1))
+    return start_date, end_dt.strftime('%Y-%m-%d')
+
+class ResponseCache:
+    """Thread-safe LRU of rendered responses, emptied whenever the underlying data changes"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class CostDataService:
+    """Keeps the account directory and per-month cost frames warm in memory.
+
+    Closed months are loaded once (from the data store when available, otherwise from Cost
+    Explorer) and never re-fetched. The open month is re-fetched by the background refresh, and
+    once it ends its frames are dropped and fetched again for the whole month.
+    """
+
+    def __init__(self, ce_client, store, response_cache):
+        self.ce_client = ce_client
+        self.store = store
+        self.response_cache = response_cache
+        self.lock = threading.RLock()
+        self.account_directory = {}
+        self.organization_months = {}
+        self.account_months = {}
+        # The month that was open when the cached frames were fetched
+        self.open_month = get_open_month()
+
+    def load_accounts(self):
+        today = date.today()
+        start_date = (today.replace(day=1) - relativedelta(months=12)).strftime('%Y-%m-%d')
+        accounts = reporter.get_all_linked_accounts(self.ce_client, start_date, today.strftime('%Y-%m-%d'))
+        with self.lock:
+            self.account_directory = {account['id']: account['name'] for account in accounts}
+        print(f"Account directory loaded with {len(accounts)} accounts")
+
+    def accounts(self):
+        with self.lock:
+            return [{'id': account_id, 'name': name} for account_id, name in self.account_directory.items()]
+
+    def is_known_account(self, account_id):
+        with self.lock:
+            return account_id == ORGANIZATION_ID or account_id in self.account_directory
+
+    def account_name(self, account_id):
+        if account_id == ORGANIZATION_ID:
+            return 'AWS Organization'
+        with self.lock:
+            return self.account_directory.get(account_id, f"Account {account_id}")
+
+    def read_stored_months(self, dataset, months, account_id=None):
+        """Read whichever of the closed months are stored for their whole month"""
+        open_month = get_open_month()
+        stored = set(self.store.available_months(dataset)) if self.store else set()
+        wanted = [month for month in months if month in stored and month != open_month]
+        if not wanted:
+            return {}
+        filters = [('Account ID', '==', account_id)] if account_id else None
+        df = self.store.read(dataset, months=wanted, filters=filters)
+        # Months a run stored for only part of the month are fetched again instead
+        df = df[~df['Month'].isin(get_partial_months(df))]
+        if account_id:
+            df = df.drop(columns=['Month'])
+            month_keys = pd.to_datetime(df['Start Date']).dt.strftime('%Y-%m')
+        else:
+            month_keys = df['Month']
+        return {month: month_df.reset_index(drop=True) for month, month_df in df.groupby(month_keys.values)}
+
+    def fetch_months(self, months, account_id=None):
+        """Fetch a contiguous run of months from Cost Explorer, split by month"""
+        start_date, end_date = get_fetch_range(months)
+        if start_date >= end_date:
+            return {}
+        if account_id:
+            response = reporter.get_cost_and_usage(self.ce_client, start_date, end_date, account_id)
+            df = reporter.process_cost_data(response, account_id, self.account_name(account_id))
+            month_keys = pd.to_datetime(df['Start Date']).dt.strftime('%Y-%m')
+        else:
+            response = reporter.get_organization_cost_by_service(self.ce_client, start_date, end_date)
+            df = reporter.process_organization_summary(response)
+            month_keys = df['Month']
+        return {month: month_df.reset_index(drop=True) for month, month_df in df.groupby(month_keys.values)}
+
+    def roll_open_month(self):
+        """Drop the cached frames of the previously open month once it has ended.
+
+        Those frames were fetched before the month was over and miss its last days.
+
+        Returns:
+            str: The month that ended, or None if the open month has not changed
+        """
+        open_month = get_open_month()
+        with self.lock:
+            ended_month = self.open_month if self.open_month != open_month else None
+            self.open_month = open_month
+            if ended_month:
+                self.organization_months.pop(ended_month, None)
+                for cached in self.account_months.values():
+                    cached.pop(ended_month, None)
+        if ended_month:
+            self.response_cache.clear()
+        return ended_month
+
+    def ensure_months(self, months, account_id=None):
+        """Make sure every month is in memory, loading the missing ones with as few fetches as possible"""
+        if account_id and not self.is_known_account(account_id):
+            # Only directory accounts are cached, so callers cannot grow memory or the Cost Explorer bill
+            raise LookupError(f"Unknown account {account_id}")
+        self.roll_open_month()
+        with self.lock:
+            cached = self.account_months.setdefault(account_id, {}) if account_id else self.organization_months
+            missing = [month for month in months if month not in cached]
+        if not missing:
+            return
+
+        dataset = ACCOUNTS_DATASET if account_id else ORGANIZATION_DATASET
+        loaded = self.read_stored_months(dataset, missing, account_id)
+        still_missing = [month for month in missing if month not in loaded]
+        # One request window per run of missing months, so stored months in between are not fetched again;
+        # empty months are remembered as empty
+        for run in group_contiguous_months(sorted(still_missing)):
+            fetched = self.fetch_months(run, account_id)
+            for month in run:
+                loaded[month] = fetched.get(month, pd.DataFrame())
+
+        with self.lock:
+            cached.update(loaded)
+
+    def frame(self, months, account_id=None):
+        """Cost frame for the organization (account_id None) or one account over the months"""
+        while True:
+            self.ensure_months(months, account_id)
+            with self.lock:
+                cached = self.account_months[account_id] if account_id else self.organization_months
+                # Load again if a concurrent roll_open_month dropped one of the months
+                if all(month in cached for month in months):
+                    frames = [cached[month] for month in months if not cached[month].empty]
+                    break
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def refresh_open_month(self):
+        """Re-fetch the open month (and the month that just ended, if it changed) for the organization
+        and every warm account, then drop cached responses"""
+        ended_month = self.roll_open_month()
+        open_month = self.open_month
+        months = month_range(ended_month or open_month, open_month)
+        with self.lock:
+            account_ids = [None] + list(self.account_months)
+        for account_id in account_ids:
+            fetched = self.fetch_months(months, account_id)
+            with self.lock:
+                cached = self.account_months[account_id] if account_id else self.organization_months
+                for month in months:
+                    cached[month] = fetched.get(month, pd.DataFrame())
+        self.load_accounts()
+        self.response_cache.clear()
+        print(f"Refreshed {', '.join(months)} for the organization and {len(account_ids) - 1} accounts")
+
+def start_background_refresh(service, refresh_minutes):
+    """Periodically refresh the open month in a daemon thread"""
+    def refresh_loop():
+        while True:
+            time.sleep(refresh_minutes * 60)
+            try:
+                service.refresh_open_month()
+            except Exception as e:
+                print(f"Background refresh failed: {e}")
+
+    thread = threading.Thread(target=refresh_loop, name='open-month-refresh', daemon=True)
+    thread.start()
+    return thread
+
+class CostReportRenderer:
+    """Turns cost frames into JSON, CSV, XLSX and PNG responses"""
+
+    def __init__(self, service):
+        self.service = service
+        # pyplot keeps global state, so charts are rendered one at a time
+        self.render_lock = threading.Lock()
+
+    def render(self, account_id, months, output_format):
+        is_organization = account_id == ORGANIZATION_ID
+        df = self.service.frame(months, None if is_organization else account_id)
+        if df.empty:
+            raise LookupError(f"No cost data for {account_id} in {months[0]} to {months[-1]}")
+
+        account_name = self.service.account_name(account_id)
+        start_date = f"{months[0]}-01"
+        end_date = (datetime.strptime(months[-1], '%Y-%m') + relativedelta(months=1)).strftime('%Y-%m-%d')
+        display_end_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        if is_organization:
+            title = f"AWS Organization Cost by Service ({start_date} to {display_end_date})"
+        else:
+            title = f"AWS Cost by Service - {account_name} ({start_date} to {display_end_date})"
+
+        if output_format == 'csv':
+            return df.to_csv(index=False).encode('utf-8')
+
+        if output_format == 'json':
+            summary = reporter.summarize_organization(df) if is_organization else None
+            chart_data = reporter.prepare_cost_chart_data(df, is_organization, summary)
+            body = build_dashboard_shard(
+                chart_data, account_id, account_name, title,
+                reporter.calculate_months_in_range(start_date, end_date), reporter.CHART_COLORS
+            )
+            cost_column = chart_data['cost_column']
+            by_service = df.groupby('Service Name')[cost_column].sum().sort_values(ascending=False)
+            body['by_service'] = {service: round(float(cost), 2) for service, cost in by_service.items()}
+            return json.dumps(body, separators=(',', ':')).encode('utf-8')
+
+        # Files are written to a scratch directory, so the server never fills or overwrites the report folders
+        with tempfile.TemporaryDirectory(prefix='cost-report-') as directory:
+            if output_format == 'xlsx':
+                if is_organization:
+                    filename = reporter.save_organization_summary(df, start_date, end_date, directory=directory)
+                else:
+                    filename = reporter.save_to_excel(df, account_id, start_date, end_date, directory=directory)
+            else:
+                with self.render_lock:
+                    filename = reporter.create_cost_visualization(
+                        df, title, account_id, start_date, end_date, is_organization=is_organization,
+                        profiles=PNG_RENDER_PROFILES, directory=directory
+                    )[0]
+            with open(filename, 'rb') as f:
+                return f.read()
+
+class CostReportRequestHandler(BaseHTTPRequestHandler):
+    """Routes:
+        GET /health
+        GET /accounts
+        GET /costs?account=<id|organization_summary>&start=YYYY-MM&end=YYYY-MM&format=json|csv|xlsx|png
+    """
+    service = None
+    renderer = None
+    response_cache = None
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == '/health':
+                self.send_body(200, 'json', b'{"status":"ok"}')
+            elif url.path == '/accounts':
+                self.send_body(200, 'json', json.dumps(self.service.accounts()).encode('utf-8'))
+            elif url.path == '/costs':
+                self.handle_costs(query)
+            else:
+                self.send_error_json(404, f"Unknown path {url.path}")
+        except (ValueError, LookupError) as e:
+            self.send_error_json(404 if isinstance(e, LookupError) else 400, str(e))
+        except Exception as e:
+            self.send_error_json(500, f"Error: {str(e)}")
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"{self.command} {self.path} {elapsed_ms:.1f} ms")
+
+    def handle_costs(self, query):
+        output_format = query.get('format', 'json')
+        if output_format not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported format '{output_format}', use one of {', '.join(CONTENT_TYPES)}")
+
+        open_month = get_open_month()
+        default_start = (datetime.strptime(open_month, '%Y-%m') - relativedelta(months=5)).strftime('%Y-%m')
+        # Months after the open month have no data yet
+        months = [month for month in month_range(query.get('start', default_start), query.get('end', open_month))
+                  if month <= open_month]
+        if not months:
+            raise ValueError("start must not be after end or the open month")
+        account_id = query.get('account', ORGANIZATION_ID)
+        if not self.service.is_known_account(account_id):
+            raise LookupError(f"Unknown account {account_id}")
+
+        cache_key = (account_id, months[0], months[-1], output_format)
+        body = self.response_cache.get(cache_key)
+        if body is None:
+            body = self.renderer.render(account_id, months, output_format)
+            self.response_cache.put(cache_key, body)
+        self.send_body(200, output_format, body)
+
+    def send_body(self, status, output_format, body):
+        self.send_response(status)
+        self.send_header('Content-Type', CONTENT_TYPES[output_format])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_body(status, 'json', json.dumps({'message': message}).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass  # Requests are logged with their timing in do_GET
+
+def create_server(ce_client, host='127.0.0.1', port=8080, store=None, cache_entries=512):
+    """Build the HTTP server with warm data; call serve_forever() on the result"""
+    response_cache = ResponseCache(cache_entries)
+    service = CostDataService(ce_client, store, response_cache)
+    service.load_accounts()
+
+    handler = type('BoundCostReportRequestHandler', (CostReportRequestHandler,), {
+        'service': service,
+        'renderer': CostReportRenderer(service),
+        'response_cache': response_cache
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.service = service
+    return server
+
+def run_server(argv):
+    """Entry point for the serve subcommand"""
+    args = parse_server_arguments(argv)
+
+    if args.stub_accounts:
+        print(f"Using Cost Explorer stub with {args.stub_accounts} synthetic accounts")
+        ce_client = StubCostExplorerClient(account_count=args.stub_accounts)
+    else:
+        ce_client = boto3.client('ce', config=Config(
+            max_pool_connections=20,
+            retries={'max_attempts': 10, 'mode': 'adaptive'}
+        ))
+
+    server = create_server(ce_client, args.host, args.port, CostDataStore(args.data_dir), args.cache_entries)
+    start_background_refresh(server.service, args.refresh_minutes)
+
+    print(f"Serving AWS cost reports on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    run_server(sys.argv[1:])
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Compact cost frame schema (--compact-frames):
+#   Account ID, Account Name, Service Name, Month   category
+#   Start Date, End Date                            datetime64
+#   every '... ($)' column                          int64 cents
+# Sums of cents are exact, so totals carry no float noise such as -0.0000001 refunds.
+# Aggregates are converted back to dollars with to_dollars, and whole frames with
+# export_cost_frame right before they are written to Excel or the Parquet store.
+CATEGORY_COLUMNS = ['Account ID', 'Account Name', 'Service Name', 'Month']
+DATE_COLUMNS = ['Start Date', 'End Date']
+MONEY_SUFFIX = '($)'
+CENTS_PER_DOLLAR = 100
+
+def get_money_columns(df):
+    return [column for column in df.columns if column.endswith(MONEY_SUFFIX)]
+
+def dollars_to_cents(values):
+    return np.rint(np.asarray(values, dtype=float) * CENTS_PER_DOLLAR).astype(np.int64)
+
+def compact_cost_frame(df):
+    """Convert a cost frame to the compact schema; refunds are recomputed from the rounded cost"""
+    df = df.copy()
+    for column in get_money_columns(df):
+        df[column] = dollars_to_cents(df[column])
+
+    # Refund noise below half a cent disappears once the cost it is derived from is rounded
+    for prefix in ('', 'Total '):
+        cost_column, refund_column = f"{prefix}Amortized Cost ($)", f"{prefix}Refund ($)"
+        if cost_column in df.columns and refund_column in df.columns:
+            df[refund_column] = np.where(df[cost_column] < 0, -df[cost_column], 0).astype(np.int64)
+
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], format='%Y-%m-%d')
+    return df
+
+def is_compact(df):
+    money_columns = get_money_columns(df)
+    return bool(money_columns) and pd.api.types.is_integer_dtype(df[money_columns[0]])
+
+def to_dollars(value):
+    """Convert cents (a scalar, Series or the money columns of a DataFrame) to dollars; dollars pass through"""
+    if isinstance(value, pd.DataFrame):
+        converted = {
+            column: value[column] / CENTS_PER_DOLLAR
+            for column in get_money_columns(value) if pd.api.types.is_integer_dtype(value[column])
+        }
+        return value.assign(**converted) if converted else value
+    if isinstance(value, pd.Series):
+        return value / CENTS_PER_DOLLAR if pd.api.types.is_integer_dtype(value) else value
+    if isinstance(value, (np.integer, int)):
+        return value / CENTS_PER_DOLLAR
+    return value
+
+def export_cost_frame(df):
+    """Convert a compact frame back to the original schema (dollars, date strings, plain strings)"""
+    if not is_compact(df):
+        return df
+    df = to_dollars(df)
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].dt.strftime('%Y-%m-%d')
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(object)
+    return df
+
+def sum_costs(df, by, columns):
+    """Group and sum cost columns in dollars; exact in cents for compact frames.
+
+    Only observed category combinations are kept and categorical keys come back as plain
+    values, so the result looks the same for compact and original frames.
+    """
+    sums = df.groupby(by, sort=True, observed=True)[columns].sum()
+    if isinstance(sums.index, pd.MultiIndex):
+        sums.index = pd.MultiIndex.from_arrays(
+            [sums.index.get_level_values(i).astype(object) for i in range(sums.index.nlevels)],
+            names=sums.index.names
+        )
+    elif isinstance(sums.index, pd.CategoricalIndex):
+        sums.index = sums.index.astype(object)
+    return to_dollars(sums)
@@ -0,0 +1,149 @@
+import glob
+import os
+import pandas as pd
+
+# Fetched cost frames are kept as Hive-partitioned Parquet so later runs, comparisons and queries
+# can reuse them without calling Cost Explorer again:
+#   aws_cost_reports/data/organization/month=2025-04/part.parquet
+#   aws_cost_reports/data/accounts/month=2025-04/part.parquet
+DEFAULT_STORE_ROOT = "aws_cost_reports/data"
+ORGANIZATION_DATASET = "organization"
+ACCOUNTS_DATASET = "accounts"
+COMPACTED_FILENAME = "part.parquet"
+
+def get_coverage_days(df, key_column=None):
+    """Get the days one month partition's rows cover, from the earliest Start Date to the latest End Date.
+
+    Cost Explorer periods are clipped to the requested range, so a run starting or ending
+    mid-month only covers part of that month. With key_column, the days are given per key.
+    """
+    start = pd.to_datetime(df['Start Date'])
+    end = pd.to_datetime(df['End Date'])
+    if key_column is None:
+        return (end.max() - start.min()).days
+    keys = df[key_column].to_numpy()
+    return (end.groupby(keys).max() - start.groupby(keys).min()).dt.days
+
+def get_partial_months(df):
+    """List the months of a frame with a 'Month' column where any row covers less than the whole month"""
+    if df.empty:
+        return []
+    month_start = pd.to_datetime(df['Month'], format='%Y-%m')
+    complete = (
+        (pd.to_datetime(df['Start Date']) == month_start)
+        & (pd.to_datetime(df['End Date']) == month_start + pd.offsets.MonthBegin(1))
+    )
+    return sorted(set(df.loc[~complete.to_numpy(), 'Month']))
+
+class CostDataStore:
+    """Month-partitioned Parquet store for the frames built by process_cost_data and process_organization_summary"""
+
+    def __init__(self, root=DEFAULT_STORE_ROOT):
+        self.root = root
+
+    def dataset_path(self, dataset):
+        return os.path.join(self.root, dataset)
+
+    def partition_path(self, dataset, month):
+        return os.path.join(self.dataset_path(dataset), f"month={month}")
+
+    def write_frame(self, dataset, df, key):
+        """Write one frame split into month partitions, replacing any earlier copy written under the same key.
+
+        A month is never replaced by a copy covering fewer of its days, so a run over a range
+        starting mid-month keeps the whole month stored by an earlier run.
+        """
+        if df.empty:
+            return []
+
+        months = df['Month'] if 'Month' in df.columns else pd.to_datetime(df['Start Date']).dt.strftime('%Y-%m')
+        filenames = []
+        for month, month_df in df.drop(columns=['Month'], errors='ignore').groupby(months.values):
+            directory = self.partition_path(dataset, month)
+            os.makedirs(directory, exist_ok=True)
+            filename = os.path.join(directory, f"{key}.parquet")
+            if os.path.exists(filename):
+                stored_days = get_coverage_days(pd.read_parquet(filename, columns=['Start Date', 'End Date']))
+                if stored_days > get_coverage_days(month_df):
+                    print(f"Kept the stored {dataset} data for {month}, which covers more of the month than this run")
+                    continue
+            write_parquet_atomically(month_df.reset_index(drop=True), filename)
+            filenames.append(filename)
+
+        return filenames
+
+    def compact(self, dataset, key_column):
+        """Merge the per-key files of every month partition into a single part.parquet.
+
+        Rows from newly written files replace rows with the same key_column value in the
+        existing part.parquet, so re-fetching a period never duplicates data. Keys whose stored
+        rows cover more days of the month than the new ones keep their stored rows.
+        """
+        for directory in sorted(glob.glob(os.path.join(self.dataset_path(dataset), "month=*"))):
+            compacted = os.path.join(directory, COMPACTED_FILENAME)
+            new_files = sorted(
+                filename for filename in glob.glob(os.path.join(directory, "*.parquet"))
+                if os.path.basename(filename) != COMPACTED_FILENAME
+            )
+            if not new_files:
+                continue
+
+            new_df = pd.concat([pd.read_parquet(filename) for filename in new_files], ignore_index=True)
+            if os.path.exists(compacted):
+                existing_df = pd.read_parquet(compacted)
+                new_days = get_coverage_days(new_df, key_column)
+                stored_days = get_coverage_days(existing_df, key_column).reindex(new_days.index)
+                narrower = new_days.index[(stored_days > new_days).to_numpy()]
+                if len(narrower):
+                    month = os.path.basename(directory).split('=', 1)[1]
+                    print(f"Kept the stored {dataset} data of {len(narrower)} {key_column} values for {month}, "
+                          f"which covers more of the month than this run")
+                    new_df = new_df[~new_df[key_column].isin(narrower)]
+                existing_df = existing_df[~existing_df[key_column].isin(new_df[key_column].unique())]
+                new_df = pd.concat([existing_df, new_df], ignore_index=True)
+
+            write_parquet_atomically(new_df, compacted)
+            for filename in new_files:
+                os.remove(filename)
+
+    def available_months(self, dataset):
+        """List the months stored for a dataset"""
+        directories = glob.glob(os.path.join(self.dataset_path(dataset), "month=*"))
+        return sorted(os.path.basename(directory).split('=', 1)[1] for directory in directories)
+
+    def partial_months(self, dataset, months=None, filters=None):
+        """List the stored months (of the given ones) that do not cover their whole month"""
+        stored = set(self.available_months(dataset))
+        months = [month for month in (months or sorted(stored)) if month in stored]
+        if not months:
+            return []
+        return get_partial_months(self.read(dataset, months=months, columns=['Start Date', 'End Date'], filters=filters))
+
+    def read(self, dataset, months=None, columns=None, filters=None):
+        """Read stored months of a dataset into one frame with a 'Month' column"""
+        stored_months = self.available_months(dataset)
+        if months is not None:
+            missing = sorted(set(months) - set(stored_months))
+            if missing:
+                raise ValueError(
+                    f"No stored {dataset} cost data for {', '.join(missing)} under {self.dataset_path(dataset)}. "
+                    f"Run the reporter for those periods first."
+                )
+            stored_months = [month for month in stored_months if month in set(months)]
+
+        frames = []
+        for month in stored_months:
+            # Only the requested partitions (and columns) are opened
+            for filename in sorted(glob.glob(os.path.join(self.partition_path(dataset, month), "*.parquet"))):
+                month_df = pd.read_parquet(filename, columns=columns, filters=filters)
+                frames.append(month_df.assign(Month=month))
+
+        if not frames:
+            return pd.DataFrame(columns=(columns or []) + ['Month'])
+        return pd.concat(frames, ignore_index=True)
+
+def write_parquet_atomically(df, filename):
+    """Write a Parquet file via a temporary file and rename so readers never see a partial file"""
+    temp_filename = f"{filename}.tmp"
+    df.to_parquet(temp_filename, index=False)
+    os.replace(temp_filename, filename)
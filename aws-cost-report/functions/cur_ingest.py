@@ -0,0 +1,242 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+# CUR 2.0 columns needed to rebuild the Cost Explorer style frames; everything else is never read.
+# Savings Plan and reservation columns only exist when the payer has those commitments.
+CUR_REQUIRED_COLUMNS = [
+    'line_item_usage_account_id',
+    'line_item_usage_start_date',
+    'line_item_line_item_type',
+    'line_item_product_code',
+    'line_item_unblended_cost',
+    'line_item_usage_amount'
+]
+CUR_OPTIONAL_COLUMNS = [
+    'line_item_usage_account_name',
+    'product',                  # CUR 2.0 map column holding product_name
+    'product_product_name',     # Legacy CUR flattened product name
+    'savings_plan_savings_plan_effective_cost',
+    'savings_plan_total_commitment_to_date',
+    'savings_plan_used_commitment',
+    'reservation_effective_cost',
+    'reservation_unused_amortized_upfront_fee_for_billing_period',
+    'reservation_unused_recurring_fee',
+    'reservation_reservation_a_r_n'
+]
+GROUP_KEYS = ['account_id', 'month', 'service']
+DEFAULT_BATCH_SIZE = 262144
+# Re-aggregate the partial results once this many batches have been collected
+PARTIALS_PER_MERGE = 32
+
+def open_cur_dataset(path):
+    """Open local (memory-mapped) or s3:// CUR Parquet files as one dataset"""
+    if path.startswith('s3://'):
+        filesystem, dataset_path = pafs.FileSystem.from_uri(path)
+    else:
+        filesystem, dataset_path = pafs.LocalFileSystem(use_mmap=True), path
+    return ds.dataset(dataset_path, format='parquet', filesystem=filesystem, partitioning='hive')
+
+def get_service_names(table):
+    """Get the service name per line item, preferring product names over product codes"""
+    service = table['line_item_product_code']
+    if 'product_product_name' in table.column_names:
+        service = pc.coalesce(table['product_product_name'], service)
+    if 'product' in table.column_names and pa.types.is_map(table.schema.field('product').type):
+        product_name = pc.map_lookup(table['product'], query_key='product_name', occurrence='first')
+        service = pc.coalesce(product_name, service)
+    return pc.fill_null(service, 'Unknown')
+
+def get_optional_column(batch_df, column):
+    """Get a numeric column as float, or zeros if this CUR does not have it"""
+    if column in batch_df.columns:
+        return batch_df[column].fillna(0).to_numpy(dtype=float)
+    return np.zeros(len(batch_df))
+
+def calculate_amortized_cost(batch_df):
+    """Vectorized amortized cost per line item, following the AWS CUR amortized cost query"""
+    line_item_type = batch_df['line_item_line_item_type'].to_numpy()
+    unblended = batch_df['line_item_unblended_cost'].fillna(0).to_numpy(dtype=float)
+
+    if 'reservation_reservation_a_r_n' in batch_df.columns:
+        has_reservation = batch_df['reservation_reservation_a_r_n'].fillna('').to_numpy() != ''
+    else:
+        has_reservation = np.zeros(len(batch_df), dtype=bool)
+
+    conditions = [
+        line_item_type == 'SavingsPlanCoveredUsage',
+        line_item_type == 'SavingsPlanRecurringFee',
+        np.isin(line_item_type, ['SavingsPlanNegation', 'SavingsPlanUpfrontFee']),
+        line_item_type == 'DiscountedUsage',
+        line_item_type == 'RIFee',
+        (line_item_type == 'Fee') & has_reservation
+    ]
+    choices = [
+        get_optional_column(batch_df, 'savings_plan_savings_plan_effective_cost'),
+        get_optional_column(batch_df, 'savings_plan_total_commitment_to_date')
+        - get_optional_column(batch_df, 'savings_plan_used_commitment'),
+        0.0,
+        get_optional_column(batch_df, 'reservation_effective_cost'),
+        get_optional_column(batch_df, 'reservation_unused_amortized_upfront_fee_for_billing_period')
+        + get_optional_column(batch_df, 'reservation_unused_recurring_fee'),
+        0.0
+    ]
+    return np.select(conditions, choices, default=unblended)
+
+def aggregate_batch(batch):
+    """Aggregate one record batch to account x month x service sums"""
+    table = pa.Table.from_batches([batch])
+    usage_start = table['line_item_usage_start_date']
+    if getattr(usage_start.type, 'tz', None):
+        usage_start = pc.cast(usage_start, pa.timestamp(usage_start.type.unit))
+
+    batch_df = table.drop_columns(
+        [column for column in ('product', 'product_product_name', 'line_item_usage_start_date') if column in table.column_names]
+    ).to_pandas()
+
+    aggregated = pd.DataFrame({
+        'account_id': batch_df['line_item_usage_account_id'].to_numpy(),
+        'month': usage_start.to_numpy().astype('datetime64[M]'),
+        'service': get_service_names(table).to_numpy(),
+        'amortized_cost': calculate_amortized_cost(batch_df),
+        'unblended_cost': batch_df['line_item_unblended_cost'].fillna(0).to_numpy(dtype=float),
+        'usage_quantity': batch_df['line_item_usage_amount'].fillna(0).to_numpy(dtype=float)
+    })
+    account_names = None
+    if 'line_item_usage_account_name' in batch_df.columns:
+        account_names = batch_df[['line_item_usage_account_id', 'line_item_usage_account_name']].dropna().drop_duplicates(
+            'line_item_usage_account_id'
+        )
+
+    return aggregated.groupby(GROUP_KEYS, sort=False).sum().reset_index(), account_names
+
+def merge_partials(partials):
+    """Re-aggregate partial results; the output size is bounded by accounts x months x services"""
+    return pd.concat(partials, ignore_index=True).groupby(GROUP_KEYS, sort=False).sum().reset_index()
+
+def scan_cur_batches(path, start_date, end_date, batch_size=DEFAULT_BATCH_SIZE, extra_columns=(), row_filter=None):
+    """Scan the CUR line items of a date range in fixed-size record batches.
+
+    Only the needed columns are read and row groups outside the date range are skipped through the
+    usage start date filter. extra_columns must exist in the CUR; row_filter is an optional
+    additional dataset expression.
+    """
+    dataset = open_cur_dataset(path)
+    schema = dataset.schema
+
+    missing = [column for column in CUR_REQUIRED_COLUMNS + list(extra_columns) if column not in schema.names]
+    if missing:
+        raise ValueError(f"CUR data under {path} is missing required columns: {', '.join(missing)}")
+    columns = CUR_REQUIRED_COLUMNS + list(extra_columns) + [column for column in CUR_OPTIONAL_COLUMNS if column in schema.names]
+
+    start_type = schema.field('line_item_usage_start_date').type
+    date_filter = (
+        (ds.field('line_item_usage_start_date') >= pa.scalar(datetime.strptime(start_date, '%Y-%m-%d'), type=start_type))
+        & (ds.field('line_item_usage_start_date') < pa.scalar(datetime.strptime(end_date, '%Y-%m-%d'), type=start_type))
+    )
+    if row_filter is not None:
+        date_filter = date_filter & row_filter
+    scanner = dataset.scanner(
+        columns=columns,
+        filter=date_filter,
+        batch_size=batch_size,
+        batch_readahead=1,
+        fragment_readahead=1,
+        fragment_scan_options=ds.ParquetFragmentScanOptions(pre_buffer=False),
+        use_threads=False
+    )
+    return scanner.to_batches()
+
+def read_cur_costs(path, start_date, end_date, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream CUR Parquet files in fixed-size batches and aggregate them by account, month and service.
+
+    At most one batch plus the running aggregate is held in memory.
+    """
+    partials = []
+    account_names = {}
+    line_items = 0
+    for batch in scan_cur_batches(path, start_date, end_date, batch_size):
+        if batch.num_rows == 0:
+            continue
+        line_items += batch.num_rows
+        aggregated, names = aggregate_batch(batch)
+        partials.append(aggregated)
+        if names is not None:
+            account_names.update(zip(names['line_item_usage_account_id'], names['line_item_usage_account_name']))
+        if len(partials) >= PARTIALS_PER_MERGE:
+            partials = [merge_partials(partials)]
+
+    print(f"Aggregated {line_items:,} CUR line items from {path}")
+    if not partials:
+        return pd.DataFrame(columns=GROUP_KEYS + ['amortized_cost', 'unblended_cost', 'usage_quantity']), account_names
+    return merge_partials(partials), account_names
+
+def add_period_columns(aggregated, start_date, end_date):
+    """Add Month, Start Date and End Date columns clipped to the requested range, like Cost Explorer periods"""
+    month_start = pd.to_datetime(aggregated['month'])
+    period_start = month_start.clip(lower=pd.Timestamp(start_date))
+    period_end = (month_start + pd.offsets.MonthBegin(1)).clip(upper=pd.Timestamp(end_date))
+    return aggregated.assign(
+        Month=month_start.dt.strftime('%Y-%m'),
+        **{
+            'Start Date': period_start.dt.strftime('%Y-%m-%d'),
+            'End Date': period_end.dt.strftime('%Y-%m-%d')
+        }
+    )
+
+class CurCostFrames:
+    """Cost frames built from CUR data in the same shapes as process_organization_summary and process_cost_data"""
+
+    def __init__(self, aggregated, account_names, start_date, end_date):
+        self.aggregated = add_period_columns(aggregated, start_date, end_date).sort_values(
+            ['account_id', 'Month', 'service'], ignore_index=True
+        )
+        self.account_names = account_names
+        self.account_rows = self.aggregated.groupby('account_id', sort=True).indices
+
+    @classmethod
+    def from_path(cls, path, start_date, end_date, batch_size=DEFAULT_BATCH_SIZE):
+        aggregated, account_names = read_cur_costs(path, start_date, end_date, batch_size)
+        return cls(aggregated, account_names, start_date, end_date)
+
+    def accounts(self):
+        """Linked accounts in the same format as get_all_linked_accounts"""
+        return [
+            {'id': account_id, 'name': self.account_names.get(account_id, f"Account {account_id}")}
+            for account_id in self.account_rows
+        ]
+
+    def organization_frame(self):
+        """Organization-wide frame with the process_organization_summary columns"""
+        totals = self.aggregated.groupby(['Month', 'Start Date', 'End Date', 'service'], sort=True)[
+            ['amortized_cost', 'unblended_cost', 'usage_quantity']
+        ].sum().reset_index()
+        return pd.DataFrame({
+            'Month': totals['Month'],
+            'Start Date': totals['Start Date'],
+            'End Date': totals['End Date'],
+            'Service Name': totals['service'],
+            'Total Amortized Cost ($)': totals['amortized_cost'],
+            'Total Unblended Cost ($)': totals['unblended_cost'],
+            'Total Usage Quantity': totals['usage_quantity'],
+            'Total Refund ($)': (-totals['amortized_cost']).clip(lower=0)
+        })
+
+    def account_frame(self, account_id, account_name):
+        """Frame for one linked account with the process_cost_data columns"""
+        rows = self.aggregated.iloc[self.account_rows.get(account_id, [])]
+        return pd.DataFrame({
+            'Account ID': account_id,
+            'Account Name': account_name,
+            'Start Date': rows['Start Date'].to_numpy(),
+            'End Date': rows['End Date'].to_numpy(),
+            'Service Name': rows['service'].to_numpy(),
+            'Amortized Cost ($)': rows['amortized_cost'].to_numpy(),
+            'Unblended Cost ($)': rows['unblended_cost'].to_numpy(),
+            'Usage Quantity': rows['usage_quantity'].to_numpy(),
+            'Refund ($)': (-rows['amortized_cost']).clip(lower=0).to_numpy()
+        })
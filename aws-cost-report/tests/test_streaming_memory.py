@@ -0,0 +1,42 @@
+"""Peak memory of a --streaming run must not grow with the number of accounts"""
+import os
+import re
+import subprocess
+import sys
+
+REPORTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions', 'aws_cost_reporter.py')
+ACCOUNT_RSS_PATTERN = re.compile(r'^Resident memory after account \d+: ([\d,]+) MB$', re.MULTILINE)
+PEAK_RSS_PATTERN = re.compile(r'^Peak resident memory: ([\d,]+) MB$', re.MULTILINE)
+
+def run_streaming_report(account_count, tmp_path):
+    """Run the reporter with --streaming against the Cost Explorer stub in a fresh process.
+
+    Every account goes through the full report path: fetch, workbook, chart and release. The
+    rate limiter is raised because the stub answers instantly, one month keeps each chart small,
+    and --no-store leaves out the end-of-run store compaction, which merges every account by design.
+    """
+    work_dir = tmp_path / str(account_count)
+    work_dir.mkdir()
+    output = subprocess.run(
+        [sys.executable, REPORTER, '--stub-accounts', str(account_count), '--streaming',
+         '--start-date', '2024-12-01', '--end-date', '2025-01-01',
+         '--requests-per-second', '1000', '--render-profiles', 'thumb', '--no-store'],
+        cwd=work_dir, check=True, capture_output=True, text=True
+    ).stdout
+    account_rss_mb = [int(value.replace(',', '')) for value in ACCOUNT_RSS_PATTERN.findall(output)]
+    peak_rss_mb = int(PEAK_RSS_PATTERN.search(output).group(1).replace(',', ''))
+    chart_count = len(list(work_dir.glob('aws_cost_reports/*/2024/12/aws-cost-chart-*-thumb-*.png')))
+    return account_rss_mb, peak_rss_mb, chart_count
+
+def test_streaming_peak_memory_is_flat_from_10_to_1000_accounts(tmp_path):
+    small_rss_mb, small_peak_mb, small_charts = run_streaming_report(10, tmp_path)
+    large_rss_mb, large_peak_mb, large_charts = run_streaming_report(1000, tmp_path)
+    assert (len(small_rss_mb), len(large_rss_mb)) == (10, 1000)
+    # Organization chart plus one chart per account
+    assert (small_charts, large_charts) == (11, 1001)
+
+    # Each account's frames, figure and workbook are released before the next account, so 100x
+    # the accounts may only cost the account list itself; caches filled by the first account
+    # are not part of the per-account footprint
+    assert large_peak_mb < small_peak_mb + 16
+    assert max(large_rss_mb) - large_rss_mb[0] < 16
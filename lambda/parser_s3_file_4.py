@@ -0,0 +1,1032 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import unquote_plus
+
+# Container start, before the heavier imports below; the difference is the init cost of this module
+INIT_STARTED = time.perf_counter()
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+DSS_SUITE_TYPE = "suites.interuss.dss.all_tests"
+
+# Batch events ('keys' or 'prefix') are fetched and parsed on this many threads sharing one client
+MAX_WORKERS = int(os.environ.get('PARSER_MAX_WORKERS', '16'))
+# Most keys handled per invocation; a longer prefix listing returns a continuation token
+MAX_BATCH_KEYS = int(os.environ.get('PARSER_MAX_BATCH_KEYS', '1000'))
+YAML_SUFFIXES = ('.yaml', '.yml')
+# Parsed results kept per container, keyed by bucket, key and spec and valid only for their ETag
+PARSE_CACHE_SIZE = int(os.environ.get('PARSE_CACHE_SIZE', '1024'))
+# Optional DynamoDB table (partition key 'pk' of type S) that keeps parsed results across containers
+PARSE_CACHE_TABLE = os.environ.get('PARSE_CACHE_TABLE')
+# Configs are read with ranged GETs, starting with this many bytes and doubling while the
+# requested fields have not all been found
+FIRST_RANGE_BYTES = int(os.environ.get('PARSER_FIRST_RANGE_BYTES', '32768'))
+
+# S3 client created once per container and reused by every warm invocation, so only the first
+# request pays for credentials, endpoint resolution and the TLS handshake
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('S3_MAX_POOL_CONNECTIONS', str(max(10, MAX_WORKERS)))),
+    connect_timeout=float(os.environ.get('S3_CONNECT_TIMEOUT', '2')),
+    read_timeout=float(os.environ.get('S3_READ_TIMEOUT', '5')),
+    retries={'max_attempts': 3, 'mode': 'standard'},
+    tcp_keepalive=True
+)
+S3_CLIENT = boto3.client('s3', config=S3_CLIENT_CONFIG)
+DYNAMODB_CLIENT = boto3.client('dynamodb', config=S3_CLIENT_CONFIG) if PARSE_CACHE_TABLE else None
+
+INIT_DURATION_MS = (time.perf_counter() - INIT_STARTED) * 1000
+# True until the first invocation of this container has been handled
+COLD_START = True
+
+# yaml module and loader, imported on the first parse rather than during init
+_YAML = None
+_YAML_LOADER = None
+
+def get_yaml():
+    """
+    Import yaml on first use and pick the libyaml based CSafeLoader, falling back to the pure
+    Python SafeLoader if PyYAML was built without libyaml.
+
+    Returns:
+        module: The yaml module (the loader is kept in _YAML_LOADER)
+    """
+    global _YAML, _YAML_LOADER
+    if _YAML is None:
+        import yaml  # This needs to be installed as a dependency
+        _YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        _YAML = yaml
+    return _YAML
+
+def load_yaml(yaml_content):
+    """
+    Parse YAML content with the fastest safe loader.
+
+    Args:
+        yaml_content (str | bytes): YAML document
+
+    Returns:
+        object: Parsed YAML data
+    """
+    return get_yaml().load(yaml_content, Loader=_YAML_LOADER)
+
+# Fields extracted when neither the event nor PARSER_EXTRACTION_SPEC defines a spec; these are
+# the fields every earlier parser version returned
+DEFAULT_EXTRACTION_SPEC = {
+    'repository': {'path': 'metadata.repository'},
+    'tag': {'path': 'metadata.tag'},
+    'dss_test_only': {'path': 'v1.action.test_suite.suite_type', 'equals': DSS_SUITE_TYPE}
+}
+# Checks of the optional 'type' of a field; values of another type count as missing
+FIELD_TYPES = {
+    'str': lambda value: isinstance(value, str),
+    'int': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'float': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'bool': lambda value: isinstance(value, bool),
+    'list': lambda value: isinstance(value, list),
+    'dict': lambda value: isinstance(value, dict)
+}
+PREDICATES = ('equals', 'in', 'matches', 'exists')
+SPEC_FIELD_KEYS = {'path', 'type', 'default', *PREDICATES}
+# Compiled specs kept per container, keyed by their JSON
+SPEC_CACHE_SIZE = int(os.environ.get('PARSER_SPEC_CACHE_SIZE', '64'))
+
+def parse_spec_path(name, path):
+    """
+    Split a field path into its keys.
+
+    Args:
+        name (str): Field name, for error messages
+        path (str | list): Dotted key path, or a list of keys for keys that contain dots
+
+    Returns:
+        tuple: Keys of the path
+
+    Raises:
+        ValueError: If the path is empty or has a key that is not a non-empty string
+    """
+    keys = path.split('.') if isinstance(path, str) else path
+    if not isinstance(keys, list) or not keys or not all(isinstance(key, str) and key for key in keys):
+        raise ValueError(f"Field {name}: path must be a dotted string or a list of non-empty keys")
+    return tuple(keys)
+
+def compile_predicate(name, field):
+    """
+    Build the test of a derived boolean field.
+
+    Args:
+        name (str): Field name, for error messages
+        field (dict): Field definition
+
+    Returns:
+        function: Test of a found value, or None for a plain value field
+
+    Raises:
+        ValueError: If the field has several predicates or an invalid operand
+    """
+    predicates = [predicate for predicate in PREDICATES if predicate in field]
+    if not predicates:
+        return None
+    if len(predicates) > 1:
+        raise ValueError(f"Field {name}: only one of {', '.join(PREDICATES)} can be given")
+    if 'default' in field:
+        raise ValueError(f"Field {name}: predicate fields are false when the value is missing and take no default")
+    predicate, operand = predicates[0], field[predicates[0]]
+    if predicate == 'equals':
+        return lambda value: value == operand
+    if predicate == 'in':
+        if not isinstance(operand, list):
+            raise ValueError(f"Field {name}: in must be a list of values")
+        return lambda value: value in operand
+    if predicate == 'matches':
+        try:
+            pattern = re.compile(operand)
+        except (TypeError, re.error) as e:
+            raise ValueError(f"Field {name}: matches must be a regular expression: {str(e)}")
+        return lambda value: isinstance(value, str) and pattern.fullmatch(value) is not None
+    if operand is not True:
+        raise ValueError(f"Field {name}: exists must be true")
+    return lambda value: True
+
+class CompiledSpec:
+    """
+    Field extraction spec compiled into the list of key paths to read and one accessor per
+    field, so all fields are read in a single pass over the document.
+
+    A spec maps field names to definitions with:
+        - path: dotted key path (or list of keys) of the value
+        - type: optional str, int, float, bool, list or dict; other values count as missing
+        - default: value of a missing or null field (None if not given)
+        - equals, in, matches or exists: makes the field a boolean derived from the value,
+          false when the value is missing
+    """
+
+    def __init__(self, spec, spec_id):
+        if not isinstance(spec, dict) or not spec:
+            raise ValueError('Extraction spec must be a non-empty mapping of field names to definitions')
+        self.spec_id = spec_id
+        self.fields = []
+        for name, field in spec.items():
+            if name == 'key':
+                raise ValueError('Field name key is reserved for the object key of batch results')
+            if not isinstance(field, dict) or 'path' not in field:
+                raise ValueError(f"Field {name}: definition must be a mapping with a path")
+            unknown = set(field) - SPEC_FIELD_KEYS
+            if unknown:
+                raise ValueError(f"Field {name}: unknown settings {', '.join(sorted(unknown))}")
+            field_type = field.get('type')
+            if field_type is not None and field_type not in FIELD_TYPES:
+                raise ValueError(f"Field {name}: type must be one of {', '.join(FIELD_TYPES)}")
+            self.fields.append((
+                name,
+                parse_spec_path(name, field['path']),
+                FIELD_TYPES.get(field_type),
+                field.get('default'),
+                compile_predicate(name, field)
+            ))
+
+        # Paths nested below another requested path are read from that path's value, since
+        # extract_paths builds the whole value of a requested path
+        field_paths = sorted({path for _, path, _, _, _ in self.fields}, key=len)
+        self.paths = []
+        for path in field_paths:
+            if not any(path[:len(read_path)] == read_path for read_path in self.paths):
+                self.paths.append(path)
+        self.accessors = []
+        for name, path, check_type, default, test in self.fields:
+            read_path = next(read_path for read_path in self.paths if path[:len(read_path)] == read_path)
+            self.accessors.append((name, read_path, path[len(read_path):], check_type, default, test))
+
+    def extract(self, values):
+        """
+        Build the fields from the values read at the spec's paths.
+
+        Args:
+            values (dict): Value per found path of self.paths
+
+        Returns:
+            dict: Value of every field, in spec order
+        """
+        result = {}
+        for name, read_path, sub_path, check_type, default, test in self.accessors:
+            value = values.get(read_path)
+            for key in sub_path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None and check_type is not None and not check_type(value):
+                value = None
+            if test is not None:
+                result[name] = value is not None and test(value)
+            else:
+                result[name] = default if value is None else value
+        return result
+
+    def read_values(self, yaml_data):
+        """
+        Read the values at the spec's paths from parsed YAML data.
+
+        Args:
+            yaml_data (object): Parsed YAML data (any type; non-mappings have no values)
+
+        Returns:
+            dict: Value per found path, like extract_paths
+        """
+        values = {}
+        for path in self.paths:
+            value = yaml_data
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None:
+                values[path] = value
+        return values
+
+@lru_cache(maxsize=SPEC_CACHE_SIZE)
+def compile_spec_json(spec_json):
+    """
+    Compile a spec given as compact JSON; each distinct spec is compiled once per container.
+
+    Returns:
+        CompiledSpec: Compiled spec
+
+    Raises:
+        ValueError: If the spec is invalid
+    """
+    return CompiledSpec(json.loads(spec_json), hashlib.sha1(spec_json.encode()).hexdigest()[:12])
+
+def compile_spec(spec):
+    """
+    Compile an extraction spec, reusing the compiled spec of an identical earlier one.
+
+    Args:
+        spec (dict | str): Spec mapping or its JSON
+
+    Returns:
+        CompiledSpec: Compiled spec
+
+    Raises:
+        ValueError: If the spec is invalid
+    """
+    if isinstance(spec, str):
+        try:
+            spec = json.loads(spec)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Extraction spec is not valid JSON: {str(e)}")
+    # The same spec always has the same JSON, so it shares the compiled spec and cached results
+    return compile_spec_json(json.dumps(spec, separators=(',', ':')))
+
+# Spec of this deployment, compiled during init so a broken PARSER_EXTRACTION_SPEC fails the
+# init rather than being reported for every object
+DEFAULT_SPEC = compile_spec(os.environ.get('PARSER_EXTRACTION_SPEC') or DEFAULT_EXTRACTION_SPEC)
+
+def extract_fields(yaml_data, spec=DEFAULT_SPEC):
+    """
+    Extract the fields of a spec from parsed YAML data.
+
+    Args:
+        yaml_data (object): Parsed YAML data (any type; non-mappings yield the defaults)
+        spec (CompiledSpec): Fields to extract
+
+    Returns:
+        dict: Value of every field of the spec
+    """
+    return spec.extract(spec.read_values(yaml_data))
+
+class ExtractionFallback(Exception):
+    """The document uses merge keys or aliases on a requested path and needs the full parse"""
+
+_EVENT_LOADER = None
+
+def get_event_loader():
+    """
+    Build (once) a loader that composes and constructs nodes from a list of parse events with
+    the safe_load resolver and constructor, so extracted values match safe_load exactly.
+
+    Returns:
+        type: Loader class taking a list of events
+    """
+    global _EVENT_LOADER
+    if _EVENT_LOADER is None:
+        yaml = get_yaml()
+
+        class EventLoader(yaml.composer.Composer, yaml.constructor.SafeConstructor, yaml.resolver.Resolver):
+            def __init__(self, events):
+                self.events = [yaml.StreamStartEvent(), yaml.DocumentStartEvent(), *events,
+                               yaml.DocumentEndEvent(), yaml.StreamEndEvent()]
+                self.position = 0
+                yaml.composer.Composer.__init__(self)
+                yaml.constructor.SafeConstructor.__init__(self)
+                yaml.resolver.Resolver.__init__(self)
+
+            def check_event(self, *choices):
+                if self.position >= len(self.events):
+                    return False
+                return not choices or isinstance(self.events[self.position], choices)
+
+            def peek_event(self):
+                return self.events[self.position]
+
+            def get_event(self):
+                self.position += 1
+                return self.events[self.position - 1]
+
+        _EVENT_LOADER = EventLoader
+    return _EVENT_LOADER
+
+def extract_paths(stream, paths):
+    """
+    Read the values at the given mapping key paths from YAML parse events, without building
+    the rest of the document, and stop reading as soon as every path is settled.
+
+    A path is settled when its value has been read or the mapping that would hold it has
+    ended. Values are identical to walking the safe_load result with dict.get for documents
+    safe_load accepts whose keys are unique, as YAML requires; with duplicate keys the first
+    occurrence wins here while safe_load keeps the last.
+
+    Because the rest of the stream is never read or constructed, some documents safe_load
+    rejects still return values here instead of raising:
+      - malformed YAML after the last requested value (safe_load: ParserError)
+      - a second document after the first (safe_load: ComposerError)
+      - an unhashable key such as a sequence or mapping outside the requested values
+        (safe_load: ConstructorError)
+    Syntax errors before a requested value raise as they do with safe_load.
+
+    Args:
+        stream (file-like | bytes | str): YAML document; file-like streams are read lazily
+        paths (list): Key paths as tuples of strings
+
+    Returns:
+        dict: Value per found path; paths that are not in the document are left out
+
+    Raises:
+        ExtractionFallback: If a merge key or alias lies on a path that is still pending
+    """
+    yaml = get_yaml()
+    resolver = yaml.resolver.Resolver()
+    pending = set(paths)
+    prefixes = {path[:length] for path in paths for length in range(len(path))}
+    found = {}
+
+    def key_of(event):
+        """Key string of a mapping key event, or None for keys dict.get(str) could not match"""
+        if not isinstance(event, yaml.ScalarEvent):
+            return None
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+        if tag == 'tag:yaml.org,2002:merge':
+            return '<<'
+        return event.value if tag == 'tag:yaml.org,2002:str' else None
+
+    def collect(events, event):
+        """Events of one node, start to end"""
+        collected = [event]
+        depth = 1 if isinstance(event, yaml.CollectionStartEvent) else 0
+        while depth:
+            event = next(events)
+            collected.append(event)
+            if isinstance(event, yaml.CollectionStartEvent):
+                depth += 1
+            elif isinstance(event, yaml.CollectionEndEvent):
+                depth -= 1
+        return collected
+
+    def visit(events, event, path):
+        """Visit one node at path; returns True once every path is settled"""
+        if path in pending:
+            try:
+                found[path] = get_event_loader()(collect(events, event)).get_single_data()
+            except yaml.composer.ComposerError as e:
+                # An alias to an anchor defined outside the value
+                raise ExtractionFallback(str(e))
+            pending.discard(path)
+            return not pending
+        if path not in prefixes:
+            collect(events, event)
+            return False
+        if isinstance(event, yaml.AliasEvent):
+            raise ExtractionFallback(f"alias on requested path {'.'.join(path)}")
+        if not isinstance(event, yaml.MappingStartEvent):
+            collect(events, event)
+        else:
+            while True:
+                key_event = next(events)
+                if isinstance(key_event, yaml.MappingEndEvent):
+                    break
+                key = key_of(key_event)
+                collect(events, key_event)
+                if key == '<<':
+                    raise ExtractionFallback(f"merge key on requested path {'.'.join(path) or '(root)'}")
+                if visit(events, next(events), path + (key,) if key is not None else None):
+                    return True
+        # Nothing below this node can be found anymore
+        pending.difference_update([pending_path for pending_path in list(pending) if pending_path[:len(path)] == path])
+        return not pending
+
+    events = yaml.parse(stream, Loader=_YAML_LOADER)
+    try:
+        for event in events:
+            if isinstance(event, yaml.DocumentStartEvent):
+                visit(events, next(events), ())
+                break
+    finally:
+        events.close()
+    return found
+
+class RangedS3Reader:
+    """
+    Read-only file-like view of an S3 object that issues ranged GETs only when the reader
+    needs more bytes, doubling the range each time. Later ranges carry If-Match with the ETag
+    of the first one, so a concurrent overwrite fails the read instead of mixing versions.
+    """
+
+    def __init__(self, bucket, file_key, first_response):
+        self.bucket = bucket
+        self.file_key = file_key
+        self.etag = first_response.get('ETag')
+        self.data = bytearray(first_response['Body'].read())
+        content_range = first_response.get('ContentRange')
+        # 'bytes 0-32767/123456'; a whole-object response has no ContentRange
+        self.size = int(content_range.rsplit('/', 1)[1]) if content_range else len(self.data)
+        self.position = 0
+        self.next_range = max(len(self.data), 1) * 2
+        self.requests = 1
+        self.fetch_seconds = 0.0
+
+    def fetch(self, size):
+        start = len(self.data)
+        end = min(self.size, start + size) - 1
+        fetch_started = time.perf_counter()
+        response = S3_CLIENT.get_object(Bucket=self.bucket, Key=self.file_key,
+                                        Range=f'bytes={start}-{end}', IfMatch=self.etag)
+        self.data += response['Body'].read()
+        self.fetch_seconds += time.perf_counter() - fetch_started
+        self.requests += 1
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            if len(self.data) < self.size:
+                self.fetch(self.size - len(self.data))
+            size = len(self.data) - self.position
+        elif self.position + size > len(self.data) and len(self.data) < self.size:
+            self.fetch(max(self.next_range, self.position + size - len(self.data)))
+            self.next_range *= 2
+        chunk = bytes(self.data[self.position:self.position + size])
+        self.position += len(chunk)
+        return chunk
+
+    def read_all(self):
+        """Every byte of the object, fetching what has not been read yet in one request"""
+        if len(self.data) < self.size:
+            self.fetch(self.size - len(self.data))
+        return bytes(self.data)
+
+def extract_fields_from_stream(reader, spec=DEFAULT_SPEC):
+    """
+    Extract the fields of a spec from a ranged reader in one pass over the parse events,
+    falling back to the full parse of the whole object when the fast path cannot resolve merge
+    keys or aliases. Invalid YAML past the requested fields is not detected (see extract_paths).
+
+    Args:
+        reader (RangedS3Reader): Reader over the YAML object
+        spec (CompiledSpec): Fields to extract
+
+    Returns:
+        dict: Value of every field of the spec
+    """
+    try:
+        return spec.extract(extract_paths(reader, spec.paths))
+    except ExtractionFallback as e:
+        print(f"Full parse of {reader.bucket}/{reader.file_key}: {' '.join(str(e).split())}")
+        return extract_fields(load_yaml(reader.read_all()), spec)
+
+def normalize_etag(etag):
+    """
+    Strip the quotes GetObject and ListObjectsV2 put around ETags (S3 notifications have none).
+
+    Args:
+        etag (str): ETag with or without quotes
+
+    Returns:
+        str: ETag without quotes, or None
+    """
+    return etag.strip('"') if etag else None
+
+class ParseCache:
+    """
+    Thread-safe LRU of parsed results per (bucket, key, spec id), each stored with the ETag
+    it was parsed from. Entries are looked up by key and trusted only for that ETag.
+    """
+
+    def __init__(self, max_entries=PARSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, bucket, file_key, spec_id):
+        """
+        Returns:
+            tuple: (etag, result) of the most recent parse with this spec, or (None, None)
+        """
+        with self.lock:
+            entry = self.entries.get((bucket, file_key, spec_id))
+            if entry is None:
+                return None, None
+            self.entries.move_to_end((bucket, file_key, spec_id))
+            return entry
+
+    def put(self, bucket, file_key, spec_id, etag, result):
+        if self.max_entries <= 0 or not etag:
+            return
+        with self.lock:
+            self.entries[(bucket, file_key, spec_id)] = (etag, result)
+            self.entries.move_to_end((bucket, file_key, spec_id))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+PARSE_CACHE = ParseCache()
+
+def get_persisted_result(bucket, file_key, spec_id):
+    """
+    Read a parsed result from the optional cache table; failures only cost the lookup.
+
+    Returns:
+        tuple: (etag, result), or (None, None) without a table or entry
+    """
+    if DYNAMODB_CLIENT is None:
+        return None, None
+    try:
+        item = DYNAMODB_CLIENT.get_item(
+            TableName=PARSE_CACHE_TABLE,
+            Key={'pk': {'S': f"{bucket}/{file_key}#{spec_id}"}},
+            ProjectionExpression='etag, #result',
+            ExpressionAttributeNames={'#result': 'result'}
+        ).get('Item')
+    except ClientError as e:
+        print(f"Parse cache table read failed for {bucket}/{file_key}: {str(e)}")
+        return None, None
+    if not item:
+        return None, None
+    return item['etag']['S'], json.loads(item['result']['S'])
+
+def persist_result(bucket, file_key, spec_id, etag, result):
+    """Write a parsed result to the optional cache table; failures never fail the parse"""
+    if DYNAMODB_CLIENT is None or not etag:
+        return
+    try:
+        DYNAMODB_CLIENT.put_item(
+            TableName=PARSE_CACHE_TABLE,
+            Item={
+                'pk': {'S': f"{bucket}/{file_key}#{spec_id}"},
+                'etag': {'S': etag},
+                'result': {'S': json.dumps(result)},
+                'parsed_at': {'N': str(int(time.time()))}
+            }
+        )
+    except ClientError as e:
+        print(f"Parse cache table write failed for {bucket}/{file_key}: {str(e)}")
+
+def is_not_modified(error):
+    """True for the 304 answer of a conditional GET, which botocore raises as a ClientError"""
+    return (error.response.get('Error', {}).get('Code') in ('304', 'NotModified')
+            or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304)
+
+def parse_s3_yaml(bucket, file_key, timings=None, etag=None, spec=DEFAULT_SPEC):
+    """
+    Download and parse a YAML file from S3 with the shared client and extract the fields of
+    the spec (by default repository, tag and whether it's a DSS test).
+
+    Results are cached per ETag and spec. A known current ETag (from a listing or an S3 notification)
+    that matches the cache costs no request at all; otherwise a cached or persisted result is
+    revalidated with a conditional GET (If-None-Match), which costs a 304 when unchanged.
+
+    Args:
+        bucket (str): S3 bucket name
+        file_key (str): S3 object key (path to the YAML file)
+        timings (dict): Optional dict that receives cache, s3_ms and parse_ms
+        etag (str): Current ETag of the object, if the caller already knows it
+        spec (CompiledSpec): Fields to extract
+
+    Returns:
+        dict: Value of every field of the spec
+
+    Raises:
+        Exception: Any errors that occur during S3 operations or YAML parsing
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    etag = normalize_etag(etag)
+
+    cached_etag, cached_result = PARSE_CACHE.get(bucket, file_key, spec.spec_id)
+    cache_source = 'memory'
+    if cached_etag is None or (etag and cached_etag != etag):
+        cached_etag, cached_result = get_persisted_result(bucket, file_key, spec.spec_id)
+        cache_source = 'table'
+    if cached_etag is not None and cached_etag == etag:
+        PARSE_CACHE.put(bucket, file_key, spec.spec_id, cached_etag, cached_result)
+        timings['cache'] = cache_source
+        return dict(cached_result)
+
+    request = {'Bucket': bucket, 'Key': file_key, 'Range': f'bytes=0-{FIRST_RANGE_BYTES - 1}'}
+    if cached_etag is not None:
+        request['IfNoneMatch'] = f'"{cached_etag}"'
+    try:
+        response = S3_CLIENT.get_object(**request)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+            # Empty objects have no byte 0
+            request.pop('Range')
+            response = S3_CLIENT.get_object(**request)
+        elif cached_etag is None or not is_not_modified(e):
+            raise
+        else:
+            PARSE_CACHE.put(bucket, file_key, spec.spec_id, cached_etag, cached_result)
+            timings['cache'] = f'{cache_source}_not_modified'
+            timings['s3_ms'] = (time.perf_counter() - started) * 1000
+            return dict(cached_result)
+    reader = RangedS3Reader(bucket, file_key, response)
+    fetched = time.perf_counter()
+
+    # Only the bytes up to the last requested field are downloaded and parsed
+    result = extract_fields_from_stream(reader, spec)
+    parsed = time.perf_counter()
+
+    current_etag = normalize_etag(reader.etag)
+    PARSE_CACHE.put(bucket, file_key, spec.spec_id, current_etag, result)
+    persist_result(bucket, file_key, spec.spec_id, current_etag, result)
+
+    timings['cache'] = 'miss'
+    timings['s3_ms'] = (fetched - started + reader.fetch_seconds) * 1000
+    timings['parse_ms'] = (parsed - fetched - reader.fetch_seconds) * 1000
+    timings['bytes_read'] = len(reader.data)
+    timings['object_bytes'] = reader.size
+    return dict(result)
+
+def list_yaml_keys(bucket, prefix, continuation_token=None, limit=MAX_BATCH_KEYS):
+    """
+    List the YAML keys under a prefix, stopping once limit keys have been found.
+
+    Args:
+        bucket (str): S3 bucket name
+        prefix (str): Key prefix to list
+        continuation_token (str): Token returned by an earlier call to continue the listing
+        limit (int): Maximum number of keys to return
+
+    Returns:
+        tuple: (list of (key, etag) pairs, continuation token for the next call or None when done)
+    """
+    keys = []
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    if continuation_token:
+        kwargs['ContinuationToken'] = continuation_token
+
+    while True:
+        # Never list more keys than still fit, so the next token resumes right after the last key
+        response = S3_CLIENT.list_objects_v2(MaxKeys=min(1000, limit - len(keys)), **kwargs)
+        keys.extend(
+            (item['Key'], item.get('ETag')) for item in response.get('Contents', [])
+            if item['Key'].lower().endswith(YAML_SUFFIXES)
+        )
+        next_token = response.get('NextContinuationToken') if response.get('IsTruncated') else None
+        if not next_token or len(keys) >= limit:
+            return keys, next_token
+        kwargs['ContinuationToken'] = next_token
+
+def parse_s3_objects(objects, max_workers=MAX_WORKERS, timings=None, spec=DEFAULT_SPEC):
+    """
+    Fetch and parse many YAML files, possibly from several buckets, concurrently with the
+    shared S3 client.
+
+    Args:
+        objects (list): (bucket, key, etag) triples; etag is None when not known
+        max_workers (int): Maximum number of concurrent downloads
+        timings (dict): Optional dict that receives a cache_<source> count per cache outcome
+        spec (CompiledSpec): Fields to extract from every object
+
+    Returns:
+        list: (result, error) per object in input order; exactly one of the two is None
+    """
+    def parse_object(s3_object):
+        bucket, file_key, etag = s3_object
+        object_timings = {}
+        try:
+            return {'key': file_key, **parse_s3_yaml(bucket, file_key, object_timings, etag, spec)}, None, object_timings
+        except Exception as e:
+            return None, {'key': file_key, 'message': f'Error: {str(e)}'}, object_timings
+
+    if not objects:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(objects)))) as executor:
+        outcomes = list(executor.map(parse_object, objects))
+
+    if timings is not None:
+        for _, _, object_timings in outcomes:
+            if 'cache' in object_timings:
+                counter = f"cache_{object_timings['cache']}"
+                timings[counter] = timings.get(counter, 0) + 1
+    return [(result, error) for result, error, _ in outcomes]
+
+def parse_s3_yaml_batch(bucket, file_keys, max_workers=MAX_WORKERS, etags=None, timings=None, spec=DEFAULT_SPEC):
+    """
+    Fetch and parse many YAML files of one bucket concurrently with the shared S3 client.
+
+    Args:
+        bucket (str): S3 bucket name
+        file_keys (list): S3 object keys
+        max_workers (int): Maximum number of concurrent downloads
+        etags (dict): Optional current ETag per key, e.g. from a listing
+        timings (dict): Optional dict that receives the cache outcome counts
+        spec (CompiledSpec): Fields to extract from every file
+
+    Returns:
+        tuple: (list of results with their key, list of errors with their key), in key order
+    """
+    etags = etags or {}
+    outcomes = parse_s3_objects(
+        [(bucket, file_key, etags.get(file_key)) for file_key in file_keys], max_workers, timings, spec
+    )
+    results = [result for result, _ in outcomes if result is not None]
+    errors = [error for _, error in outcomes if error is not None]
+    return results, errors
+
+def get_s3_event_objects(s3_event):
+    """
+    Get the created objects of an S3 event notification.
+
+    Args:
+        s3_event (dict): S3 event notification ('Records' of aws:s3 records); s3:TestEvent
+            messages and removal events yield no objects
+
+    Returns:
+        list: (bucket, key, etag) triples, keys URL-decoded
+    """
+    objects = []
+    for record in s3_event.get('Records', []):
+        if record.get('eventSource') != 'aws:s3' or not record.get('eventName', '').startswith('ObjectCreated'):
+            continue
+        objects.append((
+            record['s3']['bucket']['name'],
+            # Keys arrive URL-encoded, with spaces as '+'
+            unquote_plus(record['s3']['object']['key']),
+            record['s3']['object'].get('eTag')
+        ))
+    return objects
+
+def get_sqs_record_objects(record):
+    """
+    Get the objects of an SQS message wrapping an S3 event, directly or through SNS.
+
+    Args:
+        record (dict): aws:sqs record
+
+    Returns:
+        list: (bucket, key, etag) triples
+
+    Raises:
+        ValueError: If the message body is not an S3 event notification
+    """
+    message = json.loads(record['body'])
+    if 'Message' in message and message.get('Type') == 'Notification':
+        message = json.loads(message['Message'])
+    if 'Records' not in message and message.get('Event') != 's3:TestEvent':
+        raise ValueError('SQS message is not an S3 event notification')
+    return get_s3_event_objects(message)
+
+def handle_records_event(event, timings):
+    """
+    Handle an S3 event notification or an SQS batch of S3 event notifications.
+
+    The objects of every record are parsed together on the shared thread pool. For SQS the
+    response lists the messages that failed in batchItemFailures (the event source mapping
+    needs ReportBatchItemFailures), so only those are retried. A failed direct S3 notification
+    raises, so the asynchronous invocation is retried or sent to its failure destination.
+
+    Args:
+        event (dict): Lambda event with aws:s3 or aws:sqs Records
+        timings (dict): Receives records, keys and batch_ms
+
+    Returns:
+        dict: {'batchItemFailures': [...]} for SQS, per-key results and errors for S3
+    """
+    started = time.perf_counter()
+    records = event['Records']
+    is_sqs = records[0].get('eventSource') == 'aws:sqs'
+
+    # Objects of every record with the record they came from
+    objects = []
+    failed_messages = []
+    for record in records:
+        if is_sqs:
+            try:
+                record_objects = get_sqs_record_objects(record)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Unreadable SQS message {record.get('messageId')}: {str(e)}")
+                failed_messages.append(record['messageId'])
+                continue
+            objects.extend((record['messageId'], s3_object) for s3_object in record_objects)
+        else:
+            objects.extend((None, s3_object) for s3_object in get_s3_event_objects({'Records': [record]}))
+
+    outcomes = parse_s3_objects([s3_object for _, s3_object in objects], timings=timings)
+    results = [result for result, _ in outcomes if result is not None]
+    errors = [error for _, error in outcomes if error is not None]
+    for result in results:
+        # Notifications have no caller waiting for the result, so every result is logged
+        print(json.dumps({'metric': 'parser_result', **result}))
+    for error in errors:
+        print(json.dumps({'metric': 'parser_error', **error}))
+
+    timings['records'] = len(records)
+    timings['keys'] = len(objects)
+    timings['batch_ms'] = (time.perf_counter() - started) * 1000
+
+    if is_sqs:
+        failed_messages += [message_id for (message_id, _), (_, error) in zip(objects, outcomes) if error is not None]
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in dict.fromkeys(failed_messages)]}
+    if errors:
+        raise Exception(f"Failed to parse {len(errors)} of {len(objects)} S3 objects: "
+                        + '; '.join(f"{error['key']}: {error['message']}" for error in errors))
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'results': results,
+            'errors': errors,
+            'count': len(objects),
+            'failed': len(errors)
+        })
+    }
+
+def handle_batch_event(event, timings, spec=DEFAULT_SPEC):
+    """
+    Handle an event with a list of keys or a prefix.
+
+    Args:
+        event (dict): Lambda event data with bucket and either:
+            - keys: list of S3 object keys
+            - prefix: key prefix whose .yaml/.yml files are parsed, optionally with the
+              continuation_token returned by the previous call
+        timings (dict): Receives keys, list_ms and batch_ms
+        spec (CompiledSpec): Fields to extract from every file
+
+    Returns:
+        dict: Response with per-key results and errors
+    """
+    bucket = event.get('bucket')
+    file_keys = event.get('keys')
+    prefix = event.get('prefix')
+
+    if not bucket or (file_keys is None and prefix is None):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'message': 'Missing required parameters: bucket and key, keys or prefix'
+            })
+        }
+    if file_keys is not None and (not isinstance(file_keys, list) or len(file_keys) > MAX_BATCH_KEYS):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'message': f'keys must be a list of at most {MAX_BATCH_KEYS} keys'
+            })
+        }
+
+    started = time.perf_counter()
+    next_token = None
+    etags = {}
+    if file_keys is None:
+        # The listing's ETags let unchanged, cached files skip S3 entirely
+        listing, next_token = list_yaml_keys(bucket, prefix, event.get('continuation_token'))
+        etags = dict(listing)
+        file_keys = [file_key for file_key, _ in listing]
+    # Duplicate keys are fetched once
+    file_keys = list(dict.fromkeys(file_keys))
+    listed = time.perf_counter()
+
+    results, errors = parse_s3_yaml_batch(bucket, file_keys, etags=etags, timings=timings, spec=spec)
+    timings['keys'] = len(file_keys)
+    timings['list_ms'] = (listed - started) * 1000
+    timings['batch_ms'] = (time.perf_counter() - listed) * 1000
+
+    body = {
+        'results': results,
+        'errors': errors,
+        'count': len(file_keys),
+        'failed': len(errors)
+    }
+    if prefix is not None:
+        body['next_continuation_token'] = next_token
+    return {
+        'statusCode': 200,
+        'body': json.dumps(body)
+    }
+
+def log_timing(cold_start, timings, started, status_code):
+    """
+    Print one structured timing line per invocation (searchable in CloudWatch Logs Insights).
+
+    Args:
+        cold_start (bool): Whether this was the first invocation of the container
+        timings (dict): s3_ms and parse_ms of a single request, keys, list_ms and batch_ms
+            of a batch, or records, keys and batch_ms of a trigger event, if it got that far
+        started (float): perf_counter value at the start of the invocation
+        status_code (int): Status code returned to the caller
+    """
+    record = {
+        'metric': 'parser_timing',
+        'cold_start': cold_start,
+        'status_code': status_code,
+        'total_ms': round((time.perf_counter() - started) * 1000, 3),
+        **{name: round(value, 3) if isinstance(value, float) else value for name, value in timings.items()}
+    }
+    if cold_start:
+        record['init_ms'] = round(INIT_DURATION_MS, 3)
+    print(json.dumps(record))
+
+def lambda_handler(event, context):
+    """
+    Lambda handler that downloads YAML files from S3 and extracts the fields of the
+    extraction spec, by default repository, tag and dss_test_only. The S3 client, YAML loader
+    and compiled specs are reused across warm invocations.
+
+    Args:
+        event (dict): Lambda event data, should contain:
+            - bucket: S3 bucket name
+            - key: S3 object key (path to the YAML file), or for a batch:
+            - keys: list of S3 object keys, or
+            - prefix: key prefix of the YAML files (and continuation_token to resume)
+            - spec: optional extraction spec (mapping or JSON) replacing the deployment's
+              PARSER_EXTRACTION_SPEC for this request
+            S3 event notifications and SQS batches of them are handled natively and use the
+            deployment's spec.
+        context (object): Lambda context object
+
+    Returns:
+        dict: Response containing the extracted fields, the per-key results and errors of a
+        batch, or batchItemFailures for SQS
+    """
+    global COLD_START
+    started = time.perf_counter()
+    cold_start, COLD_START = COLD_START, False
+    timings = {}
+
+    if event.get('Records'):
+        # Trigger events: failures are reported per SQS message or raised for S3 retries
+        status_code = 500
+        try:
+            response = handle_records_event(event, timings)
+            status_code = 200
+            return response
+        finally:
+            log_timing(cold_start, timings, started, status_code)
+
+    try:
+        # Get S3 bucket and file key from the event
+        bucket = event.get('bucket')
+        file_key = event.get('key')
+        spec = DEFAULT_SPEC
+        spec_error = None
+        if event.get('spec') is not None:
+            try:
+                spec = compile_spec(event['spec'])
+            except ValueError as e:
+                spec_error = str(e)
+
+        if spec_error is not None:
+            response = {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': f'Invalid spec: {spec_error}'
+                })
+            }
+        elif file_key is None and ('keys' in event or 'prefix' in event):
+            response = handle_batch_event(event, timings, spec)
+        elif not bucket or not file_key:
+            response = {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': 'Missing required parameters: bucket and key'
+                })
+            }
+        else:
+            response = {
+                'statusCode': 200,
+                'body': json.dumps(parse_s3_yaml(bucket, file_key, timings, spec=spec))
+            }
+
+    except Exception as e:
+        # Handle errors
+        response = {
+            'statusCode': 500,
+            'body': json.dumps({
+                'message': f'Error: {str(e)}'
+            })
+        }
+
+    log_timing(cold_start, timings, started, response['statusCode'])
+    return response